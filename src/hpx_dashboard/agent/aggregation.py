@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Windowed pre-aggregation of the counter samples in the agent.
+"""
+
+from collections import deque
+import math
+
+from .batcher import Batcher
+from .replay import time_units
+
+
+class AggregatingBatcher(Batcher):
+    """Batcher which sends the min/max/mean/last/count of the samples of each counter over
+    windows of HPX time instead of the samples themselves.
+
+    The windows are aligned on multiples of `window`. The aggregate of a window is sent once a
+    sample of the counter falls in a later window, or when the batcher is closed. A checkpoint
+    (see readers.Checkpoint) is thus held until the windows open when it was added are sent.
+
+    The values that are not a single number (e.g. histograms) are left out of the windows, they
+    are only sent when the samples are not aggregated.
+    """
+
+    def __init__(self, queue, window, *args, **kwargs):
+        """
+        Parameters
+        ----------
+        queue : asyncio.Queue
+            queue in which the encoded batches are put
+        window : float
+            length (in s) of the windows, in the time of the HPX program
+        *args, **kwargs
+            see Batcher
+        """
+        super().__init__(queue, *args, **kwargs)
+        self.window = window
+        # Length of the window in the timestamp unit of each counter
+        self._windows = {}
+        # Current window of each counter:
+        # [window index, sequence number, timestamp, min, max, sum, count, last], where the
+        # count is the number of samples which are not NaN
+        self._current = {}
+        # Held checkpoints, with the ids of the counters whose windows they wait for
+        self._held_checkpoints = deque()
+
+    def add_counter_definition(self, counter_id, name):
+        timestamp_unit = name[3]
+        scale = time_units.get(timestamp_unit.encode() if timestamp_unit else b"", 1.0)
+        self._windows[counter_id] = self.window / scale
+        super().add_counter_definition(counter_id, name)
+
+    def _add_window(self, counter_id, state):
+        _, sequence_number, timestamp, minimum, maximum, total, count, last = state
+        mean = total / count if count else math.nan
+        self.add_aggregate(
+            counter_id, sequence_number, timestamp, minimum, maximum, mean, last, count
+        )
+        if self._held_checkpoints:
+            for _, counter_ids in self._held_checkpoints:
+                counter_ids.discard(counter_id)
+            # The windows open for a checkpoint are still open for the later ones
+            while self._held_checkpoints and not self._held_checkpoints[0][1]:
+                super().add_checkpoint(self._held_checkpoints.popleft()[0])
+
+    def add_checkpoint(self, checkpoint):
+        if self._current:
+            self._held_checkpoints.append((checkpoint, set(self._current)))
+        else:
+            super().add_checkpoint(checkpoint)
+
+    def add_counter(self, counter_id, sequence_number, timestamp, value):
+        index = math.floor(timestamp / self._windows[counter_id])
+        state = self._current.get(counter_id)
+
+        if state is None or state[0] != index:
+            if state is not None:
+                self._add_window(counter_id, state)
+            state = self._current[counter_id] = [index, 0, 0.0, math.nan, math.nan, 0.0, 0, 0.0]
+
+        if isinstance(value, str):
+            # The values that are not a single number (e.g. histograms) can not be aggregated
+            value = math.nan
+        state[1] = sequence_number
+        state[2] = timestamp
+        state[7] = value
+        # NaN values are left out of the min, max, sum and count, a window without any number
+        # has a NaN min, max and mean and a count of 0
+        if value != value:
+            return
+        if not state[6] or value < state[3]:
+            state[3] = value
+        if not state[6] or value > state[4]:
+            state[4] = value
+        state[5] += value
+        state[6] += 1
+
+    async def close(self):
+        """Sends the aggregates of the windows which are still open and closes the batcher."""
+        for counter_id, state in self._current.items():
+            self._add_window(counter_id, state)
+        self._current.clear()
+        await super().close()
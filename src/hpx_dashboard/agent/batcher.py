@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Batching stage between the parser and the TCP client of the agent.
+"""
+
+import asyncio
+from collections import deque
+import time
+
+from ..common import protocol
+from .lanes import LaneCheckpoint
+
+
+class BatchStats:
+    """Statistics about the batches sent by a Batcher."""
+
+    def __init__(self):
+        self.num_batches = 0
+        self.num_records = 0
+        self.num_bytes = 0
+        self.max_records = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        # Time spent waiting for the queue to have free space
+        self.backpressure_time = 0.0
+        # Number of flushes triggered by each condition
+        self.flush_reasons = {"timeout": 0, "records": 0, "bytes": 0, "message": 0, "close": 0}
+
+    def add(self, num_records, num_bytes, latency, reason):
+        """Adds a flushed batch to the statistics."""
+        self.num_batches += 1
+        self.num_records += num_records
+        self.num_bytes += num_bytes
+        self.max_records = max(self.max_records, num_records)
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.flush_reasons[reason] += 1
+
+    def __str__(self):
+        if not self.num_batches:
+            return "No batch has been sent."
+
+        mean_records = self.num_records / self.num_batches
+        mean_bytes = self.num_bytes / self.num_batches
+        mean_latency = self.total_latency / self.num_batches
+        reasons = ", ".join(f"{key}: {value}" for key, value in self.flush_reasons.items())
+        return (
+            f"{self.num_batches} batches sent, {mean_records:.1f} records ({mean_bytes:.0f} bytes)"
+            f" per batch on average and at most {self.max_records} records. Flush latency:"
+            f" {mean_latency * 1000:.2f} ms on average, {self.max_latency * 1000:.2f} ms at most."
+            f" Flushes triggered by {reasons}. Time spent waiting on a full queue:"
+            f" {self.backpressure_time:.3f} s."
+        )
+
+
+# Lanes of the batcher
+PRIORITY = 0
+BULK = 1
+
+
+class Batcher:
+    """Groups the parsed records into batches that are encoded and put in a queue.
+
+    The records are batched in two lanes: the counter data in the priority lane, the task data and
+    the lines of the standard output in the bulk lane (see protocol.FLAG_PRIORITY). A batch is
+    flushed whenever the first of these conditions is met:
+
+    * the first record of the batch has waited more than `timeout` (this is checked by a timer
+      task, such that the last records are sent even if the program stops printing)
+    * the batch contains `max_records` records
+    * the encoded batch would be larger than `max_bytes`
+
+    The records are added synchronously by the parser, the flushed batches are kept aside until
+    `drain` is awaited, which is where the backpressure of the (bounded) queue applies. The
+    batches of the priority lane are always put in the queue first. Each lane is drained under its
+    own lock, such that the priority batches flushed by the timer are sent even while a drain
+    waits for room in the bulk lane of the queue.
+
+    The markers of the checkpoints (see readers.Checkpoint) are put in the queue right after the
+    batches containing the records added before them.
+    """
+
+    def __init__(
+        self, queue, timeout=10, max_records=65536, max_bytes=1 << 20, task_sampler=None
+    ):
+        """
+        Parameters
+        ----------
+        queue : FrameLanes or asyncio.Queue
+            queue in which the encoded batches are put
+        timeout : float
+            maximum time (in ms) that a record can wait in the batch before being sent. If the
+            timeout is 0, every record is sent immediately.
+        max_records : int
+            maximum number of records in a batch
+        max_bytes : int
+            maximum size (in bytes) of a batch
+        task_sampler : TaskSampler
+            if not None, only the tasks sampled by the task sampler are sent, along with the
+            summaries of all the tasks
+        """
+        self.queue = queue
+        self.timeout = timeout / 1000.0
+        self.max_records = max_records if timeout > 0 else 1
+        self.max_bytes = max_bytes
+        self.task_sampler = task_sampler
+        self.stats = BatchStats()
+
+        # Current batch, time of its first record and flushed frames of each lane
+        self._batches = [protocol.Batch(), protocol.Batch()]
+        self._batch_begins = [None, None]
+        self._ready = [deque(), deque()]
+        # Markers of the checkpoints to put after the current batch of each lane, and checkpoints
+        # waiting for the tasks kept by the task sampler
+        self._checkpoints = [[], []]
+        self._sampler_checkpoints = []
+        self._drain_locks = [asyncio.Lock(), asyncio.Lock()]
+
+        self._has_data = asyncio.Event()
+        self._timer = asyncio.ensure_future(self._run_timer())
+
+    async def _run_timer(self):
+        while True:
+            begins = [begin for begin in self._batch_begins if begin is not None]
+            if not begins:
+                self._has_data.clear()
+                await self._has_data.wait()
+                continue
+
+            remaining = min(begins) + self.timeout - time.time()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+            else:
+                for lane, begin in enumerate(self._batch_begins):
+                    if begin is not None and begin + self.timeout <= time.time():
+                        self._flush("timeout", lane)
+                await self.drain()
+
+    def _flush(self, reason, lane=None):
+        """Encodes the current batch of `lane` (or of both lanes) and sets it aside until the next
+        drain."""
+        if lane is None:
+            self._flush(reason, PRIORITY)
+            self._flush(reason, BULK)
+            return
+
+        batch = self._batches[lane]
+        if not len(batch):
+            return
+
+        frame = batch.encode(priority=lane == PRIORITY)
+        self.stats.add(len(batch), len(frame), time.time() - self._batch_begins[lane], reason)
+        self._ready[lane].append(frame)
+        if self._checkpoints[lane]:
+            self._ready[lane].extend(self._checkpoints[lane])
+            self._checkpoints[lane] = []
+
+        self._batches[lane] = protocol.Batch()
+        self._batch_begins[lane] = None
+
+    def _added(self, lane):
+        """Checks the size of the batch of `lane` after adding a record."""
+        if self._batch_begins[lane] is None:
+            self._batch_begins[lane] = time.time()
+            self._has_data.set()
+
+        batch = self._batches[lane]
+        if len(batch) >= self.max_records:
+            self._flush("records", lane)
+        elif batch.nbytes >= self.max_bytes:
+            self._flush("bytes", lane)
+
+    def add_counter_definition(self, counter_id, name):
+        """See protocol.Batch.add_counter_definition"""
+        self._batches[PRIORITY].add_counter_definition(counter_id, name)
+        self._added(PRIORITY)
+
+    def add_counter(self, counter_id, sequence_number, timestamp, value):
+        """See protocol.Batch.add_counter"""
+        self._batches[PRIORITY].add_counter(counter_id, sequence_number, timestamp, value)
+        self._added(PRIORITY)
+
+    def add_aggregate(self, counter_id, sequence_number, timestamp, *summary):
+        """See protocol.Batch.add_aggregate"""
+        self._batches[PRIORITY].add_aggregate(counter_id, sequence_number, timestamp, *summary)
+        self._added(PRIORITY)
+
+    def add_task(self, locality, worker_id, name, start, end):
+        """See protocol.Batch.add_task"""
+        if self.task_sampler is not None:
+            self.task_sampler.add(locality, worker_id, name, start, end)
+            if self.task_sampler.expired():
+                self._flush_task_sampler()
+            return
+
+        self._batches[BULK].add_task(locality, worker_id, name, start, end)
+        self._added(BULK)
+
+    def _flush_task_sampler(self):
+        """Adds the tasks sampled during the last interval and the summaries to the batch."""
+        tasks, summaries = self.task_sampler.flush()
+        for task in tasks:
+            self._batches[BULK].add_task(*task)
+            self._added(BULK)
+        if summaries:
+            self._batches[BULK].add_task_summaries(summaries)
+            self._added(BULK)
+        for checkpoint in self._sampler_checkpoints:
+            self._put_checkpoint(checkpoint)
+        self._sampler_checkpoints = []
+
+    def add_line(self, line):
+        """See protocol.Batch.add_line"""
+        self._batches[BULK].add_line(line)
+        self._added(BULK)
+
+    def add_checkpoint(self, checkpoint):
+        """Puts markers of the checkpoint in both lanes, after the records added so far."""
+        if self.task_sampler is not None:
+            # The sampled tasks are only added to the batch at the end of the sampling interval
+            self._sampler_checkpoints.append(checkpoint)
+            return
+        self._put_checkpoint(checkpoint)
+
+    def _put_checkpoint(self, checkpoint):
+        checkpoint.pending = len(self._batches)
+        for lane, batch in enumerate(self._batches):
+            marker = LaneCheckpoint(checkpoint, lane == PRIORITY)
+            if len(batch):
+                self._checkpoints[lane].append(marker)
+            else:
+                self._ready[lane].append(marker)
+
+    def put(self, frame):
+        """Flushes the current batch of the lane of `frame` and puts `frame` right after it."""
+        lane = PRIORITY if protocol.is_priority(frame) else BULK
+        self._flush("message", lane)
+        self._ready[lane].append(frame)
+
+    async def drain(self):
+        """Puts the flushed batches in the queue, waits if the queue is full."""
+        if self.task_sampler is not None and self.task_sampler.expired():
+            self._flush_task_sampler()
+
+        # The locks keep the order of the frames of each lane when the timer and the parser drain
+        # concurrently
+        for ready, drain_lock in zip(self._ready, self._drain_locks):
+            async with drain_lock:
+                while ready:
+                    frame = ready.popleft()
+                    try:
+                        self.queue.put_nowait(frame)
+                    except asyncio.QueueFull:
+                        begin = time.time()
+                        await self.queue.put(frame)
+                        self.stats.backpressure_time += time.time() - begin
+
+    async def close(self):
+        """Flushes and drains the last batches and stops the timer."""
+        self._timer.cancel()
+        if self.task_sampler is not None:
+            self._flush_task_sampler()
+        self._flush("close")
+        await self.drain()
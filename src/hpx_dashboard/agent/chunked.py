@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Parallel parsing of recorded HPX outputs.
+
+The file is memory-mapped and split into chunks that end on a newline. Each chunk is parsed in a
+process pool by its own HPXParser, which numbers the counters it finds from 0. The results are
+merged in the order of the chunks: the counter ids of each chunk are mapped to the ids of the
+transmission (the counters seen for the first time are defined) and the columns are sent in
+batches of at most `max_records` records.
+"""
+
+import asyncio
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import mmap
+import time
+
+import numpy as np
+
+from ..common import protocol
+from ..common.logger import Logger
+from .hpx_parser import HPXParser, _counter_infos_header
+
+
+class _ChunkBuffer(protocol.Batch):
+    """Batch which replaces the Batcher of the parser of a chunk.
+
+    The frames that the parser puts directly (e.g. the counter infos) are kept aside.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.frames = []
+
+    def put(self, frame):
+        self.frames.append(frame)
+
+
+def chunk_boundaries(mm, chunk_size):
+    """Returns the (begin, end) offsets of the chunks of `mm`.
+
+    The chunks end just after a newline. A chunk containing the beginning of the
+    --hpx:list-counter-infos block is extended up to the first counter line after it, such that
+    the whole block is parsed by the same chunk.
+    """
+    size = len(mm)
+    boundaries = []
+    begin = 0
+    while begin < size:
+        end = begin + chunk_size
+        if end < size:
+            header = mm.find(_counter_infos_header, begin, end + len(_counter_infos_header))
+            if header != -1:
+                block_ends = [mm.find(prefix, header) for prefix in (b"\n/", b'\n"/')]
+                block_ends = [offset for offset in block_ends if offset != -1]
+                end = max(end, min(block_ends)) if block_ends else size
+            newline = mm.find(b"\n", end)
+            end = size if newline == -1 else newline + 1
+        else:
+            end = size
+        boundaries.append((begin, end))
+        begin = end
+    return boundaries
+
+
+def _parse_chunk(path, begin, end, strip_hpx_counters, send_stdout, keep_output):
+    """Parses the lines of a chunk of the file, executed in the worker processes.
+
+    Returns
+    -------
+    tuple
+        the batch of the chunk, the raw names of the counters (ordered by their id in the chunk),
+        the counter infos and the lines of the output of the program which are not stripped
+    """
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            lines = mm[begin:end].split(b"\n")
+    if not lines[-1]:
+        lines.pop()
+
+    parser = HPXParser(strip_hpx_counters=strip_hpx_counters)
+    parser.buffer = batch = _ChunkBuffer()
+
+    output = []
+    for line in lines:
+        if parser.parse_line(line) and strip_hpx_counters:
+            continue
+        if keep_output:
+            output.append(line)
+        if send_stdout:
+            batch.add_line(line.decode(errors="replace").strip())
+
+    raw_keys = sorted(parser._counter_ids, key=parser._counter_ids.get)
+    return batch, raw_keys, parser.counter_descriptions, output
+
+
+def _split_batch(batch, max_records):
+    """Splits the columns of a batch into batches of at most `max_records` records."""
+    parts = []
+    for start in range(0, len(batch.counter_ids), max_records):
+        part = protocol.Batch()
+        stop = start + max_records
+        part.counter_ids = batch.counter_ids[start:stop]
+        part.counter_sequences = batch.counter_sequences[start:stop]
+        part.counter_timestamps = batch.counter_timestamps[start:stop]
+        part.counter_values = batch.counter_values[start:stop]
+        part.counter_texts = [
+            (row - start, text) for row, text in batch.counter_texts if start <= row < stop
+        ]
+        parts.append(part)
+
+    for start in range(0, len(batch.task_name_ids), max_records):
+        part = protocol.Batch()
+        stop = start + max_records
+        part.task_names = batch.task_names
+        part.task_localities = batch.task_localities[start:stop]
+        part.task_workers = batch.task_workers[start:stop]
+        part.task_name_ids = batch.task_name_ids[start:stop]
+        part.task_starts = batch.task_starts[start:stop]
+        part.task_ends = batch.task_ends[start:stop]
+        parts.append(part)
+
+    for start in range(0, len(batch.lines), max_records):
+        part = protocol.Batch()
+        part.lines = batch.lines[start : start + max_records]
+        parts.append(part)
+
+    # The definitions are sent before the samples using them
+    if batch.counter_definitions:
+        if not parts:
+            parts.append(protocol.Batch())
+        parts[0].counter_definitions = batch.counter_definitions
+    return parts
+
+
+async def collect_file(parser, path, frames_queue, jobs, chunk_size=64 << 20, interrupted=None):
+    """Parses the file `path` in parallel and puts the encoded data in the frames queue.
+
+    Parameters
+    ----------
+    parser : HPXParser
+        parser holding the options and the state of the transmission
+    path : str
+        path of the recorded output of the HPX program
+    frames_queue : asyncio.Queue
+        queue for putting the encoded frames to be send via TCP
+    jobs : int
+        number of worker processes
+    chunk_size : int
+        approximate size (in bytes) of the chunks
+    interrupted : asyncio.Event
+        if set, the transmission is ended after the chunk being merged
+    """
+    loop = asyncio.get_event_loop()
+    parser.queue = frames_queue
+    parser.start_time = time.time()
+    await frames_queue.put(protocol.encode_begin(parser.start_time, parser.run_id))
+
+    with open(path, "rb") as file:
+        if not file.seek(0, 2):
+            boundaries = []
+        else:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                boundaries = chunk_boundaries(mm, chunk_size)
+
+    keep_output = parser.print_out or parser.out_file_handler is not None
+
+    with ProcessPoolExecutor(jobs) as executor:
+        # At most two chunks per worker are in flight, which bounds the memory used by the
+        # results waiting to be merged
+        pending = []
+        next_chunk = 0
+        while pending or next_chunk < len(boundaries):
+            if interrupted is not None and interrupted.is_set():
+                for future in pending:
+                    future.cancel()
+                break
+
+            while next_chunk < len(boundaries) and len(pending) < 2 * jobs:
+                begin, end = boundaries[next_chunk]
+                pending.append(
+                    loop.run_in_executor(
+                        executor,
+                        _parse_chunk,
+                        path,
+                        begin,
+                        end,
+                        parser.strip_hpx_counters,
+                        parser.send_stdout,
+                        keep_output,
+                    )
+                )
+                next_chunk += 1
+
+            batch, raw_keys, counter_descriptions, output = await pending.pop(0)
+
+            parser.counter_descriptions.update(counter_descriptions)
+            for frame in batch.frames:
+                await frames_queue.put(frame)
+
+            # Maps the ids of the chunk to the ids of the transmission
+            remap = []
+            definitions = batch.counter_definitions
+            batch.counter_definitions = []
+            for (_, *key), raw_key in zip(definitions, raw_keys):
+                counter_id = parser._counter_ids.get(raw_key)
+                if counter_id is None:
+                    counter_id = parser._register_counter(raw_key, tuple(key))
+                    batch.counter_definitions.append((counter_id, *key))
+                remap.append(counter_id)
+            if len(batch.counter_ids):
+                ids = np.frombuffer(batch.counter_ids, dtype=np.uint32)
+                batch.counter_ids = array("I", np.asarray(remap, dtype=np.uint32)[ids].tobytes())
+
+            for part in _split_batch(batch, parser.buffer_max_records):
+                priority = bool(part.counter_ids or part.counter_definitions)
+                await frames_queue.put(part.encode(priority))
+
+            for line in output:
+                if parser.print_out:
+                    Logger().info(line.decode(errors="replace").strip())
+                if parser.out_file_handler:
+                    parser.out_file_handler.write(line + b"\n")
+
+    await frames_queue.put(protocol.encode_end(time.time()))
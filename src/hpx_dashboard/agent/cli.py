@@ -9,19 +9,23 @@
 
 """Main entry for the hpx-dashboard agent parser.
 
-This module is for parsing the command line arguments, initializing
-the threads and the asyncio loop.
+This module is for parsing the command line arguments and running the asyncio pipeline
+of the agent (reader -> parser and batcher -> TCP client).
 """
 import argparse
 import asyncio
-import fileinput
-from queue import Queue
-import threading
+import signal
 import sys
 
 from ..common.logger import Logger
 from . import tcp_client
+from .chunked import collect_file
 from .hpx_parser import HPXParser
+from .lanes import FrameLanes
+from .launcher import hpx_command, launch
+from .merge import merge_lines
+from .readers import FollowReader, open_reader, read_lines
+from .replay import parse_speed
 
 
 def args_parse(argv):
@@ -38,11 +42,99 @@ def args_parse(argv):
     parser.add_argument(
         "-i",
         "--input",
-        dest="input_file",
-        help="input file for data collection. If not specified, stdin is used.",
+        dest="input_files",
+        nargs="+",
+        help="input file for data collection. If not specified, stdin is used. Several files (e.g. "
+        "one per locality) can be given, in which case they are read concurrently and merged by "
+        "timestamp into a single run.",
         default=None,
     )
 
+    parser.add_argument(
+        "--lag-timeout",
+        dest="lag_timeout",
+        help="with several input files, time (in ms) after which an input file without new data is "
+        "not waited for anymore when merging the files.",
+        default=500,
+    )
+
+    parser.add_argument(
+        "-f",
+        "--follow",
+        dest="follow",
+        help="follows the input file as it grows (like tail -F), until the agent is interrupted. "
+        "Truncated and rotated files are detected. Requires --input.",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--offset-file",
+        dest="offset_file",
+        help="file in which the offset in the followed input file is persisted, such that a "
+        "restarted agent resumes where it stopped. With several input files, the offset of the "
+        "n-th file is persisted in <offset-file>.<n>.",
+        default=None,
+    )
+
+    parser.add_argument(
+        "--follow-timeout",
+        dest="follow_timeout",
+        help="with --follow, time (in s) without new data in the input file after which the "
+        "collection is finished. By default, the file is followed until the agent is interrupted.",
+        default=None,
+    )
+
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        help="number of processes used for parsing the input file in parallel. This offline mode "
+        "is for already recorded outputs of hpx programs and requires --input. By default, the "
+        "input is parsed by a single process as it arrives.",
+        default=0,
+    )
+
+    parser.add_argument(
+        "--chunk-size",
+        dest="chunk_size",
+        help="size (in MB) of the chunks of the input file parsed by each process with --jobs.",
+        default=64,
+    )
+
+    parser.add_argument(
+        "--replay-speed",
+        dest="replay_speed",
+        help="speed at which a recorded output is replayed, e.g. 1x, 10x or max. Except for max, "
+        "the data is sent at the pace given by the timestamps of the hpx counters and tasks, "
+        "accelerated by this factor.",
+        default="max",
+    )
+
+    parser.add_argument(
+        "--aggregate-window",
+        dest="aggregate_window",
+        help="if specified, the samples of each counter are reduced to their min, max, mean, last "
+        "value and count over windows of this length (in ms of the hpx program) before being "
+        "sent. The server plots these aggregates as envelopes.",
+        default=None,
+    )
+
+    parser.add_argument(
+        "--task-budget",
+        dest="task_budget",
+        help="maximum number of tasks per second sent to the server. Above this rate, only a "
+        "random sample of the tasks is sent, the count, total time, min and max duration per task "
+        "name and per worker are still computed on all the tasks.",
+        default=None,
+    )
+
+    parser.add_argument(
+        "--task-sampling-interval",
+        dest="task_sampling_interval",
+        help="length (in ms) of the intervals in which the tasks are sampled with --task-budget.",
+        default=100,
+    )
+
     parser.add_argument(
         "-o",
         "--out",
@@ -85,6 +177,39 @@ def args_parse(argv):
         default=10,
     )
 
+    parser.add_argument(
+        "--buffer-max-records",
+        dest="buffer_max_records",
+        help="maximum number of records (counter samples, tasks or lines) in the buffer. When the "
+        "buffer is full, the data is sent over tcp before the buffer timeout.",
+        default=65536,
+    )
+
+    parser.add_argument(
+        "--buffer-max-bytes",
+        dest="buffer_max_bytes",
+        help="maximum size (in bytes) of the buffer. When the buffer is full, the data is sent "
+        "over tcp before the buffer timeout.",
+        default=1 << 20,
+    )
+
+    parser.add_argument(
+        "--queue-size",
+        dest="queue_size",
+        help="maximum number of blocks of lines waiting to be parsed and of batches waiting to be "
+        "sent (per lane). Once a queue is full, the previous stage of the agent waits.",
+        default=64,
+    )
+
+    parser.add_argument(
+        "--print-stats",
+        dest="print_stats",
+        action="store_true",
+        help="prints statistics about the size and the latency of the data sent over tcp at the "
+        "end of the transmission.",
+        default=False,
+    )
+
     parser.add_argument(
         "-a",
         "--address",
@@ -109,35 +234,215 @@ def args_parse(argv):
         default=2,
     )
 
+    parser.add_argument(
+        "--spool-file",
+        dest="spool_file",
+        help="file in which the data is spooled while the connection to the hpx-dashboard server "
+        "is lost. If not specified, a temporary file is used.",
+        default=None,
+    )
+
+    parser.add_argument(
+        "--spool-size",
+        dest="spool_size",
+        help="maximum size (in MB) of the spool. Once the spool is full, the data is dropped "
+        "until the connection is restored.",
+        default=512,
+    )
+
+    parser.add_argument(
+        "--replay-rate",
+        dest="replay_rate",
+        help="maximum rate (in MB/s) at which the spooled data is sent once the connection is "
+        "restored. If the rate is set to 0, the spool is replayed as fast as possible.",
+        default=10,
+    )
+
+    parser.add_argument(
+        "--reconnect-timeout",
+        dest="reconnect_timeout",
+        help="time (in s) given at the end of the transmission to restore a lost connection and "
+        "send the spooled data before giving up",
+        default=300,
+    )
+
+    parser.add_argument(
+        "--print-counter",
+        dest="print_counters",
+        action="append",
+        help="performance counter printed by the hpx program launched with `--`, can be given "
+        "several times. By default, the /threads/* and /scheduler/* counters are printed. This "
+        "option is ignored if the hpx program is given --hpx:print-counter options.",
+        default=None,
+    )
+
+    parser.add_argument(
+        "--print-counter-interval",
+        dest="print_counter_interval",
+        help="time (in ms) between two prints of the counters by the hpx program launched with "
+        "`--`.",
+        default=100,
+    )
+
+    parser.add_argument(
+        "--pipe-size",
+        dest="pipe_size",
+        help="size (in MB) requested for the pipe buffer of the hpx program launched with `--`.",
+        default=1,
+    )
+
+    parser.add_argument(
+        "--spill-threshold",
+        dest="spill_threshold",
+        help="size (in MB) of the output of the hpx program launched with `--` kept in memory when "
+        "the agent lags behind. Above this size, the output is spilled to a temporary file, such "
+        "that the hpx program never waits for the agent.",
+        default=64,
+    )
+
     return parser.parse_args(argv)
 
 
-class _StopSignal:
-    def __init__(self):
-        self.stop = False
+async def _run_pipeline(sources, parser, opt):
+    """Runs the readers, the parser and the TCP client until the end of the input streams.
+
+    Parameters
+    ----------
+    sources : list
+        readers of the input streams (see readers), or path of the input file with --jobs
+
+    Returns
+    -------
+    bool
+        True if all the data has been sent to the server
+    """
+    loop = asyncio.get_event_loop()
+    queue_size = int(opt.queue_size)
+    lines_queue = asyncio.Queue(maxsize=queue_size)
+    frames_queue = FrameLanes(maxsize=queue_size)
+
+    jobs = int(opt.jobs)
+    interrupted = asyncio.Event()
+
+    async def collect():
+        if jobs > 0:
+            chunk_size = int(float(opt.chunk_size) * (1 << 20))
+            await collect_file(parser, sources[0], frames_queue, jobs, chunk_size, interrupted)
+        else:
+            await parser.collect(lines_queue, frames_queue)
+        await frames_queue.put(None)
+
+    tasks = []
+    if jobs == 0 and len(sources) == 1:
+        tasks.append(asyncio.ensure_future(read_lines(sources[0], lines_queue)))
+    elif jobs == 0:
+        queues = [asyncio.Queue(maxsize=queue_size) for _ in sources]
+        for source, queue in zip(sources, queues):
+            tasks.append(asyncio.ensure_future(read_lines(source, queue)))
+        lag_timeout = float(opt.lag_timeout) / 1000.0
+        tasks.append(asyncio.ensure_future(merge_lines(queues, lines_queue, lag_timeout)))
+    tasks.append(asyncio.ensure_future(collect()))
+    sender = asyncio.ensure_future(
+        tcp_client.send_data(
+            opt.host,
+            int(opt.port),
+            float(opt.timeout),
+            frames_queue,
+            parser.preamble,
+            opt.spool_file,
+            int(float(opt.spool_size) * (1 << 20)),
+            float(opt.replay_rate) * (1 << 20),
+            float(opt.reconnect_timeout),
+        )
+    )
+
+    def interrupt():
+        Logger().info("Keyboard interrupt, ending transmission.")
+        interrupted.set()
+        if jobs == 0:
+            for task in tasks[: len(sources)]:
+                task.cancel()
 
+    try:
+        loop.add_signal_handler(signal.SIGINT, interrupt)
+    except NotImplementedError:
+        pass
 
-def _threaded_io_loop(loop, args):
-    asyncio.set_event_loop(loop)
+    success = await sender
+    if not success:
+        for task in tasks:
+            task.cancel()
 
-    loop.run_until_complete(tcp_client.send_data(*args))
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return success
 
 
 def agent(argv):
     """Main entry for the hpx performance counter collecting agent program.
 
-    If there is an active pipe going into the agent, this will be the default input stream.
-    Otherwise, the user has to specify an input file from which it will parse the counters.
+    If a command is given after `--`, the agent launches the hpx program and reads its output.
+    Otherwise, if there is an active pipe going into the agent, this will be the default input
+    stream. Otherwise, the user has to specify an input file from which it will parse the counters.
     """
     logger = Logger("hpx-dashboard-agent")
+
+    command = None
+    if "--" in argv:
+        command = argv[argv.index("--") + 1 :]
+        argv = argv[: argv.index("--")]
+        if not command:
+            logger.error("No hpx program has been given after `--`.")
+            return 1
     opt = args_parse(argv[1:])
 
-    input_stream = None
-    if not sys.stdin.isatty():
-        input_stream = sys.stdin
+    input_files = opt.input_files or []
+    sources = []
+    process = None
+    if command:
+        if int(opt.jobs) > 0:
+            logger.error("Parsing in parallel with --jobs requires an input file (--input).")
+            return 1
+        command = hpx_command(command, opt.print_counters, int(opt.print_counter_interval))
+        try:
+            process, source = launch(
+                command,
+                int(float(opt.pipe_size) * (1 << 20)),
+                int(float(opt.spill_threshold) * (1 << 20)),
+            )
+        except OSError as e:
+            logger.error(f"Could not launch {command[0]}: {e.strerror}.")
+            return 1
+        sources = [source]
+    elif int(opt.jobs) > 0:
+        if len(input_files) != 1:
+            logger.error("Parsing in parallel with --jobs requires one input file (--input).")
+            return 1
+        if opt.follow:
+            logger.error("Following a file with --follow can not be used with --jobs.")
+            return 1
+        sources = input_files
+    elif opt.follow:
+        if not input_files:
+            logger.error("Following a file with --follow requires an input file (--input).")
+            return 1
+        for index, input_file in enumerate(input_files):
+            offset_file = opt.offset_file
+            if offset_file and len(input_files) > 1:
+                offset_file = f"{offset_file}.{index}"
+            sources.append(
+                FollowReader(
+                    input_file,
+                    offset_file,
+                    idle_timeout=float(opt.follow_timeout) if opt.follow_timeout else None,
+                )
+            )
+    elif len(input_files) > 1:
+        sources = [open_reader(open(input_file, "rb")) for input_file in input_files]
+    elif not sys.stdin.isatty():
+        sources = [open_reader(sys.stdin.buffer)]
     else:
-        if opt.input_file:
-            input_stream = fileinput.input(files=[opt.input_file])
+        if input_files:
+            sources = [open_reader(open(input_files[0], "rb"))]
         else:
             logger.error(
                 "No active pipe is active and no input file has been specified. "
@@ -145,6 +450,27 @@ def agent(argv):
             )
             return 1
 
+    try:
+        replay_speed = parse_speed(opt.replay_speed)
+    except ValueError:
+        logger.error(f"Invalid replay speed {opt.replay_speed}, expected e.g. 1x, 10x or max.")
+        return 1
+    if replay_speed and int(opt.jobs) > 0:
+        logger.error("The replay speed can not be used with --jobs.")
+        return 1
+    aggregate_window = None
+    if opt.aggregate_window:
+        if int(opt.jobs) > 0:
+            logger.error("The aggregation of the samples can not be used with --jobs.")
+            return 1
+        aggregate_window = float(opt.aggregate_window) / 1000.0
+    task_budget = None
+    if opt.task_budget:
+        if int(opt.jobs) > 0:
+            logger.error("The sampling of the tasks can not be used with --jobs.")
+            return 1
+        task_budget = float(opt.task_budget)
+
     strip_hpx_data = True
     if opt.send_all_stdout:
         strip_hpx_data = False
@@ -155,34 +481,42 @@ def agent(argv):
         strip_hpx_data,
         opt.send_stdout,
         int(opt.buffer_timeout),
+        int(opt.buffer_max_records),
+        int(opt.buffer_max_bytes),
+        replay_speed,
+        aggregate_window,
+        task_budget,
+        float(opt.task_sampling_interval) / 1000.0,
     )
 
-    queue = Queue()
-    stop_signal = _StopSignal()
+    loop = asyncio.get_event_loop()
+    success = loop.run_until_complete(_run_pipeline(sources, parser, opt))
 
-    # Launch tcp thread
-    loop = asyncio.new_event_loop()
-    tcp_thread = threading.Thread(
-        target=_threaded_io_loop,
-        args=(loop, (opt.host, opt.port, opt.timeout, queue, stop_signal)),
-    )
-    tcp_thread.daemon = True
-    tcp_thread.start()
+    if opt.print_stats and parser.buffer:
+        logger.info(f"Buffer statistics: {parser.buffer.stats}")
 
-    # Launch collection
-    parser.start_collection(input_stream, queue)
+    for input_file, source in zip(input_files, sources):
+        if opt.follow and (source.num_truncations or source.num_rotations):
+            logger.info(
+                f"{input_file} has been truncated {source.num_truncations} times and rotated "
+                f"{source.num_rotations} times."
+            )
 
-    if not stop_signal.stop:
-        queue.join()
-    else:
-        sys.exit(1)
-    # Send last signal for the thread to kill
-    queue.put(None)
-    stop_signal.stop = True
-    tcp_thread.join()
+    if process:
+        source = sources[0]
+        if source.num_spilled_bytes:
+            logger.info(
+                f"{source.num_spilled_bytes} of the {source.num_bytes} bytes of output have been"
+                " spilled to disk because the agent lagged behind the hpx program."
+            )
+        returncode = process.wait()
+        if returncode:
+            logger.error(f"{command[0]} exited with the code {returncode}.")
+        if success:
+            return returncode
 
-    return 0
+    return 0 if success else 1
 
 
 def main():
-    agent(sys.argv)
+    sys.exit(agent(sys.argv))
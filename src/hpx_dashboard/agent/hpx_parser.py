@@ -10,30 +10,46 @@
 """Module for parsing the stdout of an HPX program.
 """
 
+import asyncio
 import time
-import pickle
 import re
+import uuid
+from collections import deque
 
 from ..common.logger import Logger
+from ..common import protocol
+from .aggregation import AggregatingBatcher
+from .batcher import Batcher
+from .readers import Checkpoint
+from .replay import COUNTER_CLOCK, TASK_CLOCK, ReplayClock, time_units
+from .sampling import TaskSampler
+
+# Regex based on
+# https://stellar-group.github.io/hpx/docs/sphinx/latest/html/manual/optimizing_hpx_applications.html#performance-counter-names
+_objectname_re = rb"/([a-zA-Z_][a-zA-Z_0-9\-]*)"
+_fullinstancename_re = rb"\{(.*)\}"
+_countername_re = rb"/([a-zA-Z_0-9\-/]+)"
+_parameters_re = rb"@?([a-zA-Z_0-9\-]+)?"
+counter_name_re = re.compile(
+    rb'"?' + _objectname_re + _fullinstancename_re + _countername_re + _parameters_re + rb'"?'
+)
+
+_hpx_separator = b"-" * 78
+_counter_infos_header = b"Information about available counter instances"
+_task_data_prefix = b"task_data,"
 
 
 class FixedBuffer:
     def __init__(self, size):
         """"""
-        self._buffer = [""] * size
-        self._size = size
-        self._index = 0
+        self._buffer = deque([b""] * size, maxlen=size)
 
     def add(self, line):
         """"""
-        if self._index < self._size:
-            self._buffer[self._index] = line
-            self._index += 1
-        else:
-            self._buffer = self._buffer[1:] + [line]
+        self._buffer.append(line)
 
     def get(self):
-        return self._buffer
+        return list(self._buffer)
 
 
 class HPXParser:
@@ -46,6 +62,12 @@ class HPXParser:
         strip_hpx_counters=False,
         send_stdout=False,
         buffer_timeout=0,
+        buffer_max_records=65536,
+        buffer_max_bytes=1 << 20,
+        replay_speed=None,
+        aggregate_window=None,
+        task_budget=None,
+        task_sampling_interval=0.1,
     ):
         """Initializes the data collectors
 
@@ -62,6 +84,21 @@ class HPXParser:
             time that happens between two TCP sends (in miliseconds)
             In pratice the buffer of the parser gets filled until a certain time and
             then the data gets sent once the time is over.
+        buffer_max_records: int
+            maximum number of records in the buffer before the data gets sent
+        buffer_max_bytes: int
+            maximum size (in bytes) of the buffer before the data gets sent
+        replay_speed: None or float
+            if not None, the data is emitted at the pace given by the HPX timestamps of the
+            counters and tasks, accelerated by this factor
+        aggregate_window: None or float
+            if not None, the samples of each counter are aggregated over windows of this length
+            (in s) before being sent (see agent.aggregation)
+        task_budget: None or float
+            if not None, maximum number of tasks sent per second. Above this rate, the tasks are
+            sampled and only their summaries are exact (see agent.sampling)
+        task_sampling_interval: float
+            length (in s) of the intervals in which the tasks are sampled
         """
 
         self.counter_descriptions = {}
@@ -71,7 +108,7 @@ class HPXParser:
 
         self.out_file_handler = None
         if out_file:
-            self.out_file_handler = open(out_file, "w")
+            self.out_file_handler = open(out_file, "wb")
 
         self.out_file = out_file
         self.print_out = print_out
@@ -81,24 +118,182 @@ class HPXParser:
         # To check when the --hpx:list-counter-infos evt finishes
         self.hpx_info_buffer = FixedBuffer(3)
 
+        # Id of each raw counter name and units already seen, so that the regex only has to run
+        # once per counter and the full counter name is sent only once to the server
+        self._counter_ids = {}
+        self.counter_definitions = []
+
+        # Identifies the transmission, such that the server can resume it after a reconnection
+        self.run_id = uuid.uuid4().bytes
+        self.start_time = None
+
         self.buffer_timeout = buffer_timeout
-        self.last_buffer_send = None
-        self.buffer = []
+        self.buffer_max_records = buffer_max_records
+        self.buffer_max_bytes = buffer_max_bytes
+        self.buffer = None
+
+        # One clock per kind of timestamp (see _line_timestamp)
+        self.replay_clocks = None
+        if replay_speed:
+            self.replay_clocks = {
+                COUNTER_CLOCK: ReplayClock(replay_speed),
+                TASK_CLOCK: ReplayClock(replay_speed),
+            }
+        self.aggregate_window = aggregate_window
+        self.task_budget = task_budget
+        self.task_sampling_interval = task_sampling_interval
+
+    def _end_counter_infos(self):
+        """Closes the --hpx:list-counter-infos block and sends the collected descriptions."""
+        self.collect_counter_infos = False
+        self.current_counter_name = ""
+        self.buffer.put(protocol.encode_counter_infos(self.counter_descriptions))
+
+    def _define_counter(self, raw_name, raw_timestamp_unit, raw_value_unit):
+        """Assigns a new id to a raw counter and adds the definition of the id (fullname,
+        full_instancename, parameters, timestamp_unit, value_unit) to the buffer.
+
+        Returns the id or None if `raw_name` is not a valid hpx performance counter name."""
+        result = counter_name_re.fullmatch(raw_name)
+        if not result:
+            return None
+        objectname, full_instancename, countername, parameters = result.groups()
+        key = (
+            (objectname + b"/" + countername).decode(),
+            full_instancename.decode(),
+            parameters.decode() if parameters else None,
+            raw_timestamp_unit.decode(),
+            raw_value_unit.decode() if raw_value_unit is not None else None,
+        )
+        counter_id = self._register_counter((raw_name, raw_timestamp_unit, raw_value_unit), key)
+        self.buffer.add_counter_definition(counter_id, key)
+        return counter_id
+
+    def _register_counter(self, raw_key, key):
+        """Assigns the next id to a counter and returns it."""
+        counter_id = len(self._counter_ids)
+        self._counter_ids[raw_key] = counter_id
+        self.counter_definitions.append((counter_id, key))
+        return counter_id
+
+    def _parse_counter(self, line):
+        """Parses a line starting like a performance counter name.
+
+        Returns
+        -------
+        bool
+            True if the line is an hpx performance counter (with or without data), false otherwise
+        """
+        # As there can be commas inside the counter name, it is essential to split the line
+        # only after the name, which finishes after the last closing bracket.
+        name_end = line.rfind(b"}")
+        if name_end == -1:
+            return False
+        name_end = line.find(b",", name_end)
+        if name_end == -1:
+            name_end = len(line)
+
+        raw_name = line[:name_end]
+
+        # The first split should be an empty string, because we split just after the counter name
+        # The fields are in order: sequence_number, timestamp, timestamp_unit, value, value_unit
+        line_split = line[name_end:].split(b",")
+        if len(line_split) in (5, 6):
+            # The line is checked before the counter is defined, such that a malformed line
+            # leaves no definition behind
+            try:
+                sequence_number = int(line_split[1])
+                timestamp = float(line_split[2])
+            except ValueError:
+                return False
+
+            raw_key = (raw_name, line_split[3], line_split[5] if len(line_split) == 6 else None)
+            counter_id = self._counter_ids.get(raw_key)
+            if counter_id is None:
+                counter_id = self._define_counter(*raw_key)
+                if counter_id is None:
+                    return False
+
+            self.buffer.add_counter(
+                counter_id, sequence_number, timestamp, protocol.parse_value(line_split[4])
+            )
+
+        # Otherwise, it means that we are somewhere in --hpx:list-counters or that the user
+        # intentionnaly prints an hpx counter: skip line but no data collection
+        elif not counter_name_re.fullmatch(raw_name):
+            return False
+
+        # It is assumed that once the first hpx performance counter is outputed, the
+        # --hpx:list-counter-infos is finished.
+        # This means that the counter informations can be sent
+        if self.collect_counter_infos:
+            self._end_counter_infos()
+
+        return True
 
-    def _add_to_buffer(self, data):
-        """Adds the data to the buffer and if the buffer_timeout is elapsed,
-        the buffer is emptied into the queue"""
+    def _parse_task(self, line):
+        """Parses a `task_data` line, returns True if the line is valid task data."""
+        split = line.split(b",")
+        if len(split) != 6:
+            return False
+
+        try:
+            self.buffer.add_task(
+                int(split[1]),  # Locality num
+                int(split[2]),  # Worker-thread num
+                split[3].decode(),  # Task name
+                float(split[4]),  # Begin time
+                float(split[5]),  # End time
+            )
+        except ValueError:
+            return False
 
-        self.buffer.append(data)
+        return True
+
+    def _parse_counter_infos(self, line):
+        """Parses a line that is inside the --hpx:list-counter-infos block.
+
+        Returns
+        -------
+        bool
+            True if the line still belongs to the block, false otherwise
+        """
+        self.hpx_info_buffer.add(line)
+
+        # Try to determine when exactly the --hpx:list-counter-infos finishes printing
+        buffer = self.hpx_info_buffer.get()
+        if buffer[0] == _hpx_separator and buffer[1] == b"" and buffer[2] != _hpx_separator:
+            self._end_counter_infos()
+            return False
+
+        # Try to extract fullname, helptext, type and version from counter infos if they exist
+        key, colon, value = line.partition(b":")
+        if colon:
+            key = key.strip().decode()
+            value = value.strip()
+            if "fullname" in key and counter_name_re.match(value):
+                self.current_counter_name = value.decode()
+                self.counter_descriptions[self.current_counter_name] = {}
+            elif self.current_counter_name and key in ("helptext", "version", "type"):
+                self.counter_descriptions[self.current_counter_name][key] = value.decode()
+                if key == "version":
+                    self.current_counter_name = ""
 
-        if (time.time() - self.last_buffer_send) * 1000.0 > self.buffer_timeout:
-            self.queue.put(pickle.dumps(("regular-data", self.buffer)))
-            self.last_buffer_send = time.time()
-            self.buffer = []
+        # There could be still empty lines between the counter infos that we want to count
+        # as part of hpx output
+        return True
 
     def parse_line(self, line):
         """Parses a line and if the lines has some hpx performance counter data, it is added to the data
 
+        The kind of line is decided by a cheap check on its first bytes, such that the regex is
+        only tried on lines that can actually be performance counters.
+
+        Parameters
+        ----------
+        line : bytes
+            raw line of the program output
+
         Returns
         -------
         bool
@@ -106,158 +301,137 @@ class HPXParser:
         """
 
         line = line.strip()
-        hpx_separator = "-" * 78
-        self.hpx_info_buffer.add(line)
-
-        # Regex based on
-        # https://stellar-group.github.io/hpx/docs/sphinx/latest/html/manual/optimizing_hpx_applications.html#performance-counter-names
-        objectname_re = "/([a-zA-Z_][a-zA-Z_0-9\\-]*)"
-        fullinstancename_re = "\\{(.*)\\}"
-        countername_re = "/([a-zA-Z_0-9\\-/]+)"
-        parameters_re = "@?([a-zA-Z_0-9\\-]+)?"
-        regex = '"?' + objectname_re + fullinstancename_re + countername_re + parameters_re + '"?'
-
-        result = re.match("^" + regex, line)
-
-        if result:
-            # As there can be commas inside the counter name, it is essential to split the line
-            # only after the name. The first split should be an empty string, because we split
-            # just after the counter name
-            regex_end = result.span()[1]
-            line_split = line[regex_end:].split(",")
-            if len(line_split) in [5, 6]:
-                objectname = result.group(1)
-                full_instancename = result.group(2)
-                countername = result.group(3)
-                parameters = result.group(4)
-
-                fullname = objectname + "/" + countername
-
-                value_unit = None
-                if len(line_split) == 6:
-                    value_unit = line_split[5]
-
-                # The given data in order: fullname, full_instancename, parameters, sequence_number,
-                # timestamp, timestamp_unit, value, value_unit
-                data = (
-                    "counter-data",
-                    [
-                        fullname,
-                        full_instancename,
-                        parameters,
-                        int(line_split[1]),
-                        float(line_split[2]),
-                        line_split[3],
-                        line_split[4],
-                        value_unit,
-                    ],
-                )
-                self._add_to_buffer(data)
-
-            # Means that we are somewhere in --hpx:list-counters or that the user intentionnaly
-            # prints an hpx counter
-            else:
-                # Skip line but no data collection
-                return True
-
-            # It is assumed that once the first hpx performance counter is outputed, the
-            # --hpx:list-counter-infos is finished.
-            # This means that the counter informations can be sent
+        if not line:
             if self.collect_counter_infos:
-                self.queue.put(pickle.dumps(("counter-infos", self.counter_descriptions)))
-            self.collect_counter_infos = False
+                return self._parse_counter_infos(line)
+            return False
 
+        first = line[0]
+        # Performance counters start either with `/` or `"/`
+        if (first == 0x2F or first == 0x22) and self._parse_counter(line):
             return True
 
-        # Try to determine when exactly the --hpx:list-counter-infos finishes printing
-        if self.collect_counter_infos:
-            buffer = self.hpx_info_buffer.get()
-            if buffer[0] == hpx_separator and buffer[1] == "\n" and buffer[2] != hpx_separator:
-                self.collect_counter_infos = False
-
-        # Lines generated by --hpx:list-counter-infos
-        if line == "Information about available counter instances":
-            self.collect_counter_infos = True
+        if first == 0x74 and line.startswith(_task_data_prefix) and self._parse_task(line):
             return True
 
-        # Try to extract fullname, helptext, type and version from counter infos if they exist
-        split = line.split(":")
-        if len(split) > 1 and self.collect_counter_infos:
-            split[0] = split[0].strip()
-            split[1] = split[1].strip()
-            if "fullname" in split[0] and re.match(regex, split[1]):
-                self.current_counter_name = split[1]
-                self.counter_descriptions[self.current_counter_name] = {}
-                return True
-            elif self.current_counter_name:
-                if split[0] in ["helptext", "version", "type"]:
-                    self.counter_descriptions[self.current_counter_name][split[0]] = "".join(
-                        split[1:]
-                    )
-                    if split[0] == "version":
-                        self.current_counter_name = ""
-                    return True
-
-        # If we arrive here, it means that the line is neither some counter infos or performance
-        # counter data. There could be still `\n` between the counter infos that we want to count
-        # as part of hpx output
-        if self.collect_counter_infos:
+        if self.collect_counter_infos and self._parse_counter_infos(line):
             return True
 
-        # Collect task counter infos
-        split = line.split(",")
-        if len(split) == 6 and split[0] == "task_data":
-            data = (
-                "task-data",
-                [
-                    split[1],  # Locality num
-                    split[2],  # Worker-thread num
-                    split[3],  # Task name
-                    split[4],  # Begin time
-                    split[5],  # End time
-                ],
-            )
-            self._add_to_buffer(data)
+        # Lines generated by --hpx:list-counter-infos
+        if line == _counter_infos_header:
+            self.collect_counter_infos = True
             return True
 
         # If we arrive here, this means that the line should be a simple non hpx-related stdout
-        else:
-            return False
-
-    def start_collection(self, input_stream, queue):
-        """Starts collecting from the input stream until the HPX program is finished or interrupted
-        and sends the data to the hpx-dashboard server.
+        return False
+
+    def _process_line(self, line):
+        """Parses a line and takes care of redirecting the output of the program."""
+        strip_line = self.parse_line(line)
+        strip_line = strip_line and self.strip_hpx_counters
+
+        if strip_line:
+            return
+
+        if self.print_out:
+            Logger().info(line.decode(errors="replace").strip())
+        if self.out_file_handler:
+            self.out_file_handler.write(line + b"\n")
+        if self.send_stdout:
+            self.buffer.add_line(line.decode(errors="replace").strip())
+
+    def preamble(self):
+        """Returns the frames that restore the state of the transmission on the server after a
+        reconnection: the beginning of the transmission, the counter infos and the definitions of
+        all the counters seen so far."""
+        frames = [protocol.encode_begin(self.start_time, self.run_id)]
+        if self.counter_descriptions and not self.collect_counter_infos:
+            frames.append(protocol.encode_counter_infos(self.counter_descriptions))
+        if self.counter_definitions:
+            batch = protocol.Batch()
+            for counter_id, name in self.counter_definitions:
+                batch.add_counter_definition(counter_id, name)
+            frames.append(batch.encode(priority=True))
+        return frames
+
+    @staticmethod
+    def _line_timestamp(line):
+        """Returns the clock (replay.COUNTER_CLOCK or replay.TASK_CLOCK) and the timestamp (in s)
+        of a counter or task line, None for other lines.
+
+        The timestamps of the counters and the tasks come from different clocks, they can only be
+        compared with the timestamps of the same clock."""
+        line = line.strip()
+        try:
+            if line.startswith(_task_data_prefix):
+                # The task is printed once it is finished
+                return TASK_CLOCK, float(line.split(b",")[5])
+
+            name_end = line.rfind(b"}")
+            if name_end != -1 and line[:1] in (b"/", b'"'):
+                fields = line[name_end:].split(b",")
+                return COUNTER_CLOCK, float(fields[2]) * time_units.get(fields[3].strip(), 1.0)
+        except (ValueError, IndexError):
+            pass
+        return None
+
+    async def _replay_lines(self, lines):
+        """Processes the lines, waiting before each counter or task until it is time to emit it.
+
+        The counters and the tasks are paced on their own clock, each one starting with its first
+        line."""
+        for line in lines:
+            timestamp = self._line_timestamp(line)
+            if timestamp is not None:
+                clock, timestamp = timestamp
+                delay = self.replay_clocks[clock].delay(timestamp)
+                # Shorter delays are caught up with the next records
+                if delay > 0.001:
+                    await self.buffer.drain()
+                    await asyncio.sleep(delay)
+            self._process_line(line)
+
+    async def collect(self, lines_queue, frames_queue):
+        """Collects the lines from the lines queue until the HPX program is finished or interrupted
+        and puts the encoded data in the frames queue.
 
         Parameters
         ----------
-        input_stream : mixed
-            streaming input (either stdin or fileinput) TCPClient
-            TCP client to which the data will be send
-        queue : asyncio.Queue
-            queue for putting the parsed data to be send via TCP
+        lines_queue : asyncio.Queue
+            queue of lists of lines (see readers.read_lines), None marks the end of the stream
+        frames_queue : FrameLanes
+            queue for putting the encoded frames to be send via TCP
         """
+        self.queue = frames_queue
+
+        self.start_time = time.time()
+        await self.queue.put(protocol.encode_begin(self.start_time, self.run_id))
+        task_sampler = None
+        if self.task_budget:
+            task_sampler = TaskSampler(self.task_budget, self.task_sampling_interval)
+
+        options = (self.buffer_timeout, self.buffer_max_records, self.buffer_max_bytes)
+        if self.aggregate_window:
+            self.buffer = AggregatingBatcher(
+                frames_queue, self.aggregate_window, *options, task_sampler=task_sampler
+            )
+        else:
+            self.buffer = Batcher(frames_queue, *options, task_sampler=task_sampler)
+
+        while True:
+            lines = await lines_queue.get()
+            if lines is None:
+                break
+            if isinstance(lines, Checkpoint):
+                self.buffer.add_checkpoint(lines)
+                continue
+
+            if self.replay_clocks:
+                await self._replay_lines(lines)
+            else:
+                for line in lines:
+                    self._process_line(line)
+            await self.buffer.drain()
 
-        self.queue = queue
-
-        self.queue.put(pickle.dumps(("transmission_begin", time.time())))
-        self.last_buffer_send = time.time()
-
-        try:
-            for line in input_stream:
-                strip_line = self.parse_line(line)
-                strip_line = strip_line and self.strip_hpx_counters
-
-                # Take care of redirecting the output of the program
-                if self.print_out and not strip_line:
-                    Logger().info(line.strip())
-                if self.out_file_handler and not strip_line:
-                    self.out_file_handler.write(line)
-                if self.send_stdout and not strip_line:
-                    self._add_to_buffer(("line", line.strip()))
-        except KeyboardInterrupt:
-            Logger().info("Keyboard interrupt, ending transmission.")
-
-        if self.buffer:
-            self.queue.put(pickle.dumps(("regular-data", self.buffer)))
-
-        self.queue.put(pickle.dumps(("transmission_end", time.time())))
+        await self.buffer.close()
+        await self.queue.put(protocol.encode_end(time.time()))
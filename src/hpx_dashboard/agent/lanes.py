@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Priority lanes between the parser and the TCP client of the agent.
+"""
+
+import asyncio
+from collections import namedtuple
+
+from ..common import protocol
+
+# Marker of a checkpoint (see readers.Checkpoint) in one of the lanes
+LaneCheckpoint = namedtuple("LaneCheckpoint", ["checkpoint", "priority"])
+
+
+class FrameLanes:
+    """Two bounded queues of frames with the interface of an asyncio.Queue.
+
+    The frames are put in the priority or the bulk lane according to the flags of their header,
+    None (the end of the stream) is put in the bulk lane. `get` always returns the frames of the
+    priority lane first, the bulk lane is drained with the remaining throughput. The order of the
+    frames is kept inside each lane.
+    """
+
+    def __init__(self, maxsize=0):
+        self.priority = asyncio.Queue(maxsize=maxsize)
+        self.bulk = asyncio.Queue(maxsize=maxsize)
+        self._not_empty = asyncio.Event()
+
+    def _lane(self, frame):
+        if isinstance(frame, LaneCheckpoint):
+            return self.priority if frame.priority else self.bulk
+        if frame is not None and protocol.is_priority(frame):
+            return self.priority
+        return self.bulk
+
+    def qsize(self):
+        return self.priority.qsize() + self.bulk.qsize()
+
+    def empty(self):
+        return self.priority.empty() and self.bulk.empty()
+
+    def put_nowait(self, frame):
+        """Puts a frame in its lane, raises asyncio.QueueFull if the lane is full."""
+        self._lane(frame).put_nowait(frame)
+        self._not_empty.set()
+
+    async def put(self, frame):
+        """Puts a frame in its lane, waits if the lane is full."""
+        await self._lane(frame).put(frame)
+        self._not_empty.set()
+
+    async def get(self):
+        """Returns the next frame of the priority lane or, if it is empty, of the bulk lane."""
+        while True:
+            if not self.priority.empty():
+                return self.priority.get_nowait()
+            if not self.bulk.empty():
+                return self.bulk.get_nowait()
+            self._not_empty.clear()
+            await self._not_empty.wait()
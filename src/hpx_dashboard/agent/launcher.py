@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Launch of the HPX program by the agent (hpx-dashboard-agent -- ./app args).
+"""
+
+import fcntl
+import subprocess
+
+from ..common.logger import Logger
+from .readers import SpillingPipeReader
+
+# Not defined by the fcntl module before Python 3.10
+F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", 1031)
+
+default_counters = ["/threads/*", "/scheduler/*"]
+
+
+def hpx_command(command, counters=None, interval=100):
+    """Adds the flags printing the performance counters to the command of the HPX program.
+
+    The flags already given by the user are not overriden.
+
+    Parameters
+    ----------
+    command : list
+        program and its arguments
+    counters : list
+        names of the counters to print, default_counters if None
+    interval : int
+        time (in ms) between two prints of the counters
+    """
+    command = list(command)
+    if not any(arg.startswith("--hpx:print-counter=") for arg in command):
+        for counter in counters or default_counters:
+            command.append(f"--hpx:print-counter={counter}")
+    if not any(arg.startswith("--hpx:print-counter-interval") for arg in command):
+        command.append(f"--hpx:print-counter-interval={interval}")
+    if "--hpx:list-counter-infos" not in command:
+        command.append("--hpx:list-counter-infos")
+    return command
+
+
+def set_pipe_size(fd, size):
+    """Enlarges the buffer of a pipe, returns the new size or None if it could not be changed.
+
+    Unprivileged processes can not go above /proc/sys/fs/pipe-max-size, in which case this maximum
+    is used."""
+    try:
+        return fcntl.fcntl(fd, F_SETPIPE_SZ, size)
+    except OSError:
+        pass
+
+    try:
+        with open("/proc/sys/fs/pipe-max-size") as max_size:
+            return fcntl.fcntl(fd, F_SETPIPE_SZ, min(size, int(max_size.read())))
+    except (OSError, ValueError):
+        return None
+
+
+def launch(command, pipe_size=1 << 20, max_memory=64 << 20):
+    """Starts the HPX program with its standard output redirected to a pipe read by the agent.
+
+    Parameters
+    ----------
+    command : list
+        program and its arguments
+    pipe_size : int
+        requested size (in bytes) of the buffer of the pipe
+    max_memory : int
+        size (in bytes) of the output kept in memory before spilling to disk when the agent lags
+
+    Returns
+    -------
+    the subprocess.Popen object and the reader of its standard output
+    """
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=0)
+    fd = process.stdout.fileno()
+
+    size = set_pipe_size(fd, pipe_size)
+    if size is None:
+        Logger().warning("The size of the pipe buffer could not be changed.")
+
+    return process, SpillingPipeReader(fd, max_memory=max_memory)
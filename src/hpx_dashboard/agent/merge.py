@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Merge of several output streams of the HPX program (e.g. one file per locality) into one.
+"""
+
+import asyncio
+from collections import deque
+import heapq
+
+from .hpx_parser import HPXParser
+from .readers import Checkpoint
+from .replay import COUNTER_CLOCK
+
+
+async def merge_lines(queues, queue, lag_timeout=0.5):
+    """Merges the lists of lines of several streams by timestamp and puts them in `queue`.
+
+    The lines are ordered by the timestamps of the counters, then by the times of the tasks, the
+    two coming from different clocks (see HPXParser._line_timestamp). Each line takes the last
+    counter timestamp and the last task time of its stream: a task stays after the counter lines
+    that precede it in its stream, and the streams of tasks only are merged by the task times. The
+    lines without timestamp (e.g. the counter infos or the output of the program) thus stay next
+    to the previous line of their stream, and the order of the lines is kept inside each stream.
+
+    The checkpoints of the streams (see readers.Checkpoint) are put in `queue` after the list of
+    merged lines containing the lines that precede them in their stream.
+
+    A line can only be merged once all the streams have a line waiting. If a stream has no data
+    for more than `lag_timeout` seconds, it is considered as lagging and the other streams are
+    merged without it until it delivers data again. As the queues of the streams are bounded, a
+    lagging stream thus never stalls the others.
+
+    Parameters
+    ----------
+    queues : list
+        asyncio.Queue of each stream, filled by readers.read_lines
+    queue : asyncio.Queue
+        queue for the merged lists of lines, None is put once all the streams are finished
+    lag_timeout : float
+        time (in s) after which a stream without data is not waited for anymore
+    """
+    loop = asyncio.get_event_loop()
+    heads = [deque() for _ in queues]
+    # Last (counter timestamp, task time) of each stream
+    timestamps = [(float("-inf"), float("-inf"))] * len(queues)
+    getters = {}
+    # Time at which each stream without data started to wait for its queue
+    wait_begins = {}
+    active = set(range(len(queues)))
+    lagging = set()
+
+    def receive(index):
+        lines = getters.pop(index).result()
+        lagging.discard(index)
+        if lines is None:
+            active.discard(index)
+            return
+        if isinstance(lines, Checkpoint):
+            heads[index].append((timestamps[index], lines))
+            return
+        for line in lines:
+            timestamp = HPXParser._line_timestamp(line)
+            if timestamp is not None:
+                clock, timestamp = timestamp
+                if clock == COUNTER_CLOCK:
+                    timestamps[index] = (timestamp, timestamps[index][1])
+                else:
+                    timestamps[index] = (timestamps[index][0], timestamp)
+            heads[index].append((timestamps[index], line))
+
+    try:
+        while active:
+            for index in active:
+                if not heads[index] and index not in getters:
+                    getters[index] = asyncio.ensure_future(queues[index].get())
+                    wait_begins[index] = loop.time()
+
+            # The streams without data that are not lagging yet block the merge, until the first
+            # of them reaches its lag timeout
+            blocking = [index for index in active - lagging if not heads[index]]
+            if blocking:
+                deadline = min(wait_begins[index] for index in blocking) + lag_timeout
+                await asyncio.wait(
+                    list(getters.values()),
+                    timeout=max(deadline - loop.time(), 0),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+            elif not any(heads[index] for index in active):
+                # Only lagging streams without data, any of them can continue
+                await asyncio.wait(list(getters.values()), return_when=asyncio.FIRST_COMPLETED)
+
+            now = loop.time()
+            for index in list(getters):
+                if getters[index].done():
+                    receive(index)
+                elif index not in lagging and now - wait_begins[index] >= lag_timeout:
+                    lagging.add(index)
+            if any(not heads[index] for index in active - lagging):
+                continue
+
+            # Merges until one of the streams needs to be refilled
+            heap = [(heads[index][0][0], index) for index in active if heads[index]]
+            heapq.heapify(heap)
+            lines = []
+            checkpoints = []
+            while heap:
+                _, index = heapq.heappop(heap)
+                line = heads[index].popleft()[1]
+                if isinstance(line, Checkpoint):
+                    checkpoints.append(line)
+                else:
+                    lines.append(line)
+                if not heads[index]:
+                    break
+                heapq.heappush(heap, (heads[index][0][0], index))
+            if lines:
+                await queue.put(lines)
+            for checkpoint in checkpoints:
+                await queue.put(checkpoint)
+    finally:
+        for getter in getters.values():
+            getter.cancel()
+        await queue.put(None)
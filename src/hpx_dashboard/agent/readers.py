@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Asynchronous readers of the output of the HPX program.
+
+The readers read large blocks of bytes and put them line by line (in lists of lines) in a
+bounded queue, such that the parser only has to await once per block.
+"""
+
+import asyncio
+from collections import deque
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+
+
+class PipeReader:
+    """Reads a pipe, socket or character device (e.g. stdin) without blocking the event loop."""
+
+    def __init__(self, file):
+        self.file = file
+        self._reader = None
+
+    async def read(self, size):
+        if self._reader is None:
+            loop = asyncio.get_event_loop()
+            self._reader = asyncio.StreamReader(limit=size)
+            await loop.connect_read_pipe(
+                lambda: asyncio.StreamReaderProtocol(self._reader), self.file
+            )
+        return await self._reader.read(size)
+
+
+class FileReader:
+    """Reads a regular file, the blocking reads are done in the default executor of the loop."""
+
+    def __init__(self, file):
+        self.file = file
+
+    async def read(self, size):
+        return await asyncio.get_event_loop().run_in_executor(None, self.file.read, size)
+
+
+class SpillingPipeReader:
+    """Reads a pipe in a dedicated thread such that the writer of the pipe never waits.
+
+    The thread reads the pipe with large `os.read` calls and keeps the blocks in memory. If the
+    blocks are not consumed fast enough and more than `max_memory` bytes are waiting, the next
+    blocks are spilled to a temporary file, from which they are read back in order.
+    """
+
+    def __init__(self, fd, block_size=1 << 20, max_memory=64 << 20):
+        """
+        Parameters
+        ----------
+        fd : int
+            file descriptor of the read end of the pipe
+        block_size : int
+            size of the reads of the pipe
+        max_memory : int
+            maximum size (in bytes) of the blocks kept in memory before spilling to disk
+        """
+        self.fd = fd
+        self.block_size = block_size
+        self.max_memory = max_memory
+
+        self.num_bytes = 0
+        self.num_spilled_bytes = 0
+
+        self._lock = threading.Lock()
+        self._blocks = deque()
+        self._memory_bytes = 0
+        self._eof = False
+
+        # Once spilling starts, all the blocks go to the spill file until it is read entirely
+        self._spill = None
+        self._spill_read = 0
+        self._spill_write = 0
+
+        self._loop = None
+        self._has_data = None
+        self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                block = os.read(self.fd, self.block_size)
+            except OSError:
+                block = b""
+
+            with self._lock:
+                if not block:
+                    self._eof = True
+                elif self._spill_write or self._memory_bytes + len(block) > self.max_memory:
+                    if self._spill is None:
+                        self._spill = tempfile.TemporaryFile()
+                    os.pwrite(self._spill.fileno(), block, self._spill_write)
+                    self._spill_write += len(block)
+                    self.num_spilled_bytes += len(block)
+                else:
+                    self._blocks.append(block)
+                    self._memory_bytes += len(block)
+                self.num_bytes += len(block)
+
+            self._loop.call_soon_threadsafe(self._has_data.set)
+            if not block:
+                return
+
+    async def read(self, size):
+        if self._thread is None:
+            self._loop = asyncio.get_event_loop()
+            self._has_data = asyncio.Event()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+        while True:
+            with self._lock:
+                if self._blocks:
+                    block = self._blocks.popleft()
+                    self._memory_bytes -= len(block)
+                    return block
+
+                if self._spill_read < self._spill_write:
+                    size = min(size, self._spill_write - self._spill_read)
+                    block = os.pread(self._spill.fileno(), size, self._spill_read)
+                    self._spill_read += len(block)
+                    if self._spill_read == self._spill_write:
+                        self._spill.truncate(0)
+                        self._spill_read = self._spill_write = 0
+                    return block
+
+                if self._eof:
+                    return b""
+                self._has_data.clear()
+            await self._has_data.wait()
+
+
+class Checkpoint:
+    """Offset of a followed file, which is committed once the lines before it have been sent.
+
+    The checkpoints are put between the lists of lines by read_lines. The batcher then puts a
+    marker of the checkpoint in each lane of frames, right after the records of the lines before
+    it (see Batcher.add_checkpoint), and the checkpoint is committed once the TCP client has sent
+    the markers of all the lanes (see ReconnectingSender.send).
+    """
+
+    __slots__ = ("reader", "file_id", "offset", "pending")
+
+    def __init__(self, reader, file_id, offset):
+        self.reader = reader
+        self.file_id = file_id
+        self.offset = offset
+        # Number of lanes whose marker has not been sent yet
+        self.pending = 0
+
+    def reached(self):
+        """Called once the marker of the checkpoint in a lane has been sent."""
+        self.pending -= 1
+        if self.pending <= 0:
+            self.reader.commit(self)
+
+
+class FollowReader:
+    """Follows a file that is still being written, like `tail -F`.
+
+    The file is read by large blocks. Once its end is reached, the file is polled with a delay that
+    doubles (up to `max_poll`) as long as no new data arrives, such that an idle program costs
+    nearly nothing. If the file is truncated, it is read again from the beginning. If it is rotated
+    (the path points to another file), the rest of the old file is read before switching to the new
+    one. In both cases, an unfinished last line is ended before the new data.
+
+    The offset of the last complete line that has been sent to the server can be persisted in
+    `offset_file` (see Checkpoint), in which case the reading resumes from this offset when the
+    agent is restarted on the same file.
+    """
+
+    def __init__(
+        self,
+        path,
+        offset_file=None,
+        min_poll=0.05,
+        max_poll=2.0,
+        idle_timeout=None,
+        save_interval=1.0,
+    ):
+        """
+        Parameters
+        ----------
+        path : str
+            path of the followed file
+        offset_file : str
+            file in which the offset is persisted, None for not persisting the offset
+        min_poll, max_poll : float
+            first and maximum delay (in s) between two polls of the file
+        idle_timeout : float
+            the reading is finished after this time (in s) without new data, None for never
+        save_interval : float
+            minimum time (in s) between two checkpoints, and thus between two writes of the offset
+            file
+        """
+        self.path = path
+        self.offset_file = offset_file
+        self.min_poll = min_poll
+        self.max_poll = max_poll
+        self.idle_timeout = idle_timeout
+        self.save_interval = save_interval
+
+        self.num_truncations = 0
+        self.num_rotations = 0
+
+        self._fd = None
+        self._id = None
+        self._offset = 0
+        # Offset just after the last end of line that has been read
+        self._line_offset = 0
+        # File id and offset of the last checkpoint committed
+        self._committed = None
+        self._last_checkpoint = 0
+
+    def _open(self):
+        """Opens the file at `path`, returns False if it does not exist."""
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        file_stat = os.fstat(fd)
+        self._fd = fd
+        self._id = (file_stat.st_dev, file_stat.st_ino)
+        self._offset = self._line_offset = 0
+        return True
+
+    def _restore(self):
+        """Opens the file and resumes from the persisted offset if it refers to the same file."""
+        if not self._open() or not self.offset_file:
+            return
+        try:
+            with open(self.offset_file) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (state.get("device"), state.get("inode")) != self._id:
+            return
+        if state.get("offset", 0) <= os.fstat(self._fd).st_size:
+            self._offset = self._line_offset = state["offset"]
+
+    def checkpoint(self, force=False):
+        """Returns the checkpoint of the last complete line read, or None if the offset is not
+        persisted or if the last checkpoint is more recent than `save_interval` (unless `force`).
+        """
+        if not self.offset_file or self._id is None:
+            return None
+        if not force and time.time() - self._last_checkpoint < self.save_interval:
+            return None
+        self._last_checkpoint = time.time()
+        return Checkpoint(self, self._id, self._line_offset)
+
+    def commit(self, checkpoint):
+        """Persists the offset of a checkpoint, once all the lines before it have been sent."""
+        self._committed = (checkpoint.file_id, checkpoint.offset)
+        self.save()
+
+    def save(self):
+        """Writes the offset of the last committed checkpoint to the offset file."""
+        if not self.offset_file or self._committed is None:
+            return
+        (device, inode), offset = self._committed
+        state = {
+            "path": os.path.abspath(self.path),
+            "device": device,
+            "inode": inode,
+            "offset": offset,
+        }
+        tmp_file = self.offset_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_file, self.offset_file)
+
+    def _poll(self, size):
+        """Reads the next block, or checks for truncation and rotation at the end of the file.
+
+        Returns the block, or None if there is no new data."""
+        if self._fd is None and not self._open():
+            return None
+
+        block = os.pread(self._fd, size, self._offset)
+        if block:
+            self._offset += len(block)
+            end_of_line = block.rfind(b"\n")
+            if end_of_line >= 0:
+                self._line_offset = self._offset - len(block) + end_of_line + 1
+            return block
+
+        # An unfinished last line is ended, instead of being joined with the new data
+        end_of_line = b"\n" if self._offset != self._line_offset else None
+        if os.fstat(self._fd).st_size < self._offset:
+            self.num_truncations += 1
+            self._offset = self._line_offset = 0
+            return end_of_line
+
+        try:
+            path_stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        if (path_stat.st_dev, path_stat.st_ino) != self._id:
+            self.num_rotations += 1
+            os.close(self._fd)
+            self._fd = None
+            self._open()
+            return end_of_line
+        return None
+
+    async def read(self, size):
+        loop = asyncio.get_event_loop()
+        if self._id is None:
+            await loop.run_in_executor(None, self._restore)
+
+        delay = self.min_poll
+        idle_since = time.time()
+        while True:
+            block = await loop.run_in_executor(None, self._poll, size)
+            if block:
+                return block
+
+            if self.idle_timeout is not None and time.time() - idle_since > self.idle_timeout:
+                return b""
+            await asyncio.sleep(delay)
+            delay = min(2 * delay, self.max_poll)
+
+
+def open_reader(file):
+    """Returns the reader adapted to the binary file object `file`."""
+    mode = os.fstat(file.fileno()).st_mode
+    if stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode) or stat.S_ISCHR(mode):
+        return PipeReader(file)
+    return FileReader(file)
+
+
+async def read_lines(reader, queue, block_size=1 << 16):
+    """Reads `reader` by blocks until the end of the stream and puts the lists of lines that are in
+    the blocks in `queue`.
+
+    The lines are given without their end of line. Once the stream is finished (or if the task is
+    cancelled), None is put in the queue. For a FollowReader, its checkpoints are put in the queue
+    after the lines they follow.
+
+    Parameters
+    ----------
+    reader
+        reader returned by open_reader
+    queue : asyncio.Queue
+        queue for the lists of lines
+    block_size : int
+        size of the blocks that are read
+    """
+    checkpoints = isinstance(reader, FollowReader)
+    rest = b""
+    try:
+        while True:
+            block = await reader.read(block_size)
+            if not block:
+                break
+
+            lines = (rest + block).split(b"\n")
+            rest = lines.pop()
+            if lines:
+                await queue.put(lines)
+                checkpoint = reader.checkpoint() if checkpoints else None
+                if checkpoint is not None:
+                    await queue.put(checkpoint)
+    finally:
+        if rest:
+            await queue.put([rest])
+        if checkpoints:
+            checkpoint = reader.checkpoint(force=True)
+            if checkpoint is not None:
+                await queue.put(checkpoint)
+        await queue.put(None)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Pacing of the replay of recorded HPX outputs.
+"""
+
+import time
+
+# Clocks of the timestamps of the lines: the counter timestamps are relative to the start of the
+# HPX runtime and given with their unit, the task times (in s) are the ones of the task timers,
+# whose origin differs
+COUNTER_CLOCK = 0
+TASK_CLOCK = 1
+
+# Conversion of the timestamp units printed by HPX to seconds
+time_units = {
+    b"[s]": 1.0,
+    b"[ms]": 1e-3,
+    b"[us]": 1e-6,
+    b"[ns]": 1e-9,
+}
+
+
+def parse_speed(speed):
+    """Converts a replay speed given on the command line (e.g. `10`, `10x` or `max`) to a float.
+
+    Returns None for `max`, meaning that the data is not paced."""
+    speed = str(speed).strip().lower()
+    if speed == "max":
+        return None
+    speed = float(speed[:-1] if speed.endswith("x") else speed)
+    if speed <= 0:
+        raise ValueError("The replay speed should be positive.")
+    return speed
+
+
+class ReplayClock:
+    """Maps the timestamps of the HPX program to the wall clock of the replay.
+
+    The first timestamp is emitted immediately, the following ones are emitted once
+    (timestamp - first timestamp) / speed seconds have elapsed since the beginning of the replay.
+    """
+
+    def __init__(self, speed):
+        """
+        Parameters
+        ----------
+        speed : float
+            replay speed, 1 replays the data at the rate it was recorded
+        """
+        self.speed = speed
+        self._first_timestamp = None
+        self._begin = None
+
+    def delay(self, timestamp):
+        """Returns the time (in s) to wait before emitting data with the timestamp `timestamp`
+        (in s)."""
+        if self._first_timestamp is None:
+            self._first_timestamp = timestamp
+            self._begin = time.time()
+            return 0.0
+        return self._begin + (timestamp - self._first_timestamp) / self.speed - time.time()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Sampling of the tasks in the agent.
+"""
+
+import random
+import time
+
+
+class TaskSampler:
+    """Time-stratified reservoir sampling of the tasks, with exact summaries of all the tasks.
+
+    The time is divided in intervals. In each interval, at most `budget * interval` tasks are kept
+    with reservoir sampling, such that every task of the interval has the same probability to be
+    forwarded. If the budget is not exceeded, all the tasks are forwarded.
+
+    The summaries (count, total time, min and max duration per task name and per worker) take all
+    the tasks into account, along with the number of tasks seen and forwarded for each locality,
+    from which the server knows the sampling ratio.
+    """
+
+    def __init__(self, budget, interval=0.1, seed=None):
+        """
+        Parameters
+        ----------
+        budget : float
+            maximum number of tasks forwarded per second
+        interval : float
+            length (in s) of the intervals in which the tasks are sampled
+        seed : int
+            seed of the random generator
+        """
+        self.budget = budget
+        self.interval = interval
+        self.capacity = max(1, int(budget * interval))
+
+        self._random = random.Random(seed)
+        self._reservoir = []
+        self._num_seen = 0
+        self._interval_end = None
+
+        # For each locality: {"seen": int, "sent": int, "names": {}, "workers": {}} where names and
+        # workers contain [count, total time, min duration, max duration]
+        self._summaries = {}
+        # Localities, names and workers of which the summary changed since the last flush
+        self._changed = {}
+
+    def _summarize(self, summaries, key, duration):
+        summary = summaries.get(key)
+        if summary is None:
+            summaries[key] = [1, duration, duration, duration]
+            return
+        summary[0] += 1
+        summary[1] += duration
+        if duration < summary[2]:
+            summary[2] = duration
+        if duration > summary[3]:
+            summary[3] = duration
+
+    def add(self, locality, worker_id, name, start, end):
+        """Adds a task to the summaries and to the reservoir of the current interval."""
+        if self._interval_end is None:
+            self._interval_end = time.time() + self.interval
+
+        summary = self._summaries.get(locality)
+        if summary is None:
+            summary = {"seen": 0, "sent": 0, "names": {}, "workers": {}}
+            self._summaries[locality] = summary
+        summary["seen"] += 1
+        self._summarize(summary["names"], name, end - start)
+        self._summarize(summary["workers"], worker_id, end - start)
+        changed = self._changed.get(locality)
+        if changed is None:
+            changed = self._changed[locality] = (set(), set())
+        changed[0].add(name)
+        changed[1].add(worker_id)
+
+        task = (locality, worker_id, name, start, end)
+        self._num_seen += 1
+        if len(self._reservoir) < self.capacity:
+            self._reservoir.append(task)
+        else:
+            index = self._random.randrange(self._num_seen)
+            if index < self.capacity:
+                self._reservoir[index] = task
+
+    def expired(self):
+        """Returns True if the current interval is finished."""
+        return self._interval_end is not None and time.time() >= self._interval_end
+
+    def flush(self):
+        """Ends the current interval.
+
+        Returns
+        -------
+        tuple
+            the list of sampled tasks and the summaries that changed since the last flush
+        """
+        tasks = self._reservoir
+        for task in tasks:
+            self._summaries[task[0]]["sent"] += 1
+
+        summaries = {}
+        for locality, (names, workers) in self._changed.items():
+            summary = self._summaries[locality]
+            summaries[locality] = {
+                "seen": summary["seen"],
+                "sent": summary["sent"],
+                "names": {name: summary["names"][name] for name in names},
+                "workers": {worker_id: summary["workers"][worker_id] for worker_id in workers},
+            }
+
+        self._reservoir = []
+        self._num_seen = 0
+        self._interval_end = None
+        self._changed = {}
+        return tasks, summaries
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""On-disk spool for the frames that could not be sent to the server.
+"""
+
+import os
+import tempfile
+
+from ..common import protocol
+
+
+class Spool:
+    """Bounded append-only file of encoded frames.
+
+    The frames are appended at the end of the file and read back in the same order. As the frames
+    already start with their length, they are simply concatenated.
+
+    The space of the frames already read (sent) is reclaimed without waiting for the spool to be
+    empty, which it may never be while the spool is replayed and new frames keep arriving: once
+    this prefix is larger than both `min_reclaim` and the frames left, these frames are moved to
+    the beginning of the file, which is truncated. Each byte is thus moved at most once on
+    average. The file never exceeds `max_bytes`.
+    """
+
+    min_reclaim = 1 << 20
+
+    def __init__(self, path=None, max_bytes=512 << 20):
+        """
+        Parameters
+        ----------
+        path : str
+            path of the spool file. If None, an anonymous temporary file is used.
+        max_bytes : int
+            maximum size of the frames in the spool. Frames that would exceed this size are
+            dropped.
+        """
+        if path:
+            self._file = open(path, "w+b")
+        else:
+            self._file = tempfile.TemporaryFile()
+        self.path = path
+        self.max_bytes = max_bytes
+
+        self._write_offset = 0
+        self._read_offset = 0
+        self.num_frames = 0
+        self.num_dropped = 0
+        self._peeked = None
+
+    def __len__(self):
+        """Number of frames in the spool."""
+        return self.num_frames
+
+    @property
+    def nbytes(self):
+        """Size of the frames in the spool."""
+        return self._write_offset - self._read_offset
+
+    def append(self, frame) -> bool:
+        """Appends a frame at the end of the spool.
+
+        Returns False if the spool is full, in which case the frame is dropped.
+        """
+        if self.nbytes + len(frame) > self.max_bytes:
+            self.num_dropped += 1
+            return False
+        if self._write_offset + len(frame) > self.max_bytes:
+            self._reclaim()
+
+        self._file.seek(self._write_offset)
+        self._file.write(frame)
+        self._write_offset += len(frame)
+        self.num_frames += 1
+        return True
+
+    def peek(self):
+        """Returns the oldest frame of the spool without removing it, None if the spool is empty."""
+        if not self.num_frames:
+            return None
+
+        if self._peeked is None:
+            self._file.flush()
+            self._file.seek(self._read_offset)
+            header = self._file.read(protocol.header.size)
+            _, _, length = protocol.decode_header(header)
+            self._peeked = header + self._file.read(length)
+        return self._peeked
+
+    def pop(self):
+        """Removes and returns the oldest frame of the spool or None if the spool is empty."""
+        frame = self.peek()
+        if frame is None:
+            return None
+
+        self._peeked = None
+        self._read_offset += len(frame)
+        self.num_frames -= 1
+        if not self.num_frames:
+            self._file.truncate(0)
+            self._write_offset = self._read_offset = 0
+        elif self._read_offset >= max(self.min_reclaim, self.nbytes):
+            self._reclaim()
+        return frame
+
+    def _reclaim(self, block_size=1 << 20):
+        """Moves the frames left to the beginning of the file and truncates it."""
+        self._file.flush()
+        position = 0
+        while self._read_offset < self._write_offset:
+            # The block is read before being written over, the regions can overlap
+            self._file.seek(self._read_offset)
+            block = self._file.read(min(self._write_offset - self._read_offset, block_size))
+            self._file.seek(position)
+            self._file.write(block)
+            self._read_offset += len(block)
+            position += len(block)
+        self._file.truncate(position)
+        self._write_offset = position
+        self._read_offset = 0
+
+    def close(self):
+        """Closes the spool, the spool file is removed if it is empty."""
+        self._file.close()
+        if self.path and not self.num_frames:
+            os.remove(self.path)
@@ -7,61 +7,235 @@
 #
 # SPDX-License-Identifier: BSD-3-Clause
 
-"""
+"""TCP client of the agent.
+
+If the connection with the server is lost, the frames are written to a spool while the client
+tries to reconnect with an exponential backoff. Once reconnected, the state of the transmission
+is restored on the server (see HPXParser.preamble) and the spooled frames are replayed in order,
+at a limited rate, before the client goes back to sending the frames directly.
 """
 
 import asyncio
 import time
 
-from ..common.constants import message_separator
 from ..common.logger import Logger
+from .lanes import LaneCheckpoint
+from .spool import Spool
 
 
 async def connect(host: str, port: int, timeout=2):
-    """"""
-    writer = None
-    prev_time = time.time()
+    """Tries to connect to the server until `timeout` (in s) is elapsed.
+
+    Returns the stream writer or None if the connection failed."""
+    deadline = time.time() + timeout
     while True:
         try:
             _, writer = await asyncio.open_connection(host, port)
-        except (asyncio.TimeoutError, ConnectionRefusedError):
+            return writer
+        except (asyncio.TimeoutError, OSError):
             pass
 
-        if time.time() - prev_time > timeout:
-            break
-
-        if writer:
-            break
-        time.sleep(0.01)
-
-    return writer
-
-
-async def send_data(host, port, timeout, queue, stop_signal):
-    """"""
+        if time.time() > deadline:
+            return None
+        await asyncio.sleep(0.01)
+
+
+async def _write(writer, frame):
+    writer.write(frame)
+    await writer.drain()
+
+
+class ReconnectingSender:
+    """Sends frames to the server and spools them while the connection is lost."""
+
+    def __init__(
+        self, host, port, spool, preamble=None, replay_rate=0, min_backoff=0.1, max_backoff=30
+    ):
+        """
+        Parameters
+        ----------
+        host : str
+            address of the server
+        port : int
+            port of the server
+        spool : Spool
+            spool for the frames that are not sent while disconnected
+        preamble : callable
+            returns the list of frames to send first after a reconnection
+        replay_rate : float
+            maximum rate (in bytes/s) at which the spool is replayed, 0 for no limit
+        min_backoff, max_backoff : float
+            first and maximum delay (in s) between two reconnection attempts
+        """
+        self.host = host
+        self.port = port
+        self.spool = spool
+        self.preamble = preamble
+        self.replay_rate = replay_rate
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        self.writer = None
+        self.num_reconnections = 0
+        self._reconnection = None
+        # Checkpoints reached once the spool is replayed (see readers.Checkpoint)
+        self._spooled_checkpoints = []
+
+    def _disconnected(self, writer, error):
+        """Closes the broken connection and starts reconnecting."""
+        Logger().warning(
+            f"Connection to {self.host}:{self.port} lost ({error}), the data is spooled until the "
+            "connection is restored."
+        )
+        writer.close()
+        if self.writer is writer:
+            self.writer = None
+        if self._reconnection is None or self._reconnection.done():
+            self._reconnection = asyncio.ensure_future(self._reconnect())
+
+    def _spool(self, frame):
+        if not self.spool.append(frame) and self.spool.num_dropped == 1:
+            Logger().warning(
+                f"The spool is full ({self.spool.max_bytes} bytes), data is dropped until the "
+                "connection is restored."
+            )
+
+    async def _reconnect(self):
+        """Reconnects to the server and replays the spool."""
+        backoff = self.min_backoff
+        while True:
+            await asyncio.sleep(backoff)
+            backoff = min(2 * backoff, self.max_backoff)
+
+            writer = await connect(self.host, self.port, 0)
+            if not writer:
+                continue
+
+            try:
+                for frame in self.preamble() if self.preamble else []:
+                    await _write(writer, frame)
+
+                begin = time.time()
+                num_frames, num_bytes = len(self.spool), self.spool.nbytes
+                while len(self.spool):
+                    frame = self.spool.peek()
+                    await _write(writer, frame)
+                    self.spool.pop()
+                    if self.replay_rate:
+                        await asyncio.sleep(len(frame) / self.replay_rate)
+            except OSError as e:
+                Logger().warning(f"Connection lost while replaying the spool ({e}).")
+                writer.close()
+                continue
+
+            # The spool is empty and no frame can be spooled before the writer is set, the order
+            # of the frames is thus kept
+            self.writer = writer
+            self.num_reconnections += 1
+            checkpoints, self._spooled_checkpoints = self._spooled_checkpoints, []
+            if not self.spool.num_dropped:
+                for checkpoint in checkpoints:
+                    checkpoint.reached()
+            Logger().info(
+                f"Reconnected to {self.host}:{self.port}, {num_frames} spooled frames"
+                f" ({num_bytes} bytes) replayed in {time.time() - begin:.1f} s."
+            )
+            return
+
+    async def send(self, queue, reconnect_timeout=300):
+        """Sends the frames of the queue until None is found in the queue.
+
+        The connection must already be established (see `connect`).
+
+        Parameters
+        ----------
+        queue : FrameLanes
+            queue of the frames to send
+        reconnect_timeout : float
+            once the end of the queue is reached, time (in s) given to restore the connection and
+            replay the spool
+
+        Returns
+        -------
+        bool
+            True if all the data has been sent, False otherwise
+        """
+        while True:
+            frame = await queue.get()
+            if frame is None:
+                break
+
+            if isinstance(frame, LaneCheckpoint):
+                # The frames before the marker are sent, unless some of them are in the spool
+                if self.writer is None or len(self.spool):
+                    self._spooled_checkpoints.append(frame.checkpoint)
+                else:
+                    frame.checkpoint.reached()
+                continue
+
+            writer = self.writer
+            if writer is None or len(self.spool):
+                self._spool(frame)
+                continue
+
+            try:
+                await _write(writer, frame)
+            except OSError as e:
+                self._spool(frame)
+                self._disconnected(writer, e)
+
+        success = True
+        if self.writer is None:
+            try:
+                await asyncio.wait_for(self._reconnection, reconnect_timeout)
+            except asyncio.TimeoutError:
+                Logger().error(
+                    f"Could not reconnect to {self.host}:{self.port} after {reconnect_timeout}"
+                    f" seconds, {len(self.spool)} frames ({self.spool.nbytes} bytes) are lost."
+                )
+                success = False
+
+        if self.spool.num_dropped:
+            Logger().error(
+                f"{self.spool.num_dropped} frames have been dropped because the spool was full."
+            )
+            success = False
+
+        if self.writer:
+            self.writer.close()
+        self.spool.close()
+        return success
+
+
+async def send_data(
+    host,
+    port,
+    timeout,
+    queue,
+    preamble=None,
+    spool_file=None,
+    spool_size=512 << 20,
+    replay_rate=0,
+    reconnect_timeout=300,
+):
+    """Sends the frames of the queue to the server until None is found in the queue.
+
+    If the connection is lost, the frames are spooled until the connection is restored (see
+    ReconnectingSender).
+
+    Returns
+    -------
+    bool
+        True if all the data has been sent, False otherwise
+    """
     writer = await connect(host, port, timeout)
-    logger = Logger()
 
     if not writer:
-        logger.error(
+        Logger().error(
             f"Timeout error: could not connect to {host}:{port}" f" after {timeout} seconds"
         )
-        stop_signal.stop = True
-        return
-
-    while True:  # not stop_signal.stop:
-        line = queue.get()
-
-        if line is None:
-            break
-
-        try:
-            writer.write(line + message_separator)
-            await writer.drain()
-        except ConnectionResetError:
-            logger.error("Connection was reset while streaming data.")
-            break
-
-        queue.task_done()
+        return False
 
-    return
+    sender = ReconnectingSender(host, port, Spool(spool_file, spool_size), preamble, replay_rate)
+    sender.writer = writer
+    return await sender.send(queue, reconnect_timeout)
@@ -1,7 +1,5 @@
 import colorcet
 
-message_separator = b"\r\n\r\n"
-
 # Generated by tools/generate_counternames.py"
 counternames = [
     "agas/component/count",
@@ -0,0 +1,466 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Binary protocol used between the hpx-dashboard agent and server.
+
+Every message sent over TCP is a frame composed of a fixed size header followed by a payload:
+
+    magic (4 bytes) | version (uint8) | message type (uint8) | flags (uint16) | length (uint32)
+
+where length is the size of the payload in bytes. All the numbers are little-endian.
+
+The `FLAG_PRIORITY` flag marks the frames of the priority lane (the beginning of the transmission,
+the counter infos and the counter data), which are sent and processed before the frames of the
+bulk lane (task data and lines of the standard output).
+
+The payload of the `DATA` messages is a sequence of typed column blocks. Each block starts with a
+header (tag, typecode, length in bytes) followed by the raw column, such that the receiver can
+decode a whole column at once with numpy and never has to build Python objects per record.
+Unknown block tags are skipped by the decoder.
+
+The values of the counters that are not a single number (e.g. histograms) are NaN in the value
+column, their text goes in the sparse `COUNTER_TEXT` block as [row, text] pairs, where row is the
+index of the sample in the counter columns of the message.
+"""
+
+from array import array
+import json
+import math
+import struct
+import sys
+from typing import Union
+
+import numpy as np
+
+PROTOCOL_VERSION = 3
+MAGIC = b"HPXD"
+
+header = struct.Struct("<4sBBHI")
+block_header = struct.Struct("<BcI")
+_float64 = struct.Struct("<d")
+_begin = struct.Struct("<d16s")
+
+# Flags of the header
+FLAG_PRIORITY = 1
+
+# Message types
+TRANSMISSION_BEGIN = 1
+TRANSMISSION_END = 2
+COUNTER_INFOS = 3
+DATA = 4
+
+# Column blocks of the DATA messages
+COUNTER_DEFINITIONS = 1
+COUNTER_ID = 2
+COUNTER_SEQUENCE = 3
+COUNTER_TIMESTAMP = 4
+COUNTER_VALUE = 5
+TASK_NAMES = 6
+TASK_LOCALITY = 7
+TASK_WORKER = 8
+TASK_NAME = 9
+TASK_START = 10
+TASK_END = 11
+LINES = 12
+AGGREGATE_ID = 13
+AGGREGATE_SEQUENCE = 14
+AGGREGATE_TIMESTAMP = 15
+AGGREGATE_MIN = 16
+AGGREGATE_MAX = 17
+AGGREGATE_MEAN = 18
+AGGREGATE_LAST = 19
+AGGREGATE_COUNT = 20
+TASK_SUMMARIES = 21
+COUNTER_TEXT = 22
+
+_block_names = {
+    COUNTER_DEFINITIONS: "counter_definitions",
+    COUNTER_ID: "counter_id",
+    COUNTER_SEQUENCE: "counter_sequence",
+    COUNTER_TIMESTAMP: "counter_timestamp",
+    COUNTER_VALUE: "counter_value",
+    TASK_NAMES: "task_names",
+    TASK_LOCALITY: "task_locality",
+    TASK_WORKER: "task_worker",
+    TASK_NAME: "task_name",
+    TASK_START: "task_start",
+    TASK_END: "task_end",
+    LINES: "lines",
+    AGGREGATE_ID: "aggregate_id",
+    AGGREGATE_SEQUENCE: "aggregate_sequence",
+    AGGREGATE_TIMESTAMP: "aggregate_timestamp",
+    AGGREGATE_MIN: "aggregate_min",
+    AGGREGATE_MAX: "aggregate_max",
+    AGGREGATE_MEAN: "aggregate_mean",
+    AGGREGATE_LAST: "aggregate_last",
+    AGGREGATE_COUNT: "aggregate_count",
+    TASK_SUMMARIES: "task_summaries",
+    COUNTER_TEXT: "counter_text",
+}
+
+# Typecodes of the blocks (same as the array module) and their little-endian numpy equivalent.
+# The `j` typecode designates an utf-8 encoded json document.
+_dtypes = {
+    b"d": np.dtype("<f8"),
+    b"q": np.dtype("<i8"),
+    b"i": np.dtype("<i4"),
+    b"I": np.dtype("<u4"),
+}
+
+
+class ProtocolError(Exception):
+    """Raised when a frame can not be decoded."""
+
+
+def encode_message(message_type: int, payload=b"", flags=0) -> bytes:
+    """Returns the frame (header + payload) of a message."""
+    return header.pack(MAGIC, PROTOCOL_VERSION, message_type, flags, len(payload)) + payload
+
+
+def is_priority(frame) -> bool:
+    """Returns True if the frame belongs to the priority lane."""
+    return bool(header.unpack_from(frame)[3] & FLAG_PRIORITY)
+
+
+def decode_header(buffer):
+    """Returns the message type, the flags and the payload length from the header of a frame.
+
+    Raises
+    ------
+    ProtocolError
+        if the buffer is not a valid header of this version of the protocol
+    """
+    magic, version, message_type, flags, length = header.unpack(buffer)
+    if magic != MAGIC:
+        raise ProtocolError("Invalid frame: wrong magic number.")
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(
+            f"Unsupported protocol version {version} (expected version {PROTOCOL_VERSION})."
+        )
+    return message_type, flags, length
+
+
+def encode_begin(start_time: float, run_id: bytes) -> bytes:
+    """Returns the frame announcing the beginning of a transmission.
+
+    Parameters
+    ----------
+    start_time
+        time of the beginning of the transmission
+    run_id
+        16 bytes identifying the transmission, such that an agent that reconnects can resume
+        its transmission
+    """
+    return encode_message(
+        TRANSMISSION_BEGIN, _begin.pack(start_time, run_id), flags=FLAG_PRIORITY
+    )
+
+
+def encode_end(end_time: float) -> bytes:
+    """Returns the frame announcing the end of a transmission."""
+    return encode_message(TRANSMISSION_END, _float64.pack(end_time))
+
+
+def encode_counter_infos(counter_infos: dict) -> bytes:
+    """Returns the frame containing the descriptions of the available counters."""
+    return encode_message(
+        COUNTER_INFOS, json.dumps(counter_infos).encode(), flags=FLAG_PRIORITY
+    )
+
+
+def _encode_block(tag, column):
+    """Returns the bytes of a column block, `column` is either an array or a json object."""
+    if isinstance(column, array):
+        typecode = column.typecode.encode()
+        if sys.byteorder == "big":
+            column = array(column.typecode, column)
+            column.byteswap()
+        data = column.tobytes()
+    else:
+        typecode = b"j"
+        data = json.dumps(column).encode()
+    return block_header.pack(tag, typecode, len(data)) + data
+
+
+def decode_blocks(payload) -> dict:
+    """Decodes the column blocks of a payload.
+
+    The numerical columns are returned as numpy arrays which are views on `payload`.
+
+    Returns
+    -------
+    dict
+        dictionnary where the keys are the names of the blocks (e.g. `counter_timestamp`)
+    """
+    payload = memoryview(payload)
+    blocks = {}
+    offset = 0
+    while offset < len(payload):
+        if offset + block_header.size > len(payload):
+            raise ProtocolError("Truncated block header.")
+        tag, typecode, length = block_header.unpack_from(payload, offset)
+        offset += block_header.size
+        if offset + length > len(payload):
+            raise ProtocolError("Truncated block.")
+
+        if tag in _block_names:
+            if typecode == b"j":
+                column = json.loads(bytes(payload[offset : offset + length]).decode())
+            elif typecode in _dtypes:
+                dtype = _dtypes[typecode]
+                column = np.frombuffer(
+                    payload, dtype=dtype, count=length // dtype.itemsize, offset=offset
+                )
+            else:
+                raise ProtocolError(f"Unknown typecode {typecode} in block {tag}.")
+            blocks[_block_names[tag]] = column
+        offset += length
+
+    return blocks
+
+
+def decode_message(message_type: int, payload):
+    """Decodes the payload of a message.
+
+    Returns
+    -------
+    mixed
+        the timestamp and the run id (as an hexadecimal string) for the begin of transmissions,
+        the timestamp for the end of transmissions, the dictionnary of counter descriptions for
+        the counter infos and a dictionnary of columns for the data
+    """
+    if message_type == TRANSMISSION_BEGIN:
+        start_time, run_id = _begin.unpack_from(payload)
+        return start_time, run_id.hex()
+    elif message_type == TRANSMISSION_END:
+        return _float64.unpack_from(payload)[0]
+    elif message_type == COUNTER_INFOS:
+        return json.loads(bytes(payload).decode())
+    elif message_type == DATA:
+        return decode_blocks(payload)
+    else:
+        raise ProtocolError(f"Unknown message type {message_type}.")
+
+
+class Batch:
+    """Accumulates parsed records column by column and encodes them into a `DATA` frame.
+
+    Counters are identified by an integer id which is defined once for the whole transmission
+    with `add_counter_definition`, the samples only carry the id of their counter. Task names are
+    stored once per batch in a table and the tasks only refer to them by their index in the table.
+    The aggregates summarize the samples of a counter over a window (see agent.aggregation).
+    """
+
+    def __init__(self):
+        self.counter_definitions = []
+        self.counter_ids = array("I")
+        self.counter_sequences = array("q")
+        self.counter_timestamps = array("d")
+        self.counter_values = array("d")
+        # (row, text) of the samples whose value is not a single number
+        self.counter_texts = []
+
+        self.aggregate_ids = array("I")
+        self.aggregate_sequences = array("q")
+        self.aggregate_timestamps = array("d")
+        self.aggregate_mins = array("d")
+        self.aggregate_maxs = array("d")
+        self.aggregate_means = array("d")
+        self.aggregate_lasts = array("d")
+        self.aggregate_counts = array("I")
+
+        self.task_names = {}
+        self.task_localities = array("I")
+        self.task_workers = array("i")
+        self.task_name_ids = array("I")
+        self.task_starts = array("d")
+        self.task_ends = array("d")
+
+        self.lines = []
+
+        # Summaries of the tasks when the tasks are sampled (see agent.sampling)
+        self.task_summaries = {}
+
+        # Size of the strings of the batch, used to estimate the size of the encoded batch
+        self._string_bytes = 0
+
+    def __len__(self):
+        return (
+            len(self.counter_definitions)
+            + len(self.counter_ids)
+            + len(self.aggregate_ids)
+            + len(self.task_name_ids)
+            + len(self.lines)
+            + len(self.task_summaries)
+        )
+
+    @property
+    def nbytes(self):
+        """Approximate size of the encoded batch in bytes."""
+        return (
+            28 * (len(self.counter_ids) + len(self.task_name_ids))
+            + 56 * len(self.aggregate_ids)
+            + self._string_bytes
+        )
+
+    def add_counter_definition(self, counter_id, name):
+        """Defines the id of a counter, the definition is sent along with the next batch and
+        applies to all the following batches of the transmission.
+
+        Parameters
+        ----------
+        counter_id : int
+            id used by the samples of the counter
+        name : tuple
+            (countername, full instance name, parameters, timestamp unit, value unit)
+        """
+        self.counter_definitions.append((counter_id, *name))
+        self._string_bytes += sum(len(field) + 4 for field in name if field) + 16
+
+    def add_counter(self, counter_id, sequence_number, timestamp, value):
+        """Adds one counter sample to the batch.
+
+        Parameters
+        ----------
+        counter_id : int
+            id of the counter given in `add_counter_definition`
+        sequence_number : int
+            sequence number of the counter invocation
+        timestamp : float
+            time stamp at which the information has been sampled
+        value : float or str
+            counter value, the values that are not a single number (e.g. histograms) are given
+            as strings (see parse_value)
+        """
+        if isinstance(value, str):
+            self.counter_texts.append((len(self.counter_ids), value))
+            self._string_bytes += len(value) + 8
+            value = math.nan
+        self.counter_ids.append(counter_id)
+        self.counter_sequences.append(sequence_number)
+        self.counter_timestamps.append(timestamp)
+        self.counter_values.append(value)
+
+    def add_aggregate(
+        self, counter_id, sequence_number, timestamp, minimum, maximum, mean, last, count
+    ):
+        """Adds the aggregate of the samples of a counter over a window to the batch.
+
+        Parameters
+        ----------
+        counter_id : int
+            id of the counter given in `add_counter_definition`
+        sequence_number : int
+            sequence number of the last sample of the window
+        timestamp : float
+            time stamp of the last sample of the window
+        minimum, maximum, mean, last : float
+            minimum, maximum, mean and last value of the samples of the window
+        count : int
+            number of samples in the window
+        """
+        self.aggregate_ids.append(counter_id)
+        self.aggregate_sequences.append(sequence_number)
+        self.aggregate_timestamps.append(timestamp)
+        self.aggregate_mins.append(minimum)
+        self.aggregate_maxs.append(maximum)
+        self.aggregate_means.append(mean)
+        self.aggregate_lasts.append(last)
+        self.aggregate_counts.append(count)
+
+    def add_task(self, locality, worker_id, name, start, end):
+        """Adds one task to the batch."""
+        index = self.task_names.get(name)
+        if index is None:
+            index = self.task_names[name] = len(self.task_names)
+            self._string_bytes += len(name) + 4
+        self.task_localities.append(locality)
+        self.task_workers.append(worker_id)
+        self.task_name_ids.append(index)
+        self.task_starts.append(start)
+        self.task_ends.append(end)
+
+    def add_task_summaries(self, summaries):
+        """Adds the summaries of the sampled tasks of some localities to the batch.
+
+        Parameters
+        ----------
+        summaries : dict
+            for each locality, the number of tasks seen and sent, and the summaries per task name
+            and per worker (see agent.sampling.TaskSampler)
+        """
+        for locality, summary in summaries.items():
+            current = self.task_summaries.get(locality)
+            if current is None:
+                self.task_summaries[locality] = summary
+            else:
+                current["seen"] = summary["seen"]
+                current["sent"] = summary["sent"]
+                current["names"].update(summary["names"])
+                current["workers"].update(summary["workers"])
+            self._string_bytes += 32 * (len(summary["names"]) + len(summary["workers"]))
+
+    def add_line(self, line):
+        """Adds one line of the stdout of the program to the batch."""
+        self.lines.append(line)
+        self._string_bytes += len(line) + 4
+
+    def encode(self, priority=False) -> bytes:
+        """Returns the `DATA` frame of the batch, in the priority lane if `priority` is True."""
+        blocks = []
+        if self.counter_definitions:
+            blocks.append(_encode_block(COUNTER_DEFINITIONS, self.counter_definitions))
+        if self.counter_ids:
+            blocks += [
+                _encode_block(COUNTER_ID, self.counter_ids),
+                _encode_block(COUNTER_SEQUENCE, self.counter_sequences),
+                _encode_block(COUNTER_TIMESTAMP, self.counter_timestamps),
+                _encode_block(COUNTER_VALUE, self.counter_values),
+            ]
+            if self.counter_texts:
+                blocks.append(_encode_block(COUNTER_TEXT, self.counter_texts))
+        if self.aggregate_ids:
+            blocks += [
+                _encode_block(AGGREGATE_ID, self.aggregate_ids),
+                _encode_block(AGGREGATE_SEQUENCE, self.aggregate_sequences),
+                _encode_block(AGGREGATE_TIMESTAMP, self.aggregate_timestamps),
+                _encode_block(AGGREGATE_MIN, self.aggregate_mins),
+                _encode_block(AGGREGATE_MAX, self.aggregate_maxs),
+                _encode_block(AGGREGATE_MEAN, self.aggregate_means),
+                _encode_block(AGGREGATE_LAST, self.aggregate_lasts),
+                _encode_block(AGGREGATE_COUNT, self.aggregate_counts),
+            ]
+        if self.task_name_ids:
+            blocks += [
+                _encode_block(TASK_NAMES, list(self.task_names.keys())),
+                _encode_block(TASK_LOCALITY, self.task_localities),
+                _encode_block(TASK_WORKER, self.task_workers),
+                _encode_block(TASK_NAME, self.task_name_ids),
+                _encode_block(TASK_START, self.task_starts),
+                _encode_block(TASK_END, self.task_ends),
+            ]
+        if self.task_summaries:
+            blocks.append(_encode_block(TASK_SUMMARIES, self.task_summaries))
+        if self.lines:
+            blocks.append(_encode_block(LINES, self.lines))
+
+        return encode_message(DATA, b"".join(blocks), flags=FLAG_PRIORITY if priority else 0)
+
+
+def parse_value(value) -> Union[float, str]:
+    """Converts the value of a counter to a float, values that are not a single number
+    (e.g. histograms) are returned as strings and missing values as NaN."""
+    try:
+        return float(value)
+    except ValueError:
+        if not value.strip():
+            return math.nan
+        if isinstance(value, bytes):
+            return value.decode(errors="replace")
+        return str(value)
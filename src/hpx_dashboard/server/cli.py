@@ -12,16 +12,15 @@
 """
 
 import argparse
-from queue import Queue
 import sys
 import threading
 
 from tornado.ioloop import IOLoop
 
 from ..common.logger import Logger
-from .tcp_listener import TCP_Server, handle_response
+from .tcp_listener import Ingestor, TCP_Server
 from .worker import worker_thread, WorkerQueue
-from .data import DataAggregator
+from .data import Compactor, DataAggregator, RetentionPolicy
 from .app import bk_server
 
 
@@ -73,6 +72,40 @@ def args_parse(argv):
         default=None,
     )
 
+    parser.add_argument(
+        "--ingestion-budget",
+        dest="ingestion_budget",
+        help="time (in ms) spent at most in inserting the incoming data per iteration of the "
+        "server loop, before the plots are given the hand back.",
+        default=10,
+    )
+
+    parser.add_argument(
+        "--raw-retention",
+        dest="raw_retention",
+        help="time (in minutes) during which the samples of the counters are kept as is. The older"
+        " samples are compacted into their mean, min and max over buckets of 16 samples. By"
+        " default, all the samples are kept.",
+        default=None,
+    )
+
+    parser.add_argument(
+        "--memory-budget",
+        dest="memory_budget",
+        help="memory (in MB) that the counter data of a run can use. Once it is exceeded, the"
+        " compacted samples are merged into coarser ones, then the raw samples are compacted"
+        " regardless of --raw-retention. By default, there is no budget.",
+        default=None,
+    )
+
+    parser.add_argument(
+        "--compaction-interval",
+        dest="compaction_interval",
+        help="time (in ms) between two compactions of the runs with --raw-retention or"
+        " --memory-budget.",
+        default=1000,
+    )
+
     return parser.parse_args(argv)
 
 
@@ -90,12 +123,17 @@ def server(argv):
     server = bk_server(io_loop=IOLoop().current(), port=int(opt.bokeh_port))
     server.start()
 
-    tcp_queue = Queue()
-    tcp_server = TCP_Server(queue=tcp_queue)
+    ingestor = Ingestor(float(opt.ingestion_budget) / 1000.0)
+    tcp_server = TCP_Server(queue=ingestor)
     tcp_server.listen(opt.listen_port)
-    tcp_thread = threading.Thread(target=lambda: handle_response(tcp_queue))
-    tcp_thread.daemon = True
-    tcp_thread.start()
+    ingestor.start()
+
+    if opt.raw_retention or opt.memory_budget:
+        DataAggregator().retention = RetentionPolicy(
+            raw_duration=float(opt.raw_retention) * 60 if opt.raw_retention else None,
+            max_bytes=int(float(opt.memory_budget) * (1 << 20)) if opt.memory_budget else None,
+        )
+        Compactor(float(opt.compaction_interval) / 1000.0).start()
 
     work_queue = WorkerQueue()
     work_thread = threading.Thread(target=lambda: worker_thread(work_queue))
@@ -105,7 +143,6 @@ def server(argv):
     logger.info(f"Bokeh server started on http://localhost:{opt.bokeh_port}")
     server.io_loop.start()
 
-    tcp_thread.join()
     work_thread.join()
 
 
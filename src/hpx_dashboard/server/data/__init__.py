@@ -14,5 +14,14 @@
 from .collection import DataCollection, format_instance, from_instance
 from .aggregator import DataAggregator
 from .sources import DataSources
+from .retention import Compactor, RetentionPolicy
 
-__all__ = ["DataCollection", "format_instance", "from_instance", "DataAggregator", "DataSources"]
+__all__ = [
+    "DataCollection",
+    "format_instance",
+    "from_instance",
+    "DataAggregator",
+    "DataSources",
+    "Compactor",
+    "RetentionPolicy",
+]
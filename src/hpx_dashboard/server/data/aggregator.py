@@ -14,7 +14,9 @@ import os
 import time
 import json
 import csv
+import threading
 from typing import Union
+import uuid
 
 import pandas as pd
 
@@ -29,10 +31,17 @@ class DataAggregator(metaclass=Singleton):
     def __init__(self, auto_save=True, save_path="", import_path=""):
         """Initializes the data of the server."""
         self.data = []
+        # Index in data of the live collection of each run id, several agents can send their data
+        # at the same time
+        self.live_runs = {}
+        # Most recent live collection
         self.current_run = None
         self.last_run = None
         self.current_data: Union[DataCollection, None] = None
+        self._lock = threading.Lock()
         self.dummy_counter = 0
+        # Retention policy given to the new collections (see retention.RetentionPolicy)
+        self.retention = None
 
         self.session = str(int(time.time()))
         self.auto_save = auto_save
@@ -150,6 +159,7 @@ class DataAggregator(metaclass=Singleton):
             # DataCollection object.
             task_data = pd.read_csv(task_data_path)
             collection_obj.import_task_data(task_data)
+            collection_obj.seal()
 
             collections.append(collection_obj)
 
@@ -157,6 +167,7 @@ class DataAggregator(metaclass=Singleton):
         self.session = metadata["session_id"]
         self.data = collections
         self.last_run = len(self.data) - 1
+        self.live_runs = {}
         self.current_run = None
         self.current_data = None
         self.metadata = metadata
@@ -204,8 +215,9 @@ class DataAggregator(metaclass=Singleton):
     def set_custom_widget_config(self, widget_config):
         """Saves the state of the custom counter widget to the session."""
         if self.path:
-            self.metadata["custom_widget_config"] = widget_config
-            self._save_metadata()
+            with self._lock:
+                self.metadata["custom_widget_config"] = widget_config
+                self._save_metadata()
 
     def get_custom_widget_config(self):
         """Returns the custom counter widget config saved in the session in json txt."""
@@ -215,18 +227,21 @@ class DataAggregator(metaclass=Singleton):
                 return json.dumps(self.metadata["custom_widget_config"])
         return None
 
-    def set_counter_infos(self, counter_infos: dict):
-        """Sets the counter informations of the current collection.
+    def set_counter_infos(self, counter_infos: dict, run_id: str = None):
+        """Sets the counter informations of a live collection.
 
-        If there is no active collection, this function does nothing
+        If there is no such live collection, this function does nothing
 
         Parameters
         ----------
         counter_infos
             dictionnary of descriptions for each available counter of the hpx application
+        run_id
+            identifier of the run, the current collection is used if None
         """
-        if self.current_run is not None:
-            self.data[self.current_run].set_counter_infos(counter_infos)
+        collection = self.get_live_run(run_id) if run_id else self.current_data
+        if collection is not None:
+            collection.set_counter_infos(counter_infos)
 
     def get_last_run(self) -> Union[DataCollection, None]:
         """Returns the last active DataCollection.
@@ -254,6 +269,17 @@ class DataAggregator(metaclass=Singleton):
         """Returns all current and past data collection runs"""
         return self.data
 
+    def get_live_run(self, run_id: str) -> Union[DataCollection, None]:
+        """Returns the live collection of the run `run_id`, None if there is no such live run."""
+        index = self.live_runs.get(run_id)
+        if index is None:
+            return None
+        return self.data[index]
+
+    def is_live(self, collection: DataCollection) -> bool:
+        """Returns True if the collection is still receiving data."""
+        return collection is not None and collection.run_id in self.live_runs
+
     def get_current_run(self):
         """Returns the current active collection.
         If there is no collection going on, then None is returned.
@@ -270,20 +296,71 @@ class DataAggregator(metaclass=Singleton):
         ----------
         end_time
             time of when the collection has finished"""
-        self.data[self.current_run].set_end_time(end_time)
-        self.last_run = self.current_run
-        self.current_data = None
-        self.current_run = None
+        if self.current_data is not None:
+            self.finalize_collection(self.current_data.run_id, end_time)
+
+    def finalize_collection(self, run_id: str, end_time: float) -> None:
+        """Finalizes the live collection of the run `run_id`.
+
+        The collection is ended, saved and sealed synchronously (see end_collection,
+        save_collection and DataCollection.seal). The server does the last two off the loop
+        instead (see tcp_listener._finalize).
+
+        Parameters
+        ----------
+        run_id
+            identifier of the run
+        end_time
+            time of when the collection has finished"""
+        collection = self.end_collection(run_id, end_time)
+        if collection is not None:
+            self.save_collection(collection)
+            collection.seal()
+
+    def end_collection(self, run_id: str, end_time: float) -> Union[DataCollection, None]:
+        """Ends the live collection of the run `run_id`, which then no longer receives data.
+
+        The most recent of the remaining live collections becomes the current collection.
 
-        # Save the collected data
-        if self.auto_save and self.path:
-            collection = self.data[self.last_run]
+        Parameters
+        ----------
+        run_id
+            identifier of the run
+        end_time
+            time of when the collection has finished
+
+        Returns
+        -------
+        DataCollection
+            the collection, None if there is no such live collection
+        """
+        with self._lock:
+            index = self.live_runs.pop(run_id, None)
+            if index is None:
+                return None
+            self.data[index].set_end_time(end_time)
+            self.last_run = index
+            self.current_run = max(self.live_runs.values()) if self.live_runs else None
+            self.current_data = self.data[self.current_run] if self.live_runs else None
+        return self.data[index]
+
+    def save_collection(self, collection: DataCollection) -> None:
+        """Saves an ended collection in the session folder, if the auto-save is enabled.
+
+        This only reads the collection, it can thus run in a thread as long as the collection is
+        not modified in the meantime (see DataCollection.saving)."""
+        if not (self.auto_save and self.path):
+            return
 
-            counter_data = collection.export_counter_data()
-            task_data = collection.export_task_data()
-            start = collection.start_time
-            end = collection.end_time
+        counter_data = collection.export_counter_data()
+        task_data = collection.export_task_data()
+        start = collection.start_time
+        end = collection.end_time
 
+        counter_data.to_csv(os.path.join(self.path, f"counter_data.{int(start)}.csv"))
+        task_data.to_csv(os.path.join(self.path, f"task_data.{int(start)}.csv"))
+
+        with self._lock:
             self.metadata["collections"].append(
                 {
                     "start": start,
@@ -291,13 +368,9 @@ class DataAggregator(metaclass=Singleton):
                     "id": int(start),
                 }
             )
-
-            counter_data.to_csv(os.path.join(self.path, f"counter_data.{int(start)}.csv"))
-            task_data.to_csv(os.path.join(self.path, f"task_data.{int(start)}.csv"))
-
             self._save_metadata()
 
-    def new_collection(self, start_time: float) -> None:
+    def new_collection(self, start_time: float, run_id: str = None) -> None:
         """Adds a new DataCollection along with a timestamp to the aggregator.
 
         Parameters
@@ -305,8 +378,33 @@ class DataAggregator(metaclass=Singleton):
         start_time
             time of the beginning of the collection
             (should be sent by the hpx-dashboard agent)
+        run_id
+            identifier of the transmission of the agent, a new identifier is generated if None
+
+        Returns
+        -------
+        DataCollection
+            the new collection
+        """
+        collection = DataCollection(run_id or uuid.uuid4().hex)
+        collection.set_start_time(start_time)
+        collection.retention = self.retention
+        with self._lock:
+            self.data.append(collection)
+            self.current_run = len(self.data) - 1
+            self.current_data = collection
+            self.live_runs[collection.run_id] = self.current_run
+        return collection
+
+    def resume_collection(self, run_id: str) -> bool:
+        """Checks if there is a live collection for the transmission `run_id`.
+
+        This happens when an agent reconnects after losing its connection, in which case the
+        data is added to its live collection instead of a new one.
+
+        Returns
+        -------
+        bool
+            True if the collection is resumed
         """
-        self.data.append(DataCollection())
-        self.data[-1].set_start_time(start_time)
-        self.current_run = len(self.data) - 1
-        self.current_data = self.data[-1]
+        return run_id in self.live_runs
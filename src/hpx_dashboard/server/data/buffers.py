@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Growable numpy buffers for the data that arrives during a collection.
+"""
+
+import numpy as np
+
+
+class GrowableArray:
+    """Numpy array of unknown size, grown by appending rows or whole arrays.
+
+    The dtype given at the creation is kept when the array grows. By default, the rows are stored
+    in a single contiguous array whose capacity doubles when it is full, such that appending is
+    amortized O(1) and `view` is a zero-copy view of the whole array.
+
+    With `chunk_size`, the rows are stored in chunks of `chunk_size` rows instead. Growing then
+    only allocates a new chunk and never copies the history, at the cost of `view` copying the
+    rows when they span several chunks (see `chunks` for zero-copy access).
+
+    The returned views are read-only, the data can only be changed through the buffer. The rows
+    of a view are never modified afterwards: appending only writes after the last row, and the
+    rows replaced by `replace_range` and `replace` are written to new memory. A view taken after
+    a batch of rows thus stays a consistent snapshot, even for a reader in another thread.
+    """
+
+    def __init__(self, width=None, dtype=float, capacity=1024, chunk_size=None):
+        """
+        Parameters
+        ----------
+        width : int
+            number of columns, None for a one-dimensional array
+        dtype
+            dtype of the array
+        capacity : int
+            number of rows allocated initially (ignored with `chunk_size`)
+        chunk_size : int
+            number of rows of each chunk, None for a contiguous array
+        """
+        self.width = width
+        self.dtype = np.dtype(dtype)
+        self.chunk_size = chunk_size
+        self._size = 0
+
+        if chunk_size:
+            self._chunks = []
+        else:
+            self._data = self._allocate(max(1, capacity))
+
+    def _allocate(self, rows):
+        shape = (rows,) if self.width is None else (rows, self.width)
+        return np.empty(shape, dtype=self.dtype)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        if self.chunk_size:
+            return len(self._chunks) * self.chunk_size
+        return len(self._data)
+
+    @property
+    def nbytes(self):
+        """Memory allocated by the buffer."""
+        if self.chunk_size:
+            return sum(chunk.nbytes for chunk in self._chunks)
+        return self._data.nbytes
+
+    def _reserve(self, size):
+        """Makes room for `size` rows in total."""
+        if size <= self.capacity:
+            return
+        if self.chunk_size:
+            while self.capacity < size:
+                self._chunks.append(self._allocate(self.chunk_size))
+            return
+
+        capacity = self.capacity
+        while capacity < size:
+            capacity *= 2
+        data = self._allocate(capacity)
+        data[: self._size] = self._data[: self._size]
+        self._data = data
+
+    def append(self, row):
+        """Appends a single row."""
+        self._reserve(self._size + 1)
+        if self.chunk_size:
+            chunk, index = divmod(self._size, self.chunk_size)
+            self._chunks[chunk][index] = row
+        else:
+            self._data[self._size] = row
+        self._size += 1
+
+    def extend(self, rows):
+        """Appends the rows of an array (or anything that can be converted to an array)."""
+        rows = np.asarray(rows, dtype=self.dtype)
+        if self.width is not None:
+            rows = rows.reshape(-1, self.width)
+        size = self._size + len(rows)
+        self._reserve(size)
+
+        if not self.chunk_size:
+            self._data[self._size : size] = rows
+        else:
+            begin = 0
+            while begin < len(rows):
+                chunk, index = divmod(self._size + begin, self.chunk_size)
+                count = min(self.chunk_size - index, len(rows) - begin)
+                self._chunks[chunk][index : index + count] = rows[begin : begin + count]
+                begin += count
+        self._size = size
+
+    def replace(self, array):
+        """Replaces the content of the buffer by `array`."""
+        self._size = 0
+        if self.chunk_size:
+            self._chunks = []
+        else:
+            self._data = self._allocate(max(1, len(array)))
+        self.extend(array)
+
+    def clear(self):
+        self.replace(self._allocate(0))
+
+    def replace_range(self, begin, end, rows):
+        """Replaces the rows begin:end by `rows`, the rows after `end` are moved accordingly.
+
+        The rows from `begin` are written to new memory, such that the views taken before are
+        not modified."""
+        rows = np.asarray(rows, dtype=self.dtype)
+        if self.width is not None:
+            rows = rows.reshape(-1, self.width)
+        if self.chunk_size:
+            # The chunks before the one containing `begin` are kept as they are
+            first = begin // self.chunk_size * self.chunk_size
+            tail = np.concatenate((self.view(first, begin), rows, self.view(end)))
+            self._chunks = self._chunks[: first // self.chunk_size]
+            self._size = first
+            self.extend(tail)
+            return
+
+        size = self._size - (end - begin) + len(rows)
+        capacity = self.capacity
+        while capacity < size:
+            capacity *= 2
+        data = self._allocate(capacity)
+        data[:begin] = self._data[:begin]
+        data[begin : begin + len(rows)] = rows
+        data[begin + len(rows) : size] = self._data[end : self._size]
+        self._data = data
+        self._size = size
+
+    def shrink(self):
+        """Releases the memory allocated beyond the current size."""
+        if self.chunk_size:
+            self._chunks = self._chunks[: -(-self._size // self.chunk_size)]
+        elif len(self._data) > self._size:
+            data = self._allocate(max(1, self._size))
+            data[: self._size] = self._data[: self._size]
+            self._data = data
+
+    def chunks(self, begin=0, end=None):
+        """Returns the list of the read-only zero-copy views of the rows begin:end."""
+        begin, end, _ = slice(begin, end).indices(self._size)
+        if begin >= end:
+            return []
+        if not self.chunk_size:
+            return [self._read_only(self._data[begin:end])]
+
+        views = []
+        while begin < end:
+            chunk, index = divmod(begin, self.chunk_size)
+            count = min(self.chunk_size - index, end - begin)
+            views.append(self._read_only(self._chunks[chunk][index : index + count]))
+            begin += count
+        return views
+
+    def view(self, begin=0, end=None):
+        """Returns the rows begin:end as a read-only array.
+
+        The array is a zero-copy view, except if the rows span several chunks."""
+        views = self.chunks(begin, end)
+        if not views:
+            return self._read_only(self._allocate(0))
+        if len(views) == 1:
+            return views[0]
+        return self._read_only(np.concatenate(views))
+
+    @staticmethod
+    def _read_only(array):
+        array = array.view()
+        array.flags.writeable = False
+        return array
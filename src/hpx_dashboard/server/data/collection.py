@@ -10,6 +10,7 @@
 """The data collection module is for storing the hpx performance counter in live
 """
 
+from collections import namedtuple
 from typing import Union
 import hashlib
 
@@ -18,43 +19,19 @@ import pandas as pd
 
 from ...common.logger import Logger
 from ...common.constants import task_cmap, task_plot_margin
+from .buffers import GrowableArray
+from .pyramid import SeriesSummary
+from .series import Series, empty_series_data
+from .symbols import SymbolTable
 
 logger = Logger()
 
-
-class _NumpyArrayList:
-    """This class allows for the growing of a numpy array of unknown size.
-
-    Using np.append() for each DataCollection.add_line would be a waste ressources.
-    This class is a wrapper around numpy arrays to allow for efficiently allocate and
-    grow 2D numpy arrays.
-    """
-
-    def __init__(self, size_x, dtype, capacity=100):
-        self.data = np.empty((capacity, size_x), dtype=dtype)
-        self.capacity = capacity
-        self.size = 0
-        self.size_x = size_x
-        self.dtype = dtype
-
-    def append(self, row):
-        if self.size == self.capacity:
-            self.capacity *= 2
-            new_data = np.empty((self.capacity, self.size_x))
-            new_data[: self.size] = self.data
-            self.data = new_data
-
-        for i, element in enumerate(row):
-            self.data[self.size, i] = element
-        self.size += 1
-
-    def replace(self, array):
-        self.data = array
-        self.capacity = len(array)
-        self.size = len(array)
-
-    def get(self):
-        return self.data[: self.size, :]
+# Task data of a locality committed by the writers after each batch of tasks (see
+# DataCollection._commit_tasks and _task_snapshot). The arrays are read-only zero-copy views
+# bounded by the rows committed, which are never modified afterwards.
+TaskSnapshot = namedtuple(
+    "TaskSnapshot", ["version", "data", "verts", "tris", "min", "max", "max_worker_id"]
+)
 
 
 def format_instance(locality, pool=None, worker_id="total"):
@@ -83,33 +60,54 @@ class DataCollection:
     """
     The data collection class provides an interface for storing and reading hpx performance data"""
 
-    _id_counter = 0
-
-    def __init__(self):
+    def __init__(self, run_id=None):
+        self.run_id = run_id
         self.start_time = None
         self.end_time = None
         self._counter_info = {}
+
+        # Counter names (countername@parameters) and instances interned to dense ids, the data
+        # is indexed by these ids
+        self._names = SymbolTable()
+        self._instances = SymbolTable()
+        # Ids of the names and instances as given by the callers (countername or (countername,
+        # parameters), instance string or tuple) such that they are only parsed once
+        self._name_ids = {}
+        self._instance_ids = {}
+        # Series of each counter instance: name id -> instance id -> Series
         self._data = {}
 
         # Task data
         self._task_data = {}
         self._task_id = 0
+        # Summaries of all the tasks when the agent samples the tasks
+        self._task_summaries = {}
 
+        # Tree locality -> pool -> worker id of the instances, the leaves are the instance ids
         self.instances = {}
 
-        # Variables for the growing numpy array
+        # Series of each counter defined by the agent with define_counter
+        self._counters = {}
+        # Color hash of each task name
+        self._task_color_hashes = {}
+
         self._line_to_hash = {}
-        self._numpy_data = _NumpyArrayList(3, "float")
-        self._id = self._id_counter
-        self._id_counter += 1
+
+        # Retention policy applied by the Compactor (see retention.RetentionPolicy), None to keep
+        # all the samples
+        self.retention = None
+        # True while the collection is saved in a thread (see DataAggregator.save_collection),
+        # the Compactor then leaves it untouched
+        self.saving = False
 
         self.timings = []
-        self.line_timing = []
 
-    def _add_instance_name(self, locality, pool=None, worker_id=None) -> None:
-        """Adds the instance name to the list of instance names stored in the class."""
+    def _add_instance_name(self, locality, pool=None, worker_id=None) -> int:
+        """Adds the instance name to the list of instance names stored in the class.
+
+        Returns the id of the instance."""
         if not locality:
-            return
+            return None
 
         if locality not in self.instances:
             self.instances[str(locality)] = {}
@@ -118,7 +116,10 @@ class DataCollection:
             self.instances[locality][pool] = {}
 
         if worker_id not in self.instances[locality][pool]:
-            self.instances[locality][pool][worker_id] = []
+            self.instances[locality][pool][worker_id] = self._instances.intern(
+                format_instance(locality, pool, worker_id)
+            )
+        return self.instances[locality][pool][worker_id]
 
     def _get_instance_infos(self, full_instance: str) -> None:
         """"""
@@ -171,18 +172,21 @@ class DataCollection:
         """
         import time
 
-        self._add_instance_name(locality, pool="default", worker_id=worker_id)
+        # Same keys as the instances of the counters and the task data of add_tasks
+        locality = str(locality)
+        self._add_instance_name(locality, pool="default", worker_id=str(int(worker_id)))
 
         if locality not in self._task_data:
             self._task_data[locality] = {
-                "data": _NumpyArrayList(4, "float", initial_capacity),
-                "verts": _NumpyArrayList(4, "float", initial_capacity * 4),
-                "tris": _NumpyArrayList(3, np.int, initial_capacity * 2),
+                "data": GrowableArray(4, float, initial_capacity),
+                "verts": GrowableArray(4, float, initial_capacity * 4),
+                "tris": GrowableArray(3, np.int64, initial_capacity * 2),
                 "name_list": [],
                 "name_set": set(),
                 "min": np.finfo(float).max,
                 "max": np.finfo(float).min,
                 "workers": set(),
+                "max_worker_id": np.finfo(float).min,
                 "min_time": float(start),
             }
 
@@ -201,14 +205,16 @@ class DataCollection:
         self._task_data[locality]["name_list"].append(name)
         self._task_data[locality]["name_set"].add(name)
         self._task_data[locality]["workers"].add(worker_id)
+        if worker_id > self._task_data[locality]["max_worker_id"]:
+            self._task_data[locality]["max_worker_id"] = worker_id
 
-        color_hash = int(hashlib.md5(name.encode("utf-8")).hexdigest(), 16) % len(task_cmap)
+        color_hash = self._task_color_hash(name)
 
         t = time.time()
         self._task_data[locality]["data"].append([worker_id, start, end, self._task_id])
         t1 = time.time() - t
 
-        idx = self._task_data[locality]["verts"].size
+        idx = len(self._task_data[locality]["verts"])
 
         # Bottom left pt
         self._task_data[locality]["verts"].append([start, bottom, color_hash, self._task_id])
@@ -224,9 +230,140 @@ class DataCollection:
         # Triangles
         self._task_data[locality]["tris"].append([idx, idx + 1, idx + 2])
         self._task_data[locality]["tris"].append([idx, idx + 2, idx + 3])
+        self._commit_tasks(locality)
 
         self.timings.append([t1])
 
+    def _commit_tasks(self, locality):
+        """Publishes the task data of the locality once a batch of tasks has been added.
+
+        The readers (see task_mesh_data and task_data) only see the committed tasks, such that
+        the data, the vertices and the triangles they get are always consistent, even if the
+        tasks are added from another thread. A commit only records the number of rows committed,
+        the TaskSnapshot is built by the next reader (see _task_snapshot)."""
+        task_data = self._task_data[locality]
+        committed = task_data.get("committed")
+        task_data["committed"] = (
+            committed[0] + 1 if committed else 1,
+            len(task_data["data"]),
+            len(task_data["verts"]),
+            len(task_data["tris"]),
+            task_data["min"],
+            task_data["max"],
+            task_data["max_worker_id"],
+        )
+
+    def _task_color_hash(self, name):
+        color_hash = self._task_color_hashes.get(name)
+        if color_hash is None:
+            color_hash = int(hashlib.md5(name.encode("utf-8")).hexdigest(), 16) % len(task_cmap)
+            self._task_color_hashes[name] = color_hash
+        return color_hash
+
+    def add_tasks(
+        self,
+        localities: np.ndarray,
+        worker_ids: np.ndarray,
+        name_indices: np.ndarray,
+        names: list,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        initial_capacity=1000,
+    ):
+        """Adds a batch of tasks to the task data of the collection.
+
+        This is the vectorized version of add_task_data, the tasks are given as columns and the
+        triangle mesh of the task plot is built for all the tasks at once.
+
+        Arguments
+        ---------
+        localities : ndarray
+            locality index of each task
+        worker_ids : ndarray
+            id of the worker of each task
+        name_indices : ndarray
+            index in `names` of the name of each task
+        names : list
+            names of the tasks
+        starts : ndarray
+            timestamps of the beginning of the tasks
+        ends : ndarray
+            timestamps of the end of the tasks
+        initial_capacity : int
+            size of the pre-allocated numpy array where the data will be stored
+            (only used if this is the first the locality is encountered)
+        """
+        localities = np.asarray(localities)
+        if not len(localities):
+            return
+
+        color_hashes = np.array([self._task_color_hash(name) for name in names], dtype=float)
+        # The ids of the tasks follow their order of arrival, whatever their locality
+        all_task_ids = np.arange(self._task_id, self._task_id + len(localities), dtype=float)
+        self._task_id += len(localities)
+
+        for locality in np.unique(localities).tolist():
+            indices = localities == locality
+            if indices.all():
+                indices = slice(None)
+            locality = str(locality)
+            workers = np.asarray(worker_ids[indices], dtype=float)
+            start = np.asarray(starts[indices], dtype=float)
+            end = np.asarray(ends[indices], dtype=float)
+            name_index = name_indices[indices]
+            size = len(workers)
+
+            unique_workers = np.unique(worker_ids[indices]).tolist()
+            for worker_id in unique_workers:
+                self._add_instance_name(locality, pool="default", worker_id=str(worker_id))
+
+            if locality not in self._task_data:
+                self._task_data[locality] = {
+                    "data": GrowableArray(4, float, initial_capacity),
+                    "verts": GrowableArray(4, float, initial_capacity * 4),
+                    "tris": GrowableArray(3, np.int64, initial_capacity * 2),
+                    "name_list": [],
+                    "name_set": set(),
+                    "min": np.finfo(float).max,
+                    "max": np.finfo(float).min,
+                    "workers": set(),
+                    "max_worker_id": np.finfo(float).min,
+                    "min_time": float(start[0]),
+                }
+            task_data = self._task_data[locality]
+
+            task_data["min"] = min(task_data["min"], float(start.min()))
+            task_data["max"] = max(task_data["max"], float(end.max()))
+
+            task_names = [names[index] for index in name_index.tolist()]
+            task_data["name_list"].extend(task_names)
+            task_data["name_set"].update(names[index] for index in np.unique(name_index).tolist())
+            task_data["workers"].update(float(worker_id) for worker_id in unique_workers)
+            task_data["max_worker_id"] = max(task_data["max_worker_id"], float(unique_workers[-1]))
+
+            task_ids = all_task_ids[indices]
+            top = workers + 1 / 2 * (1 - task_plot_margin)
+            bottom = workers - 1 / 2 * (1 - task_plot_margin)
+            color_hash = color_hashes[name_index]
+
+            task_data["data"].extend(np.column_stack((workers, start, end, task_ids)))
+
+            # Bottom left, top left, top right and bottom right points of each task
+            verts = np.empty((size, 4, 4))
+            verts[:, :, 0] = np.column_stack((start, start, end, end))
+            verts[:, :, 1] = np.column_stack((bottom, top, top, bottom))
+            verts[:, :, 2] = color_hash[:, None]
+            verts[:, :, 3] = task_ids[:, None]
+            idx = len(task_data["verts"]) + 4 * np.arange(size)
+            task_data["verts"].extend(verts.reshape(-1, 4))
+
+            # Triangles
+            tris = np.empty((size, 2, 3), dtype=int)
+            tris[:, 0] = np.column_stack((idx, idx + 1, idx + 2))
+            tris[:, 1] = np.column_stack((idx, idx + 2, idx + 3))
+            task_data["tris"].extend(tris.reshape(-1, 3))
+            self._commit_tasks(locality)
+
     def import_task_data(self, task_data, color_hash_dict=None):
         """Imports task data into the collection from a pandas DataFrame in one go.
 
@@ -253,17 +390,18 @@ class DataCollection:
             min_time = group["start"].min()
             max_time = group["end"].max()
             self._task_data[locality] = {
-                "data": _NumpyArrayList(4, "float"),
-                "verts": _NumpyArrayList(4, "float"),
-                "tris": _NumpyArrayList(3, np.int),
+                "data": GrowableArray(4, float),
+                "verts": GrowableArray(4, float),
+                "tris": GrowableArray(3, np.int64),
                 "name_list": group["name"].to_list(),
                 "min": min_time,
                 "max": max_time,
                 "workers": set(group["worker_id"].to_list()),
+                "max_worker_id": group["worker_id"].max(),
                 "min_time": min_time,
             }
             for worker_id in self._task_data[locality]["workers"]:
-                self._add_instance_name(locality, pool="default", worker_id=worker_id)
+                self._add_instance_name(locality, pool="default", worker_id=str(int(worker_id)))
 
             self._task_data[locality]["name_set"] = set(self._task_data[locality]["name_list"])
 
@@ -312,6 +450,7 @@ class DataCollection:
                 pd.concat([bottom_left, top_left, top_right, bottom_right]).to_numpy().astype(float)
             )
             self._task_data[locality]["tris"].replace(pd.concat([tris_1, tris_2]).to_numpy())
+            self._commit_tasks(locality)
 
     def add_line(
         self,
@@ -343,70 +482,331 @@ class DataCollection:
             unit of the timestamp
         value
             actual counter value
-            (could be simple number or multiple numbers separated by ':')
+            (values that are not a single number, e.g. histograms, are stored as NaN and their
+            text is kept aside, see get_texts)
         value_unit
             unit of the counter value
         """
-        name = countername
-        if parameters:
-            name = countername + "@" + parameters
-
-        if name not in self._data:
-            self._data[name] = {}
-
-        if isinstance(instance, tuple):
-            locality, pool, worker_id = instance
-        else:
-            locality, pool, worker_id = self._get_instance_infos(instance)
-
-        instance = instance
-        if locality:
-            self._add_instance_name(locality, pool, worker_id)
-            instance = format_instance(locality, pool, worker_id)
+        _, _, series = self._get_series(
+            countername, instance, parameters, timestamp_unit, value_unit
+        )
 
         try:
             value = float(value)
         except ValueError:
-            value = str(value)
+            # The missing values are exported as empty strings
+            if value != "":
+                series.add_texts([int(sequence_number)], [str(value)])
+            value = np.nan
+
+        series.append(int(sequence_number), float(timestamp), value)
+
+    def _name_id(self, countername: str, parameters=None) -> int:
+        """Returns the id of the name countername@parameters, interned on the first call."""
+        key = (countername, parameters) if parameters else countername
+        name_id = self._name_ids.get(key)
+        if name_id is None:
+            name = countername + "@" + parameters if parameters else countername
+            name_id = self._names.intern(name)
+            self._name_ids[key] = name_id
+            self._data.setdefault(name_id, {})
+        return name_id
+
+    def _instance_id(self, instance: Union[tuple, str]) -> int:
+        """Returns the id of the instance, which is parsed and interned on the first call."""
+        instance_id = self._instance_ids.get(instance)
+        if instance_id is None:
+            if isinstance(instance, tuple):
+                locality, pool, worker_id = instance
+            else:
+                locality, pool, worker_id = self._get_instance_infos(instance)
 
-        # Growing numpy array
-        key = (self._id, name, instance)
-        if key not in self._line_to_hash:
-            self._line_to_hash[key] = float(len(self._line_to_hash.keys()))
-        import time
+            if locality:
+                instance_id = self._add_instance_name(str(locality), pool, str(worker_id))
+            else:
+                instance_id = self._instances.intern(instance)
+            self._instance_ids[instance] = instance_id
+        return instance_id
+
+    def _find_key(self, countername: str, instance: Union[tuple, str]):
+        """Returns the ids (name id, instance id) of a counter instance without interning them.
+
+        None is returned for the unknown names and instances."""
+        instance_id = self._instance_ids.get(instance)
+        if instance_id is None:
+            instance_id = self._instances.get(instance)
+        return self._names.get(countername), instance_id
+
+    def _find_series(self, countername: str, instance: Union[tuple, str]):
+        """Returns the Series of a counter instance or None if it does not exist."""
+        name_id, instance_id = self._find_key(countername, instance)
+        if name_id is None:
+            return None
+        return self._data[name_id].get(instance_id)
 
-        t = time.time()
-        self._numpy_data.append([timestamp, value, self._line_to_hash[key]])
-        self.line_timing.append(time.time() - t)
+    def _get_series(
+        self,
+        countername: str,
+        instance: Union[tuple, str],
+        parameters=None,
+        timestamp_unit=None,
+        value_unit=None,
+    ):
+        """Registers the counter name and instance in the collection if they do not exist yet.
 
-        line = [int(sequence_number), timestamp, timestamp_unit, value, value_unit]
-        if instance not in self._data[name]:
-            self._data[name][instance] = []
+        Returns
+        -------
+        the ids of the name (countername@parameters) and of the instance under which the data is
+        stored, and the Series in which it is stored
+        """
+        name_id = self._name_id(countername, parameters)
+        instance_id = self._instance_id(instance)
+
+        series = self._data[name_id].get(instance_id)
+        if series is None:
+            series = Series(timestamp_unit, value_unit)
+            self._data[name_id][instance_id] = series
+        return name_id, instance_id, series
 
-        self._data[name][instance].append(line)
+    def define_counter(
+        self,
+        counter_id: int,
+        countername: str,
+        instance: Union[tuple, str],
+        parameters: Union[str, None],
+        timestamp_unit: str,
+        value_unit: Union[str, None],
+    ) -> None:
+        """Defines a counter id that can be used with add_sample.
+
+        The counter name and the instance are only parsed once here instead of once per sample.
+
+        Parameters
+        ----------
+        counter_id
+            id of the counter given by the hpx-dashboard agent
+        countername
+            complete name of the performance counter without the full instance name
+            parameter
+        instance
+            counter instance name or tuple given by the format_instance function
+        parameters
+            parameter(s) of the hpx performance counter
+        timestamp_unit
+            unit of the timestamp
+        value_unit
+            unit of the counter value
+        """
+        _, _, self._counters[counter_id] = self._get_series(
+            countername, instance, parameters, timestamp_unit, value_unit
+        )
+
+    def add_sample(
+        self, counter_id: int, sequence_number: int, timestamp: float, value: float
+    ) -> None:
+        """Adds a sample of a counter previously defined with define_counter.
+
+        Parameters
+        ----------
+        counter_id
+            id of the counter given to define_counter
+        sequence_number
+            sequence number of the counter invocation
+        timestamp
+            time stamp at which the information has been sampled
+        value
+            actual counter value
+        """
+        self._counters[counter_id].append(sequence_number, timestamp, value)
+
+    def _split_by_counter(self, counter_ids):
+        """Groups the indices of the samples by counter id.
+
+        Returns
+        -------
+        list of (counter id, indices of the samples of the counter in arrival order)
+        """
+        if len(counter_ids) and (counter_ids == counter_ids[0]).all():
+            return [(int(counter_ids[0]), slice(None))]
+
+        order = np.argsort(counter_ids, kind="stable")
+        sorted_ids = counter_ids[order]
+        bounds = np.flatnonzero(sorted_ids[1:] != sorted_ids[:-1]) + 1
+        begins = np.concatenate(([0], bounds))
+        ends = np.concatenate((bounds, [len(order)]))
+        return [
+            (int(sorted_ids[begin]), order[begin:end]) for begin, end in zip(begins, ends)
+        ]
+
+    def add_lines(
+        self,
+        counter_ids: np.ndarray,
+        sequence_numbers: np.ndarray,
+        timestamps: np.ndarray,
+        values: np.ndarray,
+    ) -> None:
+        """Adds a batch of samples of counters previously defined with define_counter.
+
+        This is the vectorized version of add_sample, the samples are given as columns.
+
+        Parameters
+        ----------
+        counter_ids
+            ids of the counters given to define_counter
+        sequence_numbers
+            sequence numbers of the counter invocations
+        timestamps
+            time stamps at which the informations have been sampled
+        values
+            actual counter values
+        """
+        counter_ids = np.asarray(counter_ids)
+        if not len(counter_ids):
+            return
+
+        for counter_id, indices in self._split_by_counter(counter_ids):
+            self._counters[counter_id].extend(
+                sequence_numbers[indices], timestamps[indices], values[indices]
+            )
+
+    def add_texts(self, counter_ids: np.ndarray, sequence_numbers: np.ndarray, texts: list) -> None:
+        """Adds the texts of the samples whose value is not a single number (e.g. histograms).
+
+        The samples themselves are added with add_lines, with NaN as value.
+
+        Parameters
+        ----------
+        counter_ids
+            ids of the counters given to define_counter
+        sequence_numbers
+            sequence numbers of the samples
+        texts
+            values of the samples
+        """
+        texts = np.array(texts, dtype=object)
+        for counter_id, indices in self._split_by_counter(np.asarray(counter_ids)):
+            self._counters[counter_id].add_texts(sequence_numbers[indices], texts[indices])
+
+    def add_aggregate(
+        self,
+        counter_id: int,
+        sequence_number: int,
+        timestamp: float,
+        minimum: float,
+        maximum: float,
+        mean: float,
+        last: float,
+        count: int,
+    ) -> None:
+        """Adds the aggregate of the samples of a counter over a window.
+
+        The mean is stored as a sample of the counter, such that the aggregated counters are
+        plotted like the other ones, and the min and max are stored in the envelope of the
+        counter (see get_envelope).
+
+        Parameters
+        ----------
+        counter_id
+            id of the counter given to define_counter
+        sequence_number
+            sequence number of the last sample of the window
+        timestamp
+            time stamp of the last sample of the window
+        minimum, maximum, mean, last
+            minimum, maximum, mean and last value of the samples of the window
+        count
+            number of samples in the window
+        """
+        self.add_sample(counter_id, sequence_number, timestamp, mean)
+        self._counters[counter_id].extend_envelope([timestamp, minimum, maximum, last, count])
+
+    def add_aggregates(
+        self,
+        counter_ids: np.ndarray,
+        sequence_numbers: np.ndarray,
+        timestamps: np.ndarray,
+        minimums: np.ndarray,
+        maximums: np.ndarray,
+        means: np.ndarray,
+        lasts: np.ndarray,
+        counts: np.ndarray,
+    ) -> None:
+        """Adds a batch of aggregates, this is the vectorized version of add_aggregate."""
+        counter_ids = np.asarray(counter_ids)
+        self.add_lines(counter_ids, sequence_numbers, timestamps, means)
+
+        for counter_id, indices in self._split_by_counter(counter_ids):
+            self._counters[counter_id].extend_envelope(
+                np.column_stack(
+                    (
+                        timestamps[indices],
+                        minimums[indices],
+                        maximums[indices],
+                        lasts[indices],
+                        counts[indices],
+                    )
+                )
+            )
+
+    def get_envelope(self, countername: str, instance: tuple, index=0):
+        """Returns the envelope of an aggregated counter.
+
+        Arguments
+        ---------
+        countername : str
+            name of the HPX performance counter
+        instance : tuple
+            instance identifier (locality, pool, worker id) returned by the format_instance function
+        index : int
+            start from specified index
+
+        Returns
+        -------
+        ndarray where the columns in order are timestamp, min, max, last value and number of
+        samples of each window, empty if the counter is not aggregated. The samples compacted by
+        the retention policy of the collection are aggregated too.
+        """
+        series = self._find_series(countername, instance)
+        if series is None:
+            return np.array([])
+        return series.get_envelope(index)
 
     def get_counter_names(self):
         """Returns the list of available counters that are currently in the collection."""
-        return list(self._data.keys())
+        return list(self._names)
+
+    def _task_snapshot(self, locality):
+        """Returns the last TaskSnapshot committed for the locality, None if there is none."""
+        task_data = self._task_data.get(locality)
+        if not task_data:
+            return None
+
+        snapshot = task_data.get("snapshot")
+        committed = task_data.get("committed")
+        if committed is not None and (snapshot is None or snapshot.version != committed[0]):
+            version, num_tasks, num_verts, num_tris, minimum, maximum, max_worker_id = committed
+            snapshot = task_data["snapshot"] = TaskSnapshot(
+                version,
+                task_data["data"].view(0, num_tasks),
+                task_data["verts"].view(0, num_verts),
+                task_data["tris"].view(0, num_tris),
+                minimum,
+                maximum,
+                max_worker_id,
+            )
+        return snapshot
 
     def task_mesh_data(self, locality):
-        """"""
-        if locality not in self._task_data:
+        """Returns the vertices and the triangles of the tasks of the locality, and the ranges of
+        the plot, as committed by the last batch of tasks."""
+        snapshot = self._task_snapshot(locality)
+        if snapshot is None:
             return [[0, 0, 0, 0]], [[0, 0, 0]], ((0, 1), (0, 1))
 
-        # Find the plot ranges
-        max_worker_id = max(self._task_data[locality]["workers"])
-        min_time = self._task_data[locality]["min"]
-        max_time = self._task_data[locality]["max"]
-
-        vertices = pd.DataFrame(
-            self._task_data[locality]["verts"].get(), columns=["x", "y", "z", "patch_id"]
-        )
-        triangles = pd.DataFrame(
-            self._task_data[locality]["tris"].get().astype(int), columns=["v0", "v1", "v2"]
-        )
-        x_range = (min_time, max_time)
-        y_range = (-1 + task_plot_margin, max_worker_id + 1 / 2 * (1 - task_plot_margin))
+        vertices = pd.DataFrame(snapshot.verts, columns=["x", "y", "z", "patch_id"])
+        triangles = pd.DataFrame(snapshot.tris, columns=["v0", "v1", "v2"])
+        x_range = (snapshot.min, snapshot.max)
+        y_range = (-1 + task_plot_margin, snapshot.max_worker_id + 1 / 2 * (1 - task_plot_margin))
         return vertices, triangles, (x_range, y_range)
 
     def get_data(self, countername: str, instance: tuple, index=0):
@@ -423,27 +823,204 @@ class DataCollection:
 
         Returns
         -------
-        ndarray where the columns in order are sequence number, timestamp, timestamp unit,
-        value and value unit
+        SeriesData
+            read-only views of the sequence numbers, the timestamps and the values (see
+            series.SeriesData), empty if there is no such counter. The old samples compacted by
+            the retention policy come first, as one sample (the mean) per bucket.
         """
-        if countername not in self._data:
-            return np.array([])
+        series = self._find_series(countername, instance)
+        if series is None:
+            return empty_series_data
+        return series.get(index)
 
-        if instance in self._data[countername]:
-            if index >= len(self._data[countername][instance]):
-                return np.array([])
+    def get_texts(self, countername: str, instance: tuple, index=0):
+        """Returns the values of the specified counter instance that are not a single number
+        (e.g. histograms), from the sample `index`.
 
-            return np.array(self._data[countername][instance][index:], dtype="O")
-        else:
-            return np.array([])
+        Returns
+        -------
+        ndarray or None
+            object array with the text of the value of each sample, None for the values that are
+            numbers (see get_data), or None if the counter has no such values
+        """
+        series = self._find_series(countername, instance)
+        if series is None:
+            return None
+        return series.get_texts(index)
+
+    def get_generation(self, countername: str, instance: tuple):
+        """Returns the number of compactions of the specified counter instance.
+
+        The indices of the samples (see get_data) change when the samples are compacted."""
+        series = self._find_series(countername, instance)
+        if series is None:
+            return 0
+        return series.generation
+
+    def iter_series(self):
+        """Returns the list of the Series of all the counter instances."""
+        return [series for instances in self._data.values() for series in instances.values()]
+
+    @property
+    def nbytes(self):
+        """Memory used by the counter data (the task data is not included)."""
+        return sum(series.nbytes for series in self.iter_series())
+
+    def seal(self):
+        """Compresses all the counter samples, once the collection is finished (see
+        Series.seal)."""
+        for _ in self.iter_seal():
+            pass
+
+    def iter_seal(self):
+        """Seals the series one at a time (see seal).
+
+        This is a generator yielding after each series such that the sealing can be spread over
+        several iterations of the loop."""
+        for series in self.iter_series():
+            series.seal()
+            yield
+
+    def get_range(
+        self, countername: str, instance: tuple, begin_time=None, end_time=None, max_points=None
+    ):
+        """Returns the data of the specified countername and instance between two timestamps.
+
+        The samples are found by binary search on the timestamps and returned without copy.
+
+        Arguments
+        ---------
+        countername : str
+            name of the HPX performance counter
+        instance : tuple
+            instance identifier (locality, pool, worker id) returned by the format_instance function
+        begin_time, end_time : float
+            time range of the samples (inclusive), None for the beginning and the end of the series
+        max_points : int
+            if given, the samples are decimated by keeping only every k-th sample such that at
+            most `max_points` samples are returned (see get_summary to keep the min and max)
 
-    def line_data(self):
-        return self._numpy_data.get()
+        Returns
+        -------
+        SeriesData
+            read-only views of the sequence numbers, the timestamps and the values (see
+            series.SeriesData), empty if there is no such counter
+        """
+        series = self._find_series(countername, instance)
+        if series is None:
+            return empty_series_data
+        return series.get_range(begin_time, end_time, max_points)
+
+    def get_num_samples(self, countername: str, instance: tuple, begin_time=None, end_time=None):
+        """Returns the number of samples of the specified countername and instance between two
+        timestamps (inclusive, None for the beginning and the end of the series)."""
+        series = self._find_series(countername, instance)
+        if series is None:
+            return 0
+        begin, end = series.index_range(begin_time, end_time)
+        return end - begin
+
+    def get_summary(
+        self, countername: str, instance: tuple, width: int, begin_time=None, end_time=None
+    ):
+        """Returns the min/max summary of the data of the specified countername and instance.
+
+        The level of detail is chosen such that there are about `width` buckets (e.g. the width of
+        the plot in pixels) between begin_time and end_time, the cost is thus proportional to the
+        width and not to the number of samples. When there are fewer samples than `width`, each
+        sample is returned as a bucket.
+
+        Arguments
+        ---------
+        countername : str
+            name of the HPX performance counter
+        instance : tuple
+            instance identifier (locality, pool, worker id) returned by the format_instance function
+        width : int
+            maximum number of buckets wanted
+        begin_time, end_time : float
+            time range of the samples, None for the beginning and the end of the series
+
+        Returns
+        -------
+        SeriesSummary
+            begin and end timestamps, min, max, mean and number of samples of each bucket (see
+            pyramid.SeriesSummary), empty if there is no such counter
+        """
+        series = self._find_series(countername, instance)
+        if series is None:
+            return SeriesSummary(*np.empty((6, 0)))
+        return series.summary(width, begin_time, end_time)
+
+    def get_units(self, countername: str, instance: tuple):
+        """Returns the timestamp unit and the value unit of the specified counter instance."""
+        series = self._find_series(countername, instance)
+        if series is None:
+            return None, None
+        return series.timestamp_unit, series.value_unit
 
     def task_data(self, locality):
-        if locality not in self._task_data:
+        """Returns the committed task data of the locality (see task_mesh_data) and the names of
+        the tasks.
+
+        The list of the names is only appended to, before the data: its first len(data) names are
+        the ones of the tasks of the data, the names that follow are the ones of tasks that are
+        not committed yet."""
+        snapshot = self._task_snapshot(locality)
+        if snapshot is None:
             return [], []
-        return self._task_data[locality]["data"].get(), self._task_data[locality]["name_list"]
+        return snapshot.data, self._task_data[locality]["name_list"]
+
+    def update_task_summaries(self, summaries: dict) -> None:
+        """Updates the summaries of the tasks sampled by the agent.
+
+        Parameters
+        ----------
+        summaries
+            for each locality, the number of tasks seen and sent by the agent and the
+            [count, total time, min duration, max duration] per task name and per worker. Only
+            the names and workers that changed are given, with their cumulative values.
+        """
+        for locality, summary in summaries.items():
+            locality = str(locality)
+            if locality not in self._task_summaries:
+                self._task_summaries[locality] = {"seen": 0, "sent": 0, "names": {}, "workers": {}}
+            current = self._task_summaries[locality]
+            current["seen"] = summary["seen"]
+            current["sent"] = summary["sent"]
+            current["names"].update(summary["names"])
+            current["workers"].update(summary["workers"])
+
+    def get_task_summaries(self, locality, by="names"):
+        """Returns the summaries of all the tasks of a locality when the tasks are sampled.
+
+        Arguments
+        ---------
+        locality : str
+            locality index
+        by : str
+            `names` for the summaries per task name, `workers` for the summaries per worker
+
+        Returns
+        -------
+        pd.DataFrame with the columns count, total, min and max (durations in s), empty if the
+        tasks are not sampled
+        """
+        columns = ["count", "total", "min", "max"]
+        if locality not in self._task_summaries:
+            return pd.DataFrame(columns=columns)
+        return pd.DataFrame.from_dict(
+            self._task_summaries[locality][by], orient="index", columns=columns
+        )
+
+    def get_task_sampling_ratio(self, locality):
+        """Returns the fraction of the tasks of a locality that have been sent by the agent.
+
+        The ratio is 1 if the tasks are not sampled."""
+        summary = self._task_summaries.get(locality)
+        if not summary or not summary["seen"]:
+            return 1.0
+        return summary["sent"] / summary["seen"]
 
     def get_task_names(self, locality):
         if locality not in self._task_data:
@@ -495,18 +1072,23 @@ class DataCollection:
                 columns=["sequence_number", "timestamp", "timestamp_unit", "value", "value_unit"]
             )
         ]
-        for name in self._data.keys():
-            for instance in self._data[name].keys():
-                data = self.get_data(name, instance)
+        for name_id, instances in self._data.items():
+            name = self._names[name_id]
+            for instance_id, series in instances.items():
+                instance = self._instances[instance_id]
+                data = series.get()
+                values = data.values
+                texts = series.get_texts()
+                if texts is not None:
+                    values = np.where(pd.isnull(texts), values, texts)
                 df = pd.DataFrame(
-                    data,
-                    columns=[
-                        "sequence_number",
-                        "timestamp",
-                        "timestamp_unit",
-                        "value",
-                        "value_unit",
-                    ],
+                    {
+                        "sequence_number": data.sequence,
+                        "timestamp": data.timestamps,
+                        "timestamp_unit": series.timestamp_unit,
+                        "value": values,
+                        "value_unit": series.value_unit,
+                    }
                 )
                 df["countername"] = name
                 locality, pool, thread = from_instance(instance)
@@ -526,7 +1108,7 @@ class DataCollection:
             df = pd.DataFrame(task_data, columns=["worker_id", "start", "end", "name"])
             df = df.astype({"worker_id": int})
             df["locality"] = locality
-            df["name"] = task_names
+            df["name"] = task_names[: len(task_data)]
             dfs.append(df)
         return pd.concat(dfs)
 
@@ -543,9 +1125,12 @@ class DataCollection:
         self._counter_info = counter_info
 
     def line_to_hash(self, countername, instance):
-        """Returns the associated hashed countername and instance stored in the object."""
+        """Returns the associated hashed countername and instance stored in the object.
+
+        The hash is keyed on the name and instance as given: they can be asked for before their
+        first sample, when they have no ids yet (see _find_key)."""
 
-        key = (self._id, countername, instance)
+        key = (countername, instance)
         if key not in self._line_to_hash:
             self._line_to_hash[key] = float(len(self._line_to_hash.keys()))
 
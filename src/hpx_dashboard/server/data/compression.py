@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Compressed storage of the columns of the counter series.
+
+The encodings follow the ones of Gorilla (Pelkonen et al., VLDB 2015) but are byte-aligned
+instead of bit-aligned, such that a whole chunk is encoded and decoded with vectorized numpy
+operations:
+
+- the timestamps (as their int64 bit patterns) and the sequence numbers are encoded by their
+  delta of delta, which is 0 for the counters printed at a fixed interval,
+- the values are encoded by the XOR of their bits with the bits of the previous value, which is 0
+  for a constant counter and has leading and trailing zero bytes for a smooth one.
+
+Each encoded 64-bit word is stored as its significant bytes only, with a control byte giving the
+position and the number of these bytes.
+"""
+
+from bisect import bisect_right
+from collections import OrderedDict
+import threading
+
+import numpy as np
+
+from .buffers import GrowableArray
+
+# Gathers the lowest bit of each of the 8 bytes of a word into the highest byte
+_GATHER_BITS = np.uint64(0x0102040810204080)
+
+
+def _nonzero_bytes(data):
+    """Returns the bitmaps (uint8) of the non-zero bytes of the rows of 8 bytes of `data`."""
+    nonzero = np.ascontiguousarray(data != 0).view(np.uint64).ravel()
+    return ((nonzero * _GATHER_BITS) >> np.uint64(56)).astype(np.uint8)
+
+
+def _lookup_tables():
+    """Returns the control byte of each bitmap of non-zero bytes (see _nonzero_bytes) and the
+    mask of the stored bytes of each control byte."""
+    masks = (np.arange(256)[:, np.newaxis] >> np.arange(8)) & 1 != 0
+    controls = np.zeros(256, dtype=np.uint8)
+    for nonzero, bitmap in zip(masks, _nonzero_bytes(masks.astype(np.uint8))):
+        if nonzero.any():
+            offset = np.argmax(nonzero)
+            length = 8 - np.argmax(nonzero[::-1]) - offset
+            controls[bitmap] = length | (offset << 4)
+
+    byte_masks = np.zeros((256, 8), dtype=bool)
+    for control in range(256):
+        offset, length = control >> 4, control & 15
+        if offset + length <= 8:
+            byte_masks[control, offset : offset + length] = True
+    return controls, byte_masks
+
+
+_CONTROLS, _BYTE_MASKS = _lookup_tables()
+
+
+def pack_words(words):
+    """Packs 64-bit words by stripping their leading and trailing zero bytes.
+
+    Returns
+    -------
+    the control bytes (number of significant bytes | offset of the first one << 4) and the
+    significant bytes of all the words
+    """
+    data = np.ascontiguousarray(words, dtype="<u8").view(np.uint8).reshape(-1, 8)
+    control = _CONTROLS[_nonzero_bytes(data)]
+    return control, data[np.take(_BYTE_MASKS, control, axis=0)]
+
+
+def unpack_words(control, payload):
+    """Inverse of pack_words, returns the words as an uint64 array."""
+    data = np.zeros((len(control), 8), dtype=np.uint8)
+    data[np.take(_BYTE_MASKS, control, axis=0)] = payload
+    return data.view("<u8").ravel().astype(np.uint64, copy=False)
+
+
+def encode_delta_of_delta(integers):
+    """Encodes int64 values by their zigzag-encoded delta of delta."""
+    integers = np.asarray(integers, dtype=np.int64)
+    deltas = np.diff(integers, prepend=np.int64(0))
+    deltas = np.diff(deltas, prepend=np.int64(0))
+    zigzag = (deltas << 1) ^ (deltas >> 63)
+    return pack_words(zigzag.view(np.uint64))
+
+
+def decode_delta_of_delta(control, payload):
+    zigzag = unpack_words(control, payload)
+    deltas = (zigzag >> np.uint64(1)).view(np.int64) ^ -(zigzag & np.uint64(1)).view(np.int64)
+    return np.cumsum(np.cumsum(deltas))
+
+
+def encode_xor(floats):
+    """Encodes float64 values by the XOR of their bits with the bits of the previous value."""
+    bits = np.ascontiguousarray(floats, dtype=float).view(np.uint64)
+    words = bits.copy()
+    words[1:] ^= bits[:-1]
+    return pack_words(words)
+
+
+def decode_xor(control, payload):
+    return np.bitwise_xor.accumulate(unpack_words(control, payload)).view(float)
+
+
+class _Codec:
+    def __init__(self, dtype, encode, decode):
+        self.dtype = np.dtype(dtype)
+        self._encode = encode
+        self._decode = decode
+
+    def encode(self, array):
+        if self.dtype == float and self._encode is encode_delta_of_delta:
+            array = np.ascontiguousarray(array, dtype=float).view(np.int64)
+        return self._encode(array)
+
+    def decode(self, control, payload):
+        array = self._decode(control, payload)
+        return array.view(self.dtype)
+
+
+# Codecs of the columns of a series
+TIMESTAMPS = _Codec(float, encode_delta_of_delta, decode_delta_of_delta)
+SEQUENCE = _Codec(np.int64, encode_delta_of_delta, decode_delta_of_delta)
+VALUES = _Codec(float, encode_xor, decode_xor)
+
+
+class _Chunk:
+    """Encoded chunk of a CompressedArray."""
+
+    __slots__ = ("codec", "size", "first", "control", "payload")
+
+    def __init__(self, codec, array):
+        self.codec = codec
+        self.size = len(array)
+        self.first = array[0]
+        self.control, self.payload = codec.encode(array)
+
+    @property
+    def nbytes(self):
+        return self.control.nbytes + self.payload.nbytes
+
+    def decode(self):
+        return self.codec.decode(self.control, self.payload)
+
+
+class ChunkCache:
+    """Least recently used cache of the decoded chunks.
+
+    The cache is shared by the loop and the thread saving the finished runs, it is thus guarded
+    by a lock (the chunks themselves are immutable)."""
+
+    def __init__(self, max_bytes=64 << 20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._arrays = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chunk):
+        """Returns the decoded (read-only) array of the chunk."""
+        with self._lock:
+            array = self._arrays.get(chunk)
+            if array is not None:
+                self._arrays.move_to_end(chunk)
+                return array
+
+        array = chunk.decode()
+        array.flags.writeable = False
+        with self._lock:
+            # Decoded by the other thread in the meantime
+            if chunk in self._arrays:
+                return self._arrays[chunk]
+            self._arrays[chunk] = array
+            self.nbytes += array.nbytes
+            while self.nbytes > self.max_bytes and len(self._arrays) > 1:
+                _, evicted = self._arrays.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return array
+
+    def discard(self, chunk):
+        with self._lock:
+            array = self._arrays.pop(chunk, None)
+            if array is not None:
+                self.nbytes -= array.nbytes
+
+
+decoded_chunks = ChunkCache()
+
+
+class CompressedArray:
+    """One-dimensional array whose old rows are compressed in sealed chunks.
+
+    The rows are appended to a raw head (GrowableArray). Once the head holds two chunks, the
+    oldest one is encoded with the codec of the array and sealed. The head thus always keeps the
+    most recent rows raw, which are the ones read by the live plots. `seal` encodes the whole
+    head, once no more rows are expected.
+
+    This provides the methods of GrowableArray used by the series. The views of the rows of
+    sealed chunks are decoded with vectorized operations and kept in the cache of the recently
+    decoded chunks (see ChunkCache).
+    """
+
+    def __init__(self, codec, chunk_size=1024, capacity=1024):
+        """
+        Parameters
+        ----------
+        codec
+            TIMESTAMPS, SEQUENCE or VALUES
+        chunk_size : int
+            number of rows of the sealed chunks
+        capacity : int
+            number of rows allocated initially for the head
+        """
+        self.codec = codec
+        self.dtype = codec.dtype
+        self.chunk_size = chunk_size
+        self._chunks = []
+        # Index of the first row of each chunk
+        self._starts = []
+        self._sealed_size = 0
+        self._head = GrowableArray(dtype=self.dtype, capacity=min(capacity, 2 * chunk_size))
+
+    def __len__(self):
+        return self._sealed_size + len(self._head)
+
+    @property
+    def nbytes(self):
+        return sum(chunk.nbytes for chunk in self._chunks) + self._head.nbytes
+
+    def _seal_rows(self, end):
+        """Seals the rows :end of the head in chunks of chunk_size rows (the last one can be
+        shorter)."""
+        head = self._head.view(0, end)
+        for begin in range(0, end, self.chunk_size):
+            chunk = _Chunk(self.codec, head[begin : begin + self.chunk_size])
+            self._chunks.append(chunk)
+            self._starts.append(self._sealed_size)
+            self._sealed_size += chunk.size
+        self._head.replace_range(0, end, [])
+        if self._head.capacity > 4 * self.chunk_size:
+            # After a large extend
+            self._head.shrink()
+
+    def _seal_full_chunks(self):
+        """Seals the oldest chunks of the head, keeping at least one chunk raw."""
+        if len(self._head) >= 2 * self.chunk_size:
+            num_chunks = len(self._head) // self.chunk_size - 1
+            self._seal_rows(num_chunks * self.chunk_size)
+
+    def seal(self):
+        """Seals all the rows, the memory of the head is released."""
+        if len(self._head):
+            self._seal_rows(len(self._head))
+        self._head.shrink()
+
+    def append(self, row):
+        self._head.append(row)
+        if len(self._head) >= 2 * self.chunk_size:
+            self._seal_full_chunks()
+
+    def extend(self, rows):
+        self._head.extend(rows)
+        self._seal_full_chunks()
+
+    def view(self, begin=0, end=None):
+        """Returns the rows begin:end as a read-only array.
+
+        Only the chunks overlapping begin:end are decoded. The array is a zero-copy view if the
+        rows are in the head or in a single chunk, otherwise the parts of the chunks and of the
+        head are copied once into a new array."""
+        begin, end, _ = slice(begin, end).indices(len(self))
+        if begin >= self._sealed_size:
+            return self._head.view(begin - self._sealed_size, end - self._sealed_size)
+        if begin >= end:
+            return self._head.view(0, 0)
+
+        first = bisect_right(self._starts, begin) - 1
+        last = bisect_right(self._starts, min(end, self._sealed_size) - 1) - 1
+        if first == last and end <= self._sealed_size:
+            start = self._starts[first]
+            return decoded_chunks.get(self._chunks[first])[begin - start : end - start]
+
+        array = np.empty(end - begin, dtype=self.dtype)
+        for index in range(first, last + 1):
+            start = self._starts[index]
+            chunk = self._chunks[index]
+            lower, upper = max(begin, start), min(end, start + chunk.size)
+            rows = decoded_chunks.get(chunk)
+            array[lower - begin : upper - begin] = rows[lower - start : upper - start]
+        if end > self._sealed_size:
+            array[self._sealed_size - begin :] = self._head.view(0, end - self._sealed_size)
+        array.flags.writeable = False
+        return array
+
+    def searchsorted(self, value, side="left"):
+        """Returns the index where `value` would be inserted in the rows, which must be sorted.
+
+        Only the chunk containing this index is decoded."""
+        firsts = [chunk.first for chunk in self._chunks]
+        if len(self._head):
+            firsts.append(self._head.view(0, 1)[0])
+        if not firsts:
+            return 0
+
+        if side == "left":
+            index = int(np.searchsorted(firsts, value, "left")) - 1
+        else:
+            index = int(np.searchsorted(firsts, value, "right")) - 1
+        index = max(index, 0)
+        if index == len(self._chunks):
+            rows, start = self._head.view(), self._sealed_size
+        else:
+            rows, start = decoded_chunks.get(self._chunks[index]), self._starts[index]
+        return start + int(np.searchsorted(rows, value, side))
+
+    def replace_range(self, begin, end, rows):
+        """Replaces the rows begin:end by `rows`.
+
+        Only the chunks containing rows begin:end are decoded and encoded again, the chunks that
+        follow are kept as they are (the chunks can thus hold fewer than chunk_size rows)."""
+        rows = np.asarray(rows, dtype=self.dtype)
+        if begin >= self._sealed_size:
+            self._head.replace_range(begin - self._sealed_size, end - self._sealed_size, rows)
+            self._seal_full_chunks()
+            return
+
+        first = bisect_right(self._starts, begin) - 1
+        start = self._starts[first]
+        if end >= self._sealed_size:
+            # The rows from the chunk `first` are moved to the head
+            last, stop = len(self._chunks), len(self)
+        else:
+            last = max(first, bisect_right(self._starts, end - 1) - 1) + 1
+            stop = self._starts[last - 1] + self._chunks[last - 1].size
+        region = self.view(start, stop)
+        region = np.concatenate((region[: begin - start], rows, region[end - start :]))
+
+        chunks = []
+        if end >= self._sealed_size:
+            self._head.replace(region)
+        else:
+            chunks = [
+                _Chunk(self.codec, region[index : index + self.chunk_size])
+                for index in range(0, len(region), self.chunk_size)
+            ]
+
+        for chunk in self._chunks[first:last]:
+            decoded_chunks.discard(chunk)
+        self._chunks[first:last] = chunks
+        starts = [start]
+        for chunk in self._chunks[first:]:
+            starts.append(starts[-1] + chunk.size)
+        self._starts[first:] = starts[:-1]
+        self._sealed_size = starts[-1]
+        self._seal_full_chunks()
+
+    def shrink(self):
+        self._head.shrink()
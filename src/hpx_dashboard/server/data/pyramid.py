@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Multi-resolution summaries (level of detail) of the samples of a series.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from .buffers import GrowableArray
+
+# Columns of the buckets of a summary returned by DataCollection.get_summary
+SeriesSummary = namedtuple(
+    "SeriesSummary", ["begin", "end", "minimums", "maximums", "means", "counts"]
+)
+
+# Columns of the rows stored in each level (the sum is stored instead of the mean such that the
+# buckets are merged by sums)
+_BEGIN, _END, _MIN, _MAX, _SUM, _COUNT = range(6)
+
+
+def _sample_rows(timestamps, values):
+    """Returns the samples as buckets of a single sample (NaN values are not counted)."""
+    rows = np.empty((len(values), 6))
+    rows[:, _BEGIN] = rows[:, _END] = timestamps
+    rows[:, _MIN] = rows[:, _MAX] = values
+    valid = ~np.isnan(values)
+    rows[:, _SUM] = np.where(valid, values, 0.0)
+    rows[:, _COUNT] = valid
+    return rows
+
+
+def _bucket_rows(timestamps, values, size):
+    """Returns the buckets of `size` consecutive samples (the number of samples must be a
+    multiple of `size`)."""
+    timestamps = timestamps.reshape(-1, size)
+    values = values.reshape(-1, size)
+    valid = ~np.isnan(values)
+    rows = np.empty((len(values), 6))
+    rows[:, _BEGIN] = timestamps[:, 0]
+    rows[:, _END] = timestamps[:, -1]
+    np.fmin.reduce(values, axis=1, out=rows[:, _MIN])
+    np.fmax.reduce(values, axis=1, out=rows[:, _MAX])
+    np.where(valid, values, 0.0).sum(axis=1, out=rows[:, _SUM])
+    valid.sum(axis=1, out=rows[:, _COUNT])
+    return rows
+
+
+def _merge_pairs(rows):
+    """Merges the consecutive pairs of buckets of `rows`."""
+    left, right = rows[0::2], rows[1::2]
+    merged = np.empty((len(left), 6))
+    merged[:, _BEGIN] = left[:, _BEGIN]
+    merged[:, _END] = right[:, _END]
+    np.fmin(left[:, _MIN], right[:, _MIN], out=merged[:, _MIN])
+    np.fmax(left[:, _MAX], right[:, _MAX], out=merged[:, _MAX])
+    np.add(left[:, _SUM:], right[:, _SUM:], out=merged[:, _SUM:])
+    return merged
+
+
+def _summary(rows):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = rows[:, _SUM] / rows[:, _COUNT]
+    return SeriesSummary(
+        rows[:, _BEGIN], rows[:, _END], rows[:, _MIN], rows[:, _MAX], means, rows[:, _COUNT]
+    )
+
+
+class Pyramid:
+    """Level-of-detail pyramid of the samples of a series.
+
+    Each level stores the begin and end timestamps, the min, the max, the sum and the number of
+    samples of consecutive buckets of samples. The buckets of the first level hold `base`
+    samples, and the size of the buckets doubles from one level to the next one. Only the complete
+    buckets are stored: the pyramid is updated incrementally as the samples arrive and the
+    incomplete bucket at the end of a level is computed from the samples when it is queried.
+
+    The buckets are defined by a number of samples rather than by a duration, the counters being
+    sampled at a regular interval by HPX.
+
+    The lowest levels can be dropped to save memory (see drop_levels), their buckets are then
+    computed from the samples when they are queried. `levels` holds the levels from
+    `first_level`.
+    """
+
+    def __init__(self, base=16):
+        self.base = base
+        self.levels = []
+        self.first_level = 0
+
+    @property
+    def nbytes(self):
+        return sum(level.nbytes for level in self.levels)
+
+    def bucket_size(self, level):
+        """Number of samples of the buckets of `level`."""
+        return self.base << level
+
+    def update(self, timestamps, values):
+        """Adds the buckets completed by the samples appended to the series since the last update.
+
+        Parameters
+        ----------
+        timestamps, values : CompressedArray
+            samples of the series
+        """
+        size = self.bucket_size(self.first_level)
+        begin = len(self.levels[0]) * size if self.levels else 0
+        end = len(timestamps) // size * size
+        if end <= begin:
+            return
+
+        if not self.levels:
+            self.levels.append(GrowableArray(6, float, capacity=16))
+        first = self.levels[0]
+
+        first.extend(_bucket_rows(timestamps.view(begin, end), values.view(begin, end), size))
+
+        level = 0
+        while len(self.levels[level]) >= 2:
+            if level + 1 == len(self.levels):
+                self.levels.append(GrowableArray(6, float, capacity=16))
+            child, parent = self.levels[level], self.levels[level + 1]
+
+            begin, end = 2 * len(parent), len(child) // 2 * 2
+            if end <= begin:
+                break
+            parent.extend(_merge_pairs(child.view(begin, end)))
+            level += 1
+
+    def truncate(self, num_samples):
+        """Drops the buckets covering the samples from `num_samples`, once these samples have been
+        replaced. They are computed again by the next update."""
+        for index, level in enumerate(self.levels):
+            num_buckets = num_samples // self.bucket_size(self.first_level + index)
+            if num_buckets < len(level):
+                level.replace_range(num_buckets, len(level), [])
+
+    def drop_levels(self, num_levels):
+        """Drops the `num_levels` lowest stored levels (the highest one is kept)."""
+        num_levels = min(num_levels, len(self.levels) - 1)
+        if num_levels > 0:
+            del self.levels[:num_levels]
+            self.first_level += num_levels
+
+    def select_level(self, num_samples, width):
+        """Returns the lowest level with at most `width` buckets for `num_samples` samples, -1 if
+        the samples do not need to be summarized.
+
+        The highest level is returned if none of the levels is coarse enough."""
+        if num_samples <= width or not self.levels:
+            return -1
+        level = 0
+        num_levels = self.first_level + len(self.levels)
+        while num_samples > width * self.bucket_size(level) and level + 1 < num_levels:
+            level += 1
+        return level
+
+    def query(self, timestamps, values, begin, end, width):
+        """Returns the buckets covering the samples begin:end at the level matching `width`.
+
+        Parameters
+        ----------
+        timestamps, values : CompressedArray
+            samples of the series
+        begin, end : int
+            indices of the samples
+        width : int
+            maximum number of buckets wanted, typically the width of the plot in pixels
+
+        Returns
+        -------
+        SeriesSummary
+        """
+        level = self.select_level(end - begin, width)
+        if level < 0:
+            return _summary(_sample_rows(timestamps.view(begin, end), values.view(begin, end)))
+
+        size = self.bucket_size(level)
+        first, last = begin // size, -(-end // size)
+
+        rows = []
+        tail = first * size
+        if level >= self.first_level:
+            buckets = self.levels[level - self.first_level]
+            rows.append(buckets.view(first, min(last, len(buckets))))
+            tail = max(first, len(buckets)) * size
+
+        # Buckets not stored: the ones of a dropped level, and the incomplete one at the end
+        full = tail + max(min(last * size, len(timestamps)) - tail, 0) // size * size
+        if full > tail:
+            rows.append(_bucket_rows(timestamps.view(tail, full), values.view(tail, full), size))
+        if end > full:
+            rows.append(
+                _bucket_rows(timestamps.view(full, end), values.view(full, end), end - full)
+            )
+        return _summary(np.concatenate(rows))
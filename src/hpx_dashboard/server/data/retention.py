@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Retention of the samples of the collections: the old samples are compacted into coarser
+aggregates to bound the memory used by long runs.
+"""
+
+import time
+
+from tornado.ioloop import PeriodicCallback
+
+from ...common.logger import Logger
+from .aggregator import DataAggregator
+
+
+class RetentionPolicy:
+    """Retention policy of the counter samples of a collection.
+
+    The samples older than `raw_duration` (relative to the last sample of their series) are
+    compacted into one sample per bucket of `bucket_size` samples, holding the mean, with the min
+    and max in the envelope of the series (see Series.compact). If the collection still uses
+    more than `max_bytes`, the compacted samples are merged two by two, then the raw samples are
+    compacted regardless of their age, until the collection fits in its budget.
+    """
+
+    def __init__(self, raw_duration=None, max_bytes=None, bucket_size=16, min_samples=1024):
+        """
+        Parameters
+        ----------
+        raw_duration : float
+            time (in s) during which the samples are kept as is, None to compact only to stay in
+            the memory budget
+        max_bytes : int
+            memory budget (in bytes) of the counter data of the collection, None for no budget
+        bucket_size : int
+            number of samples compacted in a single one
+        min_samples : int
+            minimum number of samples compacted at once in a series
+        """
+        self.raw_duration = raw_duration
+        self.max_bytes = max_bytes
+        self.bucket_size = bucket_size
+        self.min_samples = min_samples
+        self._over_budget = set()
+
+    def _reduce(self, series):
+        """Reduces the memory of a series that is over the budget, returns False if it can not."""
+        if series.num_compacted >= 2 and series.coarsen():
+            return True
+
+        # Compacts the older half of the raw samples
+        middle = (series.num_compacted + len(series)) // 2
+        if middle <= series.num_compacted:
+            return False
+        end_time = series.timestamps.view(middle, middle + 1)[0]
+        return series.compact(end_time, self.bucket_size) > 0
+
+    def apply(self, collection):
+        """Applies the policy to the collection, one series at a time.
+
+        This is a generator yielding after each series such that the compaction can be spread
+        over several iterations of the loop."""
+        if self.raw_duration is not None:
+            for series in collection.iter_series():
+                if not len(series):
+                    continue
+                end_time = series.timestamps.view(len(series) - 1)[0] - self.raw_duration
+                series.compact(end_time, self.bucket_size, self.min_samples)
+                yield
+
+        if not self.max_bytes:
+            return
+
+        nbytes = collection.nbytes
+        while nbytes > self.max_bytes:
+            reduced = False
+            for series in sorted(collection.iter_series(), key=lambda s: s.nbytes, reverse=True):
+                series_nbytes = series.nbytes
+                reduced = self._reduce(series) or reduced
+                nbytes += series.nbytes - series_nbytes
+                yield
+                if nbytes <= self.max_bytes:
+                    return
+            if not reduced:
+                if collection.run_id not in self._over_budget:
+                    self._over_budget.add(collection.run_id)
+                    Logger().warning(
+                        f"The counter data of the run {collection.run_id} ({collection.nbytes}"
+                        f" bytes) can not be compacted to fit in its memory budget"
+                        f" ({self.max_bytes} bytes)."
+                    )
+                return
+
+
+class Compactor:
+    """Applies the retention policies of the collections in the background.
+
+    The compaction runs periodically on the Tornado loop, next to the ingestion of the data (see
+    Ingestor), for at most `time_budget` per iteration of the loop.
+    """
+
+    def __init__(self, interval=1.0, time_budget=0.005):
+        """
+        Parameters
+        ----------
+        interval : float
+            time (in s) between two iterations
+        time_budget : float
+            time (in s) spent at most in the compaction per iteration
+        """
+        self.interval = interval
+        self.time_budget = time_budget
+        self._current = None
+        self._callback = None
+
+    def _collections(self):
+        """Applies the policies to all the collections, yielding after each series.
+
+        A collection being saved (see DataCollection.saving) is skipped, and left as soon as its
+        saving starts."""
+        for collection in list(DataAggregator().get_all_runs()):
+            if collection.retention and not collection.saving:
+                for _ in collection.retention.apply(collection):
+                    yield
+                    if collection.saving:
+                        break
+
+    def _process(self):
+        """Compacts until the time budget is spent or all the collections have been visited."""
+        deadline = time.perf_counter() + self.time_budget
+        if self._current is None:
+            self._current = self._collections()
+
+        while time.perf_counter() < deadline:
+            try:
+                next(self._current)
+            except StopIteration:
+                self._current = None
+                return
+
+    def start(self):
+        """Starts the compaction on the current Tornado loop."""
+        self._callback = PeriodicCallback(self._process, self.interval * 1000)
+        self._callback.start()
+
+    def stop(self):
+        if self._callback:
+            self._callback.stop()
+            self._callback = None
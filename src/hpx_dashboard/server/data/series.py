@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Columnar storage of the samples of a performance counter instance.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from . import compression
+from .buffers import GrowableArray
+from .compression import CompressedArray
+from .pyramid import Pyramid
+
+# Read-only views of the columns of a series returned by DataCollection.get_data
+SeriesData = namedtuple("SeriesData", ["sequence", "timestamps", "values"])
+
+empty_series_data = SeriesData(
+    np.empty(0, dtype=np.int64), np.empty(0, dtype=float), np.empty(0, dtype=float)
+)
+
+
+class Series:
+    """Samples of a counter instance stored column by column.
+
+    The sequence numbers (int64), the timestamps and the values (float64) are each stored in a
+    compressed array (see compression.CompressedArray): the most recent samples are kept raw in a
+    growable array (24 bytes per sample), the older ones are compressed by chunks of
+    `chunk_size` samples. `seal` compresses all the samples once the run is finished. The units
+    are stored once for the whole series.
+
+    The min/max pyramid of the samples (see pyramid.Pyramid) is updated as the samples arrive,
+    which adds about 6 bytes per sample. The samples appended one by one only update it once
+    every `pyramid_batch` samples (and before a summary is read), an update having a fixed cost.
+    Sealing drops its `sealed_dropped_levels` lowest levels, whose buckets are then computed from
+    the decoded samples.
+
+    The envelope holds [timestamp, min, max, last, count] for the samples that aggregate several
+    samples: the windows aggregated by the agent (see DataCollection.add_aggregate) and the
+    buckets compacted by the server (see compact). Its rows correspond to the first samples of
+    the series, one row per sample.
+
+    Old samples can be compacted into one sample (the mean) per bucket to bound the memory of the
+    series, the first `num_compacted` samples of the series are then compacted samples. The
+    positions of the samples change with each compaction, which increments `generation`.
+
+    The values that are not a single number (e.g. histograms) are stored as NaN in the values,
+    their text is kept in `texts` by sequence number. The texts of the compacted samples are
+    dropped.
+    """
+
+    pyramid_batch = 1024
+    chunk_size = 1024
+    sealed_dropped_levels = 2
+
+    def __init__(self, timestamp_unit=None, value_unit=None, capacity=1024):
+        self.timestamp_unit = timestamp_unit
+        self.value_unit = value_unit
+        self.sequence = CompressedArray(compression.SEQUENCE, self.chunk_size, capacity)
+        self.timestamps = CompressedArray(compression.TIMESTAMPS, self.chunk_size, capacity)
+        self.values = CompressedArray(compression.VALUES, self.chunk_size, capacity)
+        self.pyramid = Pyramid()
+        self.envelope = None
+        self.texts = None
+        self._text_bytes = 0
+        self.num_compacted = 0
+        self.generation = 0
+        self.sealed = False
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def nbytes(self):
+        return (
+            self.sequence.nbytes
+            + self.timestamps.nbytes
+            + self.values.nbytes
+            + self.pyramid.nbytes
+            + (self.envelope.nbytes if self.envelope is not None else 0)
+            + self._text_bytes
+        )
+
+    def append(self, sequence_number, timestamp, value):
+        """Appends a single sample."""
+        self.sequence.append(sequence_number)
+        self.timestamps.append(timestamp)
+        self.values.append(value)
+        if len(self.timestamps) % self.pyramid_batch == 0:
+            self.pyramid.update(self.timestamps, self.values)
+
+    def extend(self, sequence_numbers, timestamps, values):
+        """Appends the samples given as columns."""
+        self.sequence.extend(sequence_numbers)
+        self.timestamps.extend(timestamps)
+        self.values.extend(values)
+        self.pyramid.update(self.timestamps, self.values)
+
+    def seal(self):
+        """Compresses all the samples, when no more samples are expected."""
+        self.pyramid.update(self.timestamps, self.values)
+        for array in (self.sequence, self.timestamps, self.values):
+            array.seal()
+        self.pyramid.drop_levels(self.sealed_dropped_levels - self.pyramid.first_level)
+        for level in self.pyramid.levels:
+            level.shrink()
+        if self.envelope is not None:
+            self.envelope.shrink()
+        self.sealed = True
+
+    def add_texts(self, sequence_numbers, texts):
+        """Adds the texts of the samples whose value is not a single number."""
+        if self.texts is None:
+            self.texts = {}
+        for sequence_number, text in zip(sequence_numbers, texts):
+            self.texts[int(sequence_number)] = text
+            self._text_bytes += len(text) + 16
+
+    def get_texts(self, index=0):
+        """Returns the texts of the samples from `index` as an object array, None for the samples
+        whose value is a number, or None if the series has no texts."""
+        if not self.texts:
+            return None
+        texts = np.full(max(len(self) - index, 0), None, dtype=object)
+        begin = max(index, self.num_compacted)
+        sequence = self.sequence.view(begin).tolist()
+        texts[begin - index :] = [self.texts.get(sequence_number) for sequence_number in sequence]
+        return texts
+
+    def extend_envelope(self, rows):
+        """Appends rows of [timestamp, min, max, last, count] to the envelope."""
+        if self.envelope is None:
+            self.envelope = GrowableArray(5, float, capacity=16)
+        self.envelope.extend(rows)
+
+    def get_envelope(self, index=0):
+        """Returns the read-only view of the envelope from the row `index`."""
+        if self.envelope is None or index >= len(self.envelope):
+            return np.array([])
+        return self.envelope.view(index)
+
+    def get(self, index=0):
+        """Returns the read-only views of the columns from the sample `index`."""
+        return SeriesData(
+            self.sequence.view(index), self.timestamps.view(index), self.values.view(index)
+        )
+
+    def index_range(self, begin_time=None, end_time=None):
+        """Returns the indices begin, end of the samples with begin_time <= timestamp <= end_time.
+
+        The timestamps of a series are increasing."""
+        begin = 0 if begin_time is None else self.timestamps.searchsorted(begin_time, "left")
+        end = len(self.timestamps)
+        if end_time is not None:
+            end = self.timestamps.searchsorted(end_time, "right")
+        return begin, end
+
+    def get_range(self, begin_time=None, end_time=None, max_points=None):
+        """Returns the read-only views of the columns of the samples between begin_time and
+        end_time, keeping only every k-th sample if there are more than `max_points` samples."""
+        begin, end = self.index_range(begin_time, end_time)
+        step = 1
+        if max_points and end - begin > max_points:
+            step = -(-(end - begin) // max_points)
+        return SeriesData(
+            self.sequence.view(begin, end)[::step],
+            self.timestamps.view(begin, end)[::step],
+            self.values.view(begin, end)[::step],
+        )
+
+    def summary(self, width, begin_time=None, end_time=None):
+        """Returns the summary of the samples between begin_time and end_time with about `width`
+        buckets (see pyramid.Pyramid.query)."""
+        self.pyramid.update(self.timestamps, self.values)
+        begin, end = self.index_range(begin_time, end_time)
+        return self.pyramid.query(self.timestamps, self.values, begin, end, width)
+
+    def _merge_samples(self, begin, end, size):
+        """Replaces the samples begin:end by one sample per bucket of `size` samples.
+
+        The sample of a bucket has the sequence number and the timestamp of the last sample of the
+        bucket and the mean as value, the min, max, last value and number of samples of the bucket
+        go in the envelope. Incomplete buckets at the end are left untouched.
+
+        Returns
+        -------
+        int
+            the number of buckets
+        """
+        num_buckets = (end - begin) // size
+        if num_buckets <= 0:
+            return 0
+        end = begin + num_buckets * size
+
+        # Copies, as the buffers are modified below
+        sequence = np.array(self.sequence.view(begin, end).reshape(-1, size)[:, -1])
+        timestamps = np.array(self.timestamps.view(begin, end).reshape(-1, size)[:, -1])
+        values = self.values.view(begin, end).reshape(-1, size)
+
+        envelope = self.envelope
+        if envelope is not None and len(envelope) >= end:
+            # Samples that already aggregate several samples, weighted by their counts
+            rows = envelope.view(begin, end).reshape(-1, size, 5)
+            minimums = np.fmin.reduce(rows[:, :, 1], axis=1)
+            maximums = np.fmax.reduce(rows[:, :, 2], axis=1)
+            lasts = np.array(rows[:, -1, 3])
+            weights = rows[:, :, 4]
+        else:
+            minimums = np.fmin.reduce(values, axis=1)
+            maximums = np.fmax.reduce(values, axis=1)
+            lasts = np.array(values[:, -1])
+            weights = ~np.isnan(values)
+
+        if self.texts:
+            for sequence_number in self.sequence.view(begin, end).tolist():
+                text = self.texts.pop(sequence_number, None)
+                if text is not None:
+                    self._text_bytes -= len(text) + 16
+
+        counts = weights.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.nansum(values * weights, axis=1) / counts
+        rows = np.column_stack((timestamps, minimums, maximums, lasts, counts))
+
+        self.sequence.replace_range(begin, end, sequence)
+        self.timestamps.replace_range(begin, end, timestamps)
+        self.values.replace_range(begin, end, means)
+        if self.envelope is None:
+            self.envelope = GrowableArray(5, float, capacity=16)
+        self.envelope.replace_range(begin, min(end, len(self.envelope)), rows)
+
+        self.generation += 1
+        for array in (self.sequence, self.timestamps, self.values, self.envelope):
+            array.shrink()
+        # Only the buckets of the samples from `begin` are computed again
+        self.pyramid.truncate(begin)
+        self.pyramid.update(self.timestamps, self.values)
+        if self.sealed:
+            self.seal()
+        return num_buckets
+
+    def compact(self, end_time, bucket_size=16, min_samples=1):
+        """Compacts the raw samples older than `end_time` into buckets of `bucket_size` samples.
+
+        Nothing is done if fewer than `min_samples` samples can be compacted, which amortizes the
+        cost of the compaction (the samples that follow are moved).
+
+        Returns
+        -------
+        int
+            the number of samples removed
+        """
+        begin = self.num_compacted
+        end = self.timestamps.searchsorted(end_time, "left")
+        if end - begin < max(min_samples, bucket_size):
+            return 0
+
+        num_buckets = self._merge_samples(begin, end, bucket_size)
+        self.num_compacted += num_buckets
+        return num_buckets * (bucket_size - 1)
+
+    def coarsen(self):
+        """Merges the compacted samples two by two, which halves their number.
+
+        Returns
+        -------
+        int
+            the number of samples removed
+        """
+        num_buckets = self._merge_samples(0, self.num_compacted, 2)
+        self.num_compacted -= num_buckets
+        return num_buckets
@@ -50,15 +50,39 @@ class DataSources(metaclass=Singleton):
                 countername, instance, self._data[doc][identifier]["last_index"]
             )
 
-            if data.ndim == 2:
+            if len(data.timestamps):
                 data_dict = {
-                    f"{identifier}_time": data[:, 1],
-                    f"{identifier}": data[:, 3],
+                    f"{identifier}_time": data.timestamps,
+                    f"{identifier}": data.values,
                 }
-                self._data[doc][identifier]["last_index"] = data[-1, 0]
+                self._data[doc][identifier]["last_index"] += len(data.timestamps)
                 self._num_updates[doc][identifier] += 1
         return data_dict
 
+    def _get_envelope_from_collection(
+        self, doc, collection: DataCollection, identifier: tuple
+    ):
+        """Returns the new points of the envelope (min and max) of an aggregated counter."""
+        data_dict = {
+            f"{identifier}_time": [],
+            f"{identifier}_min": [],
+            f"{identifier}_max": [],
+        }
+        if collection:
+            countername, instance = identifier[0], identifier[1]
+            data = collection.get_envelope(
+                countername, instance, self._data[doc][identifier]["envelope_index"]
+            )
+
+            if data.ndim == 2:
+                data_dict = {
+                    f"{identifier}_time": data[:, 0],
+                    f"{identifier}_min": data[:, 1],
+                    f"{identifier}_max": data[:, 2],
+                }
+                self._data[doc][identifier]["envelope_index"] += len(data)
+        return data_dict
+
     def _update(self, doc):
         """"""
         reset = False
@@ -74,18 +98,38 @@ class DataSources(metaclass=Singleton):
                 data["data_source"].data = self._get_from_collection(doc, None, identifier)
                 data["last_index"] = 0
                 data["last_time"] = 0
+                data["envelope_source"].data = self._get_envelope_from_collection(
+                    doc, None, identifier
+                )
+                data["envelope_index"] = 0
+                data["generation"] = 0
                 self._num_updates[doc][identifier] = 0
                 update = True
 
             new_data = {f"{identifier}": []}
-            if DataAggregator().get_current_run():
-                new_data = self._get_from_collection(
-                    doc, DataAggregator().get_current_run(), identifier
-                )
-            elif DataAggregator().get_last_run():
-                new_data = self._get_from_collection(
-                    doc, DataAggregator().get_last_run(), identifier
-                )
+            new_envelope = {f"{identifier}_time": []}
+            collection = DataAggregator().get_current_run() or DataAggregator().get_last_run()
+            if collection:
+                # The samples have been compacted, their indices changed and they are reloaded
+                generation = collection.get_generation(identifier[0], identifier[1])
+                if generation != data["generation"]:
+                    data["generation"] = generation
+                    data["last_index"] = 0
+                    data["envelope_index"] = 0
+                    data["data_source"].data = self._get_from_collection(
+                        doc, collection, identifier
+                    )
+                    data["envelope_source"].data = self._get_envelope_from_collection(
+                        doc, collection, identifier
+                    )
+                    update = True
+
+                new_data = self._get_from_collection(doc, collection, identifier)
+                new_envelope = self._get_envelope_from_collection(doc, collection, identifier)
+
+            if len(new_envelope[f"{identifier}_time"]) > 0:
+                data["envelope_source"].stream(new_envelope)
+                update = True
 
             data_len = len(new_data[f"{identifier}"])
             if data_len > 0:
@@ -119,12 +163,17 @@ class DataSources(metaclass=Singleton):
         if identifier not in self._data[doc]:
             if not collection:
                 collection = DataAggregator().get_live_collection()
+            generation = collection.get_generation(countername, instance) if collection else 0
 
             self._data[doc][identifier] = {
                 "last_index": 0,
                 "last_time": 0,
                 "x_name": f"{identifier}_time",
                 "y_name": f"{identifier}",
+                "envelope_index": 0,
+                "generation": generation,
+                "min_name": f"{identifier}_min",
+                "max_name": f"{identifier}_max",
                 "callbacks": set(),
             }
 
@@ -138,6 +187,10 @@ class DataSources(metaclass=Singleton):
                 self._data[doc][identifier]["data_source"] = ColumnDataSource(
                     self._get_from_collection(doc, None, identifier)
                 )
+            # Envelope of the counters aggregated by the agent (empty otherwise)
+            self._data[doc][identifier]["envelope_source"] = ColumnDataSource(
+                self._get_envelope_from_collection(doc, collection, identifier)
+            )
 
         return self._data[doc][identifier]
 
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Interning of the counter names and instances of a collection.
+"""
+
+
+class SymbolTable:
+    """Maps hashable symbols (names, instance tuples) to dense integer ids and back.
+
+    The ids are given in the order in which the symbols are interned, starting from 0, such that
+    they can be used as indices of lists or arrays.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._symbols = []
+
+    def intern(self, symbol) -> int:
+        """Returns the id of `symbol`, a new id is given if the symbol is not known yet."""
+        symbol_id = self._ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = len(self._symbols)
+            self._ids[symbol] = symbol_id
+            self._symbols.append(symbol)
+        return symbol_id
+
+    def get(self, symbol, default=None):
+        """Returns the id of `symbol` or `default` if the symbol is not known."""
+        return self._ids.get(symbol, default)
+
+    def __getitem__(self, symbol_id: int):
+        """Returns the symbol of the id."""
+        return self._symbols[symbol_id]
+
+    def __contains__(self, symbol):
+        return symbol in self._ids
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def __iter__(self):
+        """Iterates over the symbols in the order of their ids."""
+        return iter(self._symbols)
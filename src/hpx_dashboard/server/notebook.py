@@ -9,7 +9,6 @@
 
 """Module for integration into Jupyter notebooks"""
 
-from queue import Queue
 import threading
 import time
 
@@ -17,7 +16,7 @@ from bokeh.plotting import output_notebook, show
 
 from ..common.logger import Logger
 from .data import DataAggregator
-from .tcp_listener import TCP_Server, handle_response
+from .tcp_listener import Ingestor, TCP_Server
 from .components import scheduler_doc, tasks_doc, custom_counter_doc
 from .worker import worker_thread, WorkerQueue
 from ..common.constants import task_cmap
@@ -43,12 +42,10 @@ def start(port=5267, auto_save=True, save_path="", import_path=""):
     """
     DataAggregator(auto_save=auto_save, save_path=save_path, import_path=import_path)
 
-    tcp_queue = Queue()
-    tcp_server = TCP_Server(queue=tcp_queue)
+    ingestor = Ingestor()
+    tcp_server = TCP_Server(queue=ingestor)
     tcp_server.listen(port)
-    tcp_thread = threading.Thread(target=lambda: handle_response(tcp_queue))
-    tcp_thread.daemon = True
-    tcp_thread.start()
+    ingestor.start()
 
     work_queue = WorkerQueue()
     work_thread = threading.Thread(target=lambda: worker_thread(work_queue))
@@ -11,10 +11,11 @@
 """
 from collections import OrderedDict
 
+import numpy as np
 from bokeh.plotting import Figure
+from bokeh.events import MouseWheel, PanEnd, Reset
 from bokeh.layouts import column
-from bokeh.models import Legend, LegendItem
-import pandas as pd
+from bokeh.models import ColumnDataSource, Legend, LegendItem
 
 from ..data import DataSources
 from ..widgets import empty_placeholder
@@ -22,6 +23,26 @@ from .base import BaseElement, get_colors, get_figure_options
 from .raster import ShadedTimeSeries
 
 
+def _line_data(collection, countername, instance, x_range=None, width=800):
+    """Returns the x and y of a line between x_range[0] and x_range[1] (the whole line if None).
+
+    If there are at most `width` samples in the range (the width of the plot in pixels), they are
+    returned as they are (see DataCollection.get_range). Otherwise, the plot is zoomed out and the
+    line goes through the min and the max of each bucket of the summary of the samples (see
+    DataCollection.get_summary), with about `width` buckets: the peaks stay visible, and the cost
+    depends on the width and not on the number of samples."""
+    begin, end = x_range if x_range else (None, None)
+    if collection.get_num_samples(countername, instance, begin, end) <= width:
+        data = collection.get_range(countername, instance, begin, end)
+        return {"x": data.timestamps, "y": data.values}
+
+    summary = collection.get_summary(countername, instance, width, begin, end)
+    return {
+        "x": np.column_stack((summary.begin, summary.end)).ravel(),
+        "y": np.column_stack((summary.minimums, summary.maximums)).ravel(),
+    }
+
+
 class TimeSeries(BaseElement):
     """"""
 
@@ -39,6 +60,8 @@ class TimeSeries(BaseElement):
         self._data_sources = OrderedDict()
         self._names = OrderedDict()
         self._glyphs = OrderedDict()
+        # Samples of the lines in the viewport, for the line glyphs
+        self._line_sources = OrderedDict()
 
         # For shaded data
         self._data = []
@@ -51,6 +74,9 @@ class TimeSeries(BaseElement):
         self._reshade = True
         self._x_range = None
         self._y_range = None
+        # The line glyphs follow the data until the user zooms or pans (see _viewport)
+        self._keep_range = False
+        self._last_viewport = None
 
         self._is_shaded = shade
         self._root = column(empty_placeholder())
@@ -116,6 +142,7 @@ class TimeSeries(BaseElement):
             del self._data_sources[key]
         if key in self._glyphs:
             del self._glyphs[key]
+        self._line_sources.pop(key, None)
         if not hold_update:
             self._make_figure()
 
@@ -123,15 +150,11 @@ class TimeSeries(BaseElement):
         """"""
         self._data_sources.clear()
         self._glyphs.clear()
+        self._line_sources.clear()
         self._colors = []
         self._make_figure()
 
     def update(self):
-        if self._reshade and self._is_shaded:
-            self._data = []
-            for key, ds in self._data_sources.items():
-                self._data.append(ds["data_source"].data)
-
         # Rebuild the figure in case the user switched from shaded or vice-versa
         if self._rebuild_figure:
             self._make_figure()
@@ -139,7 +162,7 @@ class TimeSeries(BaseElement):
             self._reshade = False
 
         if self._reshade and self._is_shaded:
-            self._build_shaded_data()
+            self._build_shaded_data(self._shaded_fig.viewport())
             self._shaded_fig.set_data(
                 self._data,
                 self._colors,
@@ -147,6 +170,9 @@ class TimeSeries(BaseElement):
                 self._y_range,
             )
             self._reshade = False
+        elif not self._is_shaded and (self._reshade or self._viewport() != self._last_viewport):
+            self._update_lines()
+            self._reshade = False
 
         # Get statistics of lines
         if self._print_stats:
@@ -167,24 +193,45 @@ class TimeSeries(BaseElement):
         self._is_shaded = not self._is_shaded
         self._rebuild_figure = True
 
-    def _build_shaded_data(self):
+    def _build_shaded_data(self, x_range=None):
+        """Fetches the data of the lines in x_range (the whole lines if None) for the shaded
+        plot, which computes its ranges from it."""
         self._data = []
-        dataframes = {}
-        for _, _, collection, _ in self._data_sources.keys():
-            collection = DataSources().get_collection(collection)
-            if collection:
-                df = pd.DataFrame(collection.line_data(), copy=False)
-                df.rename(columns={0: "x", 1: "y", 2: "name"}, inplace=True)
-                dataframes[collection] = df
-
+        width = self._defaults_opts["plot_width"]
         for countername, instance, collection, _ in self._data_sources.keys():
             collection = DataSources().get_collection(collection)
             if collection:
-                key = collection.line_to_hash(countername, instance)
-                df = dataframes[collection]
-                self._data.append(df[df["name"] == key])
+                self._data.append(_line_data(collection, countername, instance, x_range, width))
             else:
                 self._data.append({"x": [0], "y": [0]})
+        return self._data
+
+    def _viewport(self):
+        """Returns the x range of the line glyphs if the user zoomed or panned, None if the plot
+        follows the data."""
+        if not self._keep_range or self._figure is None:
+            return None
+        x_range = self._figure.x_range
+        if x_range.start is None or x_range.end is None:
+            return None
+        return (x_range.start, x_range.end)
+
+    def _update_lines(self):
+        """Replaces the data of the line glyphs by the samples in the viewport."""
+        viewport = self._viewport()
+        width = self._defaults_opts["plot_width"]
+        for key, source in self._line_sources.items():
+            countername, instance, collection, _ = key
+            collection = DataSources().get_collection(collection)
+            if collection:
+                source.data = _line_data(collection, countername, instance, viewport, width)
+        self._last_viewport = viewport
+
+    def _freeze_range(self, event):
+        self._keep_range = True
+
+    def _follow_data(self, event):
+        self._keep_range = False
 
     def _build_legend(self):
         legend_items = []
@@ -210,22 +257,38 @@ class TimeSeries(BaseElement):
                 self._doc,
                 self._data,
                 self._colors,
+                fetch_data=self._build_shaded_data,
                 **self._defaults_opts,
             )
             self._figure = self._shaded_fig.layout()
         else:
             self._figure = Figure(**self._defaults_opts)
+            self._figure.on_event(MouseWheel, self._freeze_range)
+            self._figure.on_event(PanEnd, self._freeze_range)
+            self._figure.on_event(Reset, self._follow_data)
+            self._keep_range = False
 
             for key, ds in self._data_sources.items():
                 if key not in self._glyphs:
                     index = list(self._data_sources.keys()).index(key)
-                    self._glyphs[key] = self._figure.line(
+                    # Min/max envelope of the counters aggregated by the agent
+                    self._figure.varea(
                         x=ds["x_name"],
-                        y=ds["y_name"],
-                        source=ds["data_source"],
+                        y1=ds["min_name"],
+                        y2=ds["max_name"],
+                        source=ds["envelope_source"],
+                        fill_color=self._colors[index],
+                        fill_alpha=0.3,
+                    )
+                    self._line_sources[key] = ColumnDataSource({"x": [], "y": []})
+                    self._glyphs[key] = self._figure.line(
+                        x="x",
+                        y="y",
+                        source=self._line_sources[key],
                         line_color=self._colors[index],
                         line_width=2,
                     )
+            self._update_lines()
 
         self._build_legend()
         self._root.children[0] = self._figure
@@ -28,30 +28,35 @@ def _is_intersecting(interval1, interval2):
     return interval1[0] <= interval2[1] and interval2[0] <= interval1[1]
 
 
+def _clip_to_range(x, y, x_range=None):
+    """Returns the part of the line (x, y) drawn in x_range, x being sorted.
+
+    The samples are found by binary search and the arrays are sliced without copy. The samples
+    just outside of the range are kept for the segments that cross the borders of the range."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if not x_range or not len(x):
+        return x, y
+    begin = max(int(np.searchsorted(x, x_range[0], "left")) - 1, 0)
+    end = min(int(np.searchsorted(x, x_range[1], "right")) + 1, len(x))
+    return x[begin:end], y[begin:end]
+
+
 def _is_data_in_range(df, x_col, y_col, x_range=None, y_range=None):
-    """"""
-    if not len(df[x_col]) or not len(df[y_col]):
-        return False
+    """Returns True if the line (df[x_col], df[y_col]) is visible in the ranges.
 
-    if not isinstance(df, dict):
-        df = pd.DataFrame(df)
+    The x column must be sorted, only the samples in x_range are read."""
+    x, y = _clip_to_range(df[x_col], df[y_col], x_range)
+    if not len(x) or not len(y):
+        return False
 
-    if x_range and y_range:
-        idx_left = df[x_col].sub(x_range[0]).astype(float).abs().idxmin()
-        idx_right = df[x_col].sub(x_range[1]).astype(float).abs().idxmin()
-        if idx_left == idx_right:
+    if x_range and not _is_intersecting((x[0], x[-1]), x_range):
+        return False
+    if y_range:
+        if np.isnan(y).all():
             return False
-        x_sub = df[x_col].loc[idx_left:idx_right]
-        y_sub = df[y_col].loc[idx_left:idx_right]
-        minx, miny = min(x_sub), min(y_sub)
-        maxx, maxy = max(x_sub), max(y_sub)
-        return _is_intersecting((minx, maxx), x_range) and _is_intersecting((miny, maxy), y_range)
-    elif x_range:
-        return _is_intersecting((min(df[x_col]), max(df[x_col])), x_range)
-    elif y_range:
-        return _is_intersecting((min(df[y_col]), max(df[y_col])), y_range)
-    else:
-        return True
+        return _is_intersecting((np.nanmin(y), np.nanmax(y)), y_range)
+    return True
 
 
 def _normalize_ranges(x_range, y_range):
@@ -123,23 +128,12 @@ def shade_line(data, colors=None, **kwargs):
     cs = []
 
     for i, line in enumerate(data):
-        df = line
-        if not isinstance(line, pd.DataFrame):
-            df = pd.DataFrame(line).astype(float)
-
-        plot = True
-        if "x_range" in kwargs and "y_range" in kwargs:
-            plot = _is_data_in_range(df, "x", "y", kwargs["x_range"], kwargs["y_range"])
-        elif "x_range" in kwargs:
-            plot = _is_data_in_range(df, "x", "y", kwargs["x_range"])
-        elif "y_range" in kwargs:
-            plot = _is_data_in_range(df, "x", "y", y_range=kwargs["y_range"])
-
-        if len(df["x"]) == 0 or len(df["y"]) == 0:
-            plot = False
-
-        if plot:
-            aggs.append(cvs.line(df, "x", "y"))
+        # Only the samples in the viewport are given to datashader
+        x, y = _clip_to_range(line["x"], line["y"], kwargs["x_range"])
+        df = {"x": x, "y": y}
+
+        if _is_data_in_range(df, "x", "y", kwargs["x_range"], kwargs["y_range"]):
+            aggs.append(cvs.line(pd.DataFrame(df, copy=False), "x", "y"))
             if colors:
                 cs.append(colors[i])
 
@@ -164,10 +158,12 @@ def get_ranges(data):
         data = [data]
 
     for line in data:
-        if not len(line["x"]) or not len(line["y"]):
+        x = np.asarray(line["x"], dtype=float)
+        y = np.asarray(line["y"], dtype=float)
+        if not len(x) or np.isnan(y).all():
             continue
-        x_range = (min(min(line["x"]), x_range[0]), max(max(line["x"]), x_range[1]))
-        y_range = (min(min(line["y"]), y_range[0]), max(max(line["y"]), y_range[1]))
+        x_range = (min(np.nanmin(x), x_range[0]), max(np.nanmax(x), x_range[1]))
+        y_range = (min(np.nanmin(y), y_range[0]), max(np.nanmax(y), y_range[1]))
 
     if x_range[0] == y_range[0] == finfo.max or x_range[1] == y_range[0] == finfo.min:
         return (0.0, 1.0), (0.0, 1.0)
@@ -229,6 +225,11 @@ class ShadedPlot(BaseElement):
     def _freeze_ranges(self, *args):
         self._keep_range = True
 
+    def viewport(self):
+        """Returns the x range shown if the user zoomed or panned, None if the plot follows the
+        data."""
+        return self._current_x_range if self._keep_range else None
+
     def _calculate_ranges(self):
         return (0, 1), (0, 1)
 
@@ -477,7 +478,11 @@ class ShadedTaskPlot(ShadedPlot):
 
 
 class ShadedTimeSeries(ShadedPlot):
-    """"""
+    """Shaded lines.
+
+    If `fetch_data` is given, it is called with the x range shown (see viewport) to fetch the data
+    of the lines again when the user zooms or pans, such that the data can be limited to the
+    viewport."""
 
     def __init__(
         self,
@@ -485,11 +490,15 @@ class ShadedTimeSeries(ShadedPlot):
         data,
         colors=None,
         refresh_rate=500,
+        fetch_data=None,
         **kwargs,
     ):
         """"""
         self._colors = colors
         self._data = data
+        self._fetch_data = fetch_data
+        # x range of the data given or fetched last, None for the whole lines
+        self._data_range = None
 
         super().__init__(doc, refresh_rate, **kwargs)
 
@@ -516,10 +525,20 @@ class ShadedTimeSeries(ShadedPlot):
     def _calculate_ranges(self):
         return _normalize_ranges(*get_ranges(self._data))
 
+    def _reset_fct(self, event):
+        # The ranges are computed from the whole lines, not from the last viewport
+        if self._fetch_data:
+            self._data_range = None
+            self._data = self._fetch_data(None)
+        super()._reset_fct(event)
+
     def _reshade(self, immediate=False):
         """"""
 
         def gen():
+            if self._fetch_data and self.viewport() != self._data_range:
+                self._data_range = self.viewport()
+                self._data = self._fetch_data(self._data_range)
             img = shade_line(
                 self._data,
                 self._colors,
@@ -548,8 +567,10 @@ class ShadedTimeSeries(ShadedPlot):
         x_range=None,
         y_range=None,
     ):
-        """"""
+        """Sets the data of the lines, which must be the data in the viewport if the plot fetches
+        its data (see fetch_data)."""
         self._data = data
+        self._data_range = self.viewport()
 
         _x_range, _y_range = self._calculate_ranges()
 
@@ -77,6 +77,8 @@ class TasksPlot(BaseElement):
         )
 
         self._num_points = 0
+        self._title = defaults_opts["title"]
+        self._sampling_ratio = 1.0
 
         self._figure = ShadedTaskPlot(
             doc,
@@ -119,6 +121,15 @@ class TasksPlot(BaseElement):
             self._figure.set_data(verts, tris, data_ranges, names, task_data)
             self._num_points = len(verts)
 
+        # Label the plot when the agent only sends a sample of the tasks
+        sampling_ratio = collection.get_task_sampling_ratio(self._locality)
+        if sampling_ratio != self._sampling_ratio:
+            self._sampling_ratio = sampling_ratio
+            title = self._title
+            if sampling_ratio < 1:
+                title += f" (sampled: {sampling_ratio:.1%} of the tasks)"
+            self._figure.layout().title.text = title
+
     def set_instance(self, locality):
         self._locality = locality
         self._num_points = -1
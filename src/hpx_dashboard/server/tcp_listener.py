@@ -10,58 +10,311 @@
 """
 """
 
-import pickle
+import asyncio
+import heapq
+import itertools
+import time
 import traceback
 
+import numpy as np
+from tornado.ioloop import IOLoop
 from tornado.tcpserver import TCPServer
 from tornado.iostream import StreamClosedError
 
 from .data import DataAggregator
-from ..common.constants import message_separator
+from ..common import protocol
 from ..common.logger import Logger
 
+# Lanes of the frames in the Ingestor (see TCP_Server)
+BEGIN_LANE = 0
+PRIORITY_LANE = 1
+BULK_LANE = 2
 
-def handle_response(queue):
+
+def _add_data(collection, data, slice_size=16384):
+    """Adds the decoded columns of a data message to the collection.
+
+    This is a generator which yields after each slice of `slice_size` records, such that the
+    insertion of a large message can be spread over several iterations of the loop.
+    """
+    for definition in data.get("counter_definitions", []):
+        collection.define_counter(*definition)
+
+    if "counter_id" in data:
+        columns = [
+            data["counter_id"],
+            data["counter_sequence"],
+            data["counter_timestamp"],
+            data["counter_value"],
+        ]
+        for begin in range(0, len(columns[0]), slice_size):
+            collection.add_lines(*(column[begin : begin + slice_size] for column in columns))
+            DataAggregator().dummy_counter += len(columns[0][begin : begin + slice_size])
+            yield
+
+    if "counter_text" in data:
+        rows = np.array([row for row, _ in data["counter_text"]], dtype=np.int64)
+        collection.add_texts(
+            data["counter_id"][rows],
+            data["counter_sequence"][rows],
+            [text for _, text in data["counter_text"]],
+        )
+
+    if "aggregate_id" in data:
+        columns = [
+            data["aggregate_id"],
+            data["aggregate_sequence"],
+            data["aggregate_timestamp"],
+            data["aggregate_min"],
+            data["aggregate_max"],
+            data["aggregate_mean"],
+            data["aggregate_last"],
+            data["aggregate_count"],
+        ]
+        for begin in range(0, len(columns[0]), slice_size):
+            collection.add_aggregates(*(column[begin : begin + slice_size] for column in columns))
+            DataAggregator().dummy_counter += len(columns[0][begin : begin + slice_size])
+            yield
+
+    if "task_name" in data:
+        columns = [data["task_locality"], data["task_worker"], data["task_name"]]
+        times = [data["task_start"], data["task_end"]]
+        for begin in range(0, len(columns[0]), slice_size):
+            collection.add_tasks(
+                *(column[begin : begin + slice_size] for column in columns),
+                data["task_names"],
+                *(column[begin : begin + slice_size] for column in times),
+            )
+            yield
+
+    if "task_summaries" in data:
+        collection.update_task_summaries(data["task_summaries"])
+
+    for line in data.get("lines", []):
+        Logger().info(line)
+
+
+async def _finalize(collection, time_budget=0.005):
+    """Saves the collection of a finished run in a thread, then seals it on the loop.
+
+    The export of the data to csv takes up to seconds for long runs, which would freeze the plots
+    if it ran on the loop. The Compactor leaves the collection untouched in the meantime (see
+    DataCollection.saving), and no more data is added to it, the thread is thus the only one to
+    read it. The series are then sealed on the loop, where the plots read them, for at most
+    `time_budget` per iteration of the loop.
+    """
+    aggregator = DataAggregator()
+    collection.saving = True
+    try:
+        await IOLoop.current().run_in_executor(None, aggregator.save_collection, collection)
+    finally:
+        collection.saving = False
+
+    sealing = collection.iter_seal()
     while True:
-        try:
-            response = queue.get()
-            response_type, data = pickle.loads(response)
-
-            if response_type == "regular-data":
-                for response_type, sub_data in data:
-                    if response_type == "counter-data" and DataAggregator().current_run is not None:
-                        DataAggregator().current_data.add_line(*sub_data)
-                        DataAggregator().dummy_counter += 1
-                    elif response_type == "line":
-                        Logger().info(sub_data)
-                    elif response_type == "task-data":
-                        DataAggregator().current_data.add_task_data(*sub_data)
-
-            elif response_type == "transmission_begin":
-                Logger().info("BEGIN")
-                DataAggregator().new_collection(data)
-            elif response_type == "transmission_end":
-                DataAggregator().finalize_current_collection(data)
-                Logger().info("END")
-            elif response_type == "counter-infos" and DataAggregator().current_run is not None:
-                DataAggregator().set_counter_infos(data)
-
-        except Exception as e:
-            Logger().error(e)
-            traceback.print_exc()
+        deadline = time.perf_counter() + time_budget
+        for _ in sealing:
+            if time.perf_counter() >= deadline:
+                break
+        else:
+            return
+        await asyncio.sleep(0)
+
+
+def _handle_frame(run_id, message_type, payload):
+    """Processes a frame received by the TCP_Server.
+
+    This is a generator which yields between the slices of the data messages (see _add_data).
+    """
+    if message_type == protocol.TRANSMISSION_BEGIN:
+        start_time, run_id = protocol.decode_message(message_type, payload)
+        if DataAggregator().resume_collection(run_id):
+            Logger().info(f"RESUME {run_id}")
+        else:
+            Logger().info(f"BEGIN {run_id}")
+            DataAggregator().new_collection(start_time, run_id)
+        return
+
+    # Each connection only writes to the collection of its own run
+    collection = DataAggregator().get_live_run(run_id)
+    if collection is None:
+        return
+
+    data = protocol.decode_message(message_type, payload)
+    if message_type == protocol.DATA:
+        yield from _add_data(collection, data)
+    elif message_type == protocol.TRANSMISSION_END:
+        collection = DataAggregator().end_collection(run_id, data)
+        Logger().info(f"END {run_id}")
+        if collection is not None:
+            IOLoop.current().spawn_callback(_finalize, collection)
+    elif message_type == protocol.COUNTER_INFOS:
+        collection.set_counter_infos(data)
+
+
+class Ingestor:
+    """Decodes and inserts the frames received by the TCP_Server into the collections.
+
+    The ingestion runs on the Tornado loop, next to the callbacks of the Bokeh documents, instead
+    of a thread competing with them for the GIL. On each iteration of the loop, the frames are
+    processed until `time_budget` is spent, then the loop is given back to the other callbacks.
+    A large data message is inserted by slices, and can thus be spread over several iterations.
+
+    The frames are kept in heaps, ordered by the key (lane, arrival order) given by the
+    TCP_Server, one heap for the frames of the bulk lane and one for the other frames. The frames
+    are processed in the order of their keys, except in the last `bulk_share` of the time budget
+    of each iteration, where they are processed in their arrival order. A continuous flow of
+    priority frames can thus not starve the bulk lane, and a bulk frame is never processed before
+    a priority frame which arrived earlier (e.g. the definitions of its counters).
+
+    The frames of the concurrent runs (one per connection, see TCP_Server) are interleaved on the
+    loop in their arrival order, rather than ingested in parallel threads: the collections are read
+    by the plots on the loop, and the insertion is mostly Python code holding the GIL, so threads
+    would add locks without running the runs faster. As the large messages are inserted by slices
+    and the time budget is shared by the lanes, the runs progress together and a run sending a
+    continuous flow of frames delays the others by at most its frames which arrived earlier.
+
+    The payloads waiting to be processed use at most about `max_bytes`: above, the TCP_Server
+    stops reading the connections (see wait_for_room) until the ingestion catches up. The data
+    then stays in the socket buffers and the agents block on sending, instead of the server
+    buffering an unbounded backlog.
+    """
+
+    def __init__(self, time_budget=0.01, bulk_share=0.25, max_bytes=256 << 20):
+        """
+        Parameters
+        ----------
+        time_budget : float
+            time (in s) spent at most in the ingestion per iteration of the loop
+        bulk_share : float
+            share of the time budget in which the frames are processed in their arrival order
+        max_bytes : int
+            size of the payloads waiting to be processed above which the connections are no
+            longer read
+        """
+        self.time_budget = time_budget
+        self.bulk_share = bulk_share
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._frames = []
+        self._bulk_frames = []
+        self._current = None
+        self._has_frames = None
+        self._has_room = None
+
+    def put(self, frame):
+        """Adds a frame (key, run id, message type, payload) to the frames to process."""
+        lane, _ = frame[0]
+        heapq.heappush(self._bulk_frames if lane == BULK_LANE else self._frames, frame)
+        self.nbytes += len(frame[3])
+        if self._has_frames is not None:
+            self._has_frames.set()
+
+    async def wait_for_room(self):
+        """Waits until the payloads waiting to be processed use less than max_bytes."""
+        while self.nbytes >= self.max_bytes:
+            if self._has_room is None:
+                self._has_room = asyncio.Event()
+            self._has_room.clear()
+            await self._has_room.wait()
+
+    def qsize(self):
+        return len(self._frames) + len(self._bulk_frames)
+
+    def _pop(self, arrival_order):
+        """Returns the next frame to process, in the order of the keys or in the arrival order,
+        None if there are no frames left."""
+        if not self._bulk_frames:
+            if not self._frames:
+                return None
+            frame = heapq.heappop(self._frames)
+        elif self._frames and (
+            not arrival_order or self._frames[0][0][1] < self._bulk_frames[0][0][1]
+        ):
+            frame = heapq.heappop(self._frames)
+        else:
+            frame = heapq.heappop(self._bulk_frames)
+
+        self.nbytes -= len(frame[3])
+        if self._has_room is not None and self.nbytes < self.max_bytes:
+            self._has_room.set()
+        return frame
+
+    def _process(self, deadline):
+        """Processes the frames until there are no frames left or the deadline is passed."""
+        arrival_order_begin = deadline - self.bulk_share * self.time_budget
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                return
+            if self._current is None:
+                frame = self._pop(now >= arrival_order_begin)
+                if frame is None:
+                    return
+                _, run_id, message_type, payload = frame
+                self._current = _handle_frame(run_id, message_type, payload)
+
+            try:
+                next(self._current)
+            except StopIteration:
+                self._current = None
+            except Exception as e:
+                Logger().error(e)
+                traceback.print_exc()
+                self._current = None
+
+    async def run(self):
+        """Processes the frames as they arrive, until the loop is stopped."""
+        self._has_frames = asyncio.Event()
+        while True:
+            if not self.qsize() and self._current is None:
+                self._has_frames.clear()
+                await self._has_frames.wait()
+
+            self._process(time.perf_counter() + self.time_budget)
+            await asyncio.sleep(0)
+
+    def start(self):
+        """Starts the ingestion on the current Tornado loop."""
+        IOLoop.current().spawn_callback(self.run)
 
 
 class TCP_Server(TCPServer):
     """
-    overrides handle_stream"""
+    overrides handle_stream
+
+    Each connection is bound to the run id of its last TRANSMISSION_BEGIN message, such that
+    several agents can send data at the same time, each one to its own live collection. An agent
+    that reconnects sends the same run id again and resumes its collection.
+
+    The frames are put in the Ingestor as (key, run id, message type, payload), with the key
+    (lane, arrival order): the beginnings of the transmissions are processed first, then the
+    frames of the priority lane (see protocol.FLAG_PRIORITY), then the frames of the bulk lane.
+    The frames of the different runs are thus interleaved in their arrival order. The end of a
+    transmission goes in the bulk lane, it is processed after all the frames of its run as it is
+    the last frame sent by the agent. The finished run is then saved in a thread (see _finalize).
+    """
 
     def __init__(self, queue, **args):
         super().__init__(**args)
         self._queue = queue
+        self._arrival = itertools.count()
+
+    def _priority_key(self, message_type, flags):
+        if message_type == protocol.TRANSMISSION_BEGIN:
+            lane = BEGIN_LANE
+        elif flags & protocol.FLAG_PRIORITY:
+            lane = PRIORITY_LANE
+        else:
+            lane = BULK_LANE
+        return (lane, next(self._arrival))
 
     async def handle_stream(self, stream, address) -> None:
         """Handle the stream of incoming data over TCP
 
+        The frames are read with `read_into` directly into buffers allocated from the header of
+        the frame, the decoding of the payload is left to the Ingestor.
+
         Parameters
         ----------
         stream
@@ -69,12 +322,29 @@ class TCP_Server(TCPServer):
         address
             address to read from
         """
+        header = bytearray(protocol.header.size)
+        run_id = None
 
         while True:
             try:
-                response = await stream.read_until(message_separator)
-                self._queue.put(response)
+                # Backpressure: the connection is not read while the ingestion lags
+                await self._queue.wait_for_room()
+                await stream.read_into(header)
+                message_type, flags, length = protocol.decode_header(header)
 
+                payload = bytearray(length)
+                if length:
+                    await stream.read_into(payload)
+                if message_type == protocol.TRANSMISSION_BEGIN:
+                    _, run_id = protocol.decode_message(message_type, payload)
+
+                key = self._priority_key(message_type, flags)
+                self._queue.put((key, run_id, message_type, payload))
+
+            except protocol.ProtocolError as e:
+                Logger().error(f"Closing the connection with {address}: {e}")
+                stream.close()
+                return
             except StreamClosedError:
                 stream.close(exc_info=True)
                 return
@@ -54,7 +54,7 @@ class DataCollectionSelect(BaseWidget):
         data_collection_list = ["Most recent"]
         for i, run in reversed(list(enumerate(DataAggregator().data))):
 
-            if i == DataAggregator().current_run:
+            if DataAggregator().is_live(run):
                 data_collection_list.append(f"Run {i} (live)")
             else:
                 data_collection_list.append(f"Run {i}")
@@ -303,7 +303,7 @@ class DataCollectionWidget(BaseWidget):
             # Title of the run
             title = f"Run #{index}"
 
-            if DataAggregator().get_current_run() == collection:
+            if DataAggregator().is_live(collection):
                 if most_recent_flag:
                     title += " (most recent, live)"
                 else:
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Tests of the windowed pre-aggregation of the counter samples in the agent."""
+
+import asyncio
+import math
+
+from hpx_dashboard.agent.aggregation import AggregatingBatcher
+from hpx_dashboard.agent.lanes import LaneCheckpoint
+from hpx_dashboard.agent.readers import Checkpoint
+
+
+class RecordingBatcher(AggregatingBatcher):
+    """Records the aggregates instead of batching them."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.aggregates = []
+
+    def add_aggregate(self, counter_id, sequence_number, timestamp, *summary):
+        self.aggregates.append((counter_id, sequence_number, timestamp) + summary)
+
+
+def aggregate(samples, window=1.0):
+    """Returns the (min, max, mean, last, count) of the windows of the samples of a counter."""
+
+    async def run():
+        batcher = RecordingBatcher(asyncio.Queue(), window)
+        batcher.add_counter_definition(0, ("obj", "counter", "", "[s]"))
+        for sequence_number, (timestamp, value) in enumerate(samples):
+            batcher.add_counter(0, sequence_number, timestamp, value)
+        await batcher.close()
+        return [aggregate[3:] for aggregate in batcher.aggregates]
+
+    return asyncio.get_event_loop().run_until_complete(run())
+
+
+def assert_window(actual, expected):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert (math.isnan(a) and math.isnan(e)) or a == e
+
+
+def test_windows():
+    windows = aggregate([(0.1, 1.0), (0.5, 3.0), (0.9, 2.0), (1.2, 5.0)])
+    assert len(windows) == 2
+    assert_window(windows[0], (1.0, 3.0, 2.0, 2.0, 3))
+    assert_window(windows[1], (5.0, 5.0, 5.0, 5.0, 1))
+
+
+def test_leading_nan():
+    windows = aggregate([(0.1, math.nan), (0.5, 3.0), (0.9, 1.0)])
+    assert_window(windows[0], (1.0, 3.0, 2.0, 1.0, 2))
+
+
+def test_nan_in_window():
+    windows = aggregate([(0.1, 1.0), (0.5, math.nan), (0.9, 3.0)])
+    assert_window(windows[0], (1.0, 3.0, 2.0, 3.0, 2))
+
+
+def test_window_of_nan():
+    windows = aggregate([(0.1, math.nan), (0.5, math.nan)])
+    assert_window(windows[0], (math.nan, math.nan, math.nan, math.nan, 0))
+
+
+def test_checkpoint_is_held_until_the_open_windows_are_sent():
+    async def run():
+        queue = asyncio.Queue()
+        batcher = RecordingBatcher(queue, 1.0)
+        batcher.add_counter_definition(0, ("obj", "counter", "", "[s]"))
+        batcher.add_counter_definition(1, ("obj", "counter", "", "[s]"))
+        batcher.add_counter(0, 0, 0.1, 1.0)
+        batcher.add_counter(1, 0, 0.1, 1.0)
+        batcher.add_checkpoint(Checkpoint(None, None, 0))
+        frames = []
+        num_markers = []
+        for counter_id in (0, 1):
+            batcher.add_counter(counter_id, 1, 1.1, 1.0)
+            batcher._flush("timeout")
+            await batcher.drain()
+            while not queue.empty():
+                frames.append(queue.get_nowait())
+            num_markers.append(sum(isinstance(frame, LaneCheckpoint) for frame in frames))
+        await batcher.close()
+        return num_markers
+
+    assert asyncio.get_event_loop().run_until_complete(run()) == [0, 2]
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Tests of the batching of the records in the agent."""
+
+import asyncio
+
+from hpx_dashboard.agent.batcher import Batcher, PRIORITY
+from hpx_dashboard.agent.lanes import FrameLanes, LaneCheckpoint
+from hpx_dashboard.agent.readers import Checkpoint
+from hpx_dashboard.common import protocol
+
+
+def test_priority_frames_bypass_a_full_bulk_lane():
+    async def run():
+        queue = FrameLanes(maxsize=1)
+        batcher = Batcher(queue, timeout=1000)
+        for line in ("first", "second"):
+            batcher.add_line(line)
+            batcher._flush("timeout")
+        # Blocks on the second bulk frame
+        bulk_drain = asyncio.ensure_future(batcher.drain())
+        await asyncio.sleep(0)
+
+        batcher.add_counter(0, 0, 0.0, 1.0)
+        batcher._flush("timeout", PRIORITY)
+        priority_drain = asyncio.ensure_future(batcher.drain())
+        await asyncio.sleep(0)
+        num_priority_frames = queue.priority.qsize()
+
+        frames = [await queue.get() for _ in range(3)]
+        await asyncio.wait_for(asyncio.gather(bulk_drain, priority_drain), 1)
+        await batcher.close()
+        return num_priority_frames, frames
+
+    num_priority_frames, frames = asyncio.get_event_loop().run_until_complete(run())
+    assert num_priority_frames == 1
+    assert [protocol.is_priority(frame) for frame in frames] == [True, False, False]
+
+
+class RecordingReader:
+    def __init__(self):
+        self.commits = []
+
+    def commit(self, checkpoint):
+        self.commits.append(checkpoint.offset)
+
+
+def test_checkpoint_markers_follow_the_batches():
+    async def run():
+        queue = asyncio.Queue()
+        batcher = Batcher(queue, timeout=1000)
+        reader = RecordingReader()
+        batcher.add_counter(0, 0, 0.0, 1.0)
+        batcher.add_line("line")
+        batcher.add_checkpoint(Checkpoint(reader, None, 10))
+        await batcher.close()
+
+        frames = []
+        while not queue.empty():
+            frames.append(queue.get_nowait())
+        return reader, frames
+
+    reader, frames = asyncio.get_event_loop().run_until_complete(run())
+    assert [type(frame) for frame in frames] == [bytes, LaneCheckpoint, bytes, LaneCheckpoint]
+    assert protocol.is_priority(frames[0]) and frames[1].priority
+    assert not protocol.is_priority(frames[2]) and not frames[3].priority
+
+    frames[1].checkpoint.reached()
+    assert reader.commits == []
+    frames[3].checkpoint.reached()
+    assert reader.commits == [10]
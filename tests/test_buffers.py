@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Tests of the growable numpy buffers of the server."""
+
+import numpy as np
+import pytest
+
+from hpx_dashboard.server.data.buffers import GrowableArray
+
+chunk_sizes = [None, 4]
+
+
+@pytest.mark.parametrize("chunk_size", chunk_sizes)
+@pytest.mark.parametrize("dtype", [np.int64, np.float32, object])
+def test_dtype_is_kept_on_growth(chunk_size, dtype):
+    array = GrowableArray(dtype=dtype, capacity=1, chunk_size=chunk_size)
+    for i in range(5):
+        array.append(i)
+    array.extend(range(5, 30))
+    assert len(array) == 30 and array.capacity >= 30
+    assert array.view().dtype == np.dtype(dtype)
+    assert array.view().tolist() == list(range(30))
+
+
+@pytest.mark.parametrize("chunk_size", chunk_sizes)
+def test_rows_of_a_two_dimensional_array(chunk_size):
+    array = GrowableArray(width=3, dtype=np.int32, capacity=2, chunk_size=chunk_size)
+    array.append([0, 1, 2])
+    array.extend(np.arange(3, 30))
+    np.testing.assert_array_equal(array.view(), np.arange(30).reshape(-1, 3))
+    np.testing.assert_array_equal(array.view(2, 4), [[6, 7, 8], [9, 10, 11]])
+    np.testing.assert_array_equal(array.view(-1), [[27, 28, 29]])
+
+
+def test_growth_doubles_the_capacity():
+    array = GrowableArray(capacity=3)
+    array.extend(range(4))
+    assert array.capacity == 6
+    array.extend(range(10))
+    assert array.capacity == 24
+
+
+def test_chunks_are_never_copied():
+    array = GrowableArray(dtype=np.int64, chunk_size=4)
+    array.extend(range(6))
+    first_chunk = array._chunks[0]
+    array.extend(range(6, 100))
+    assert array._chunks[0] is first_chunk
+    assert array.capacity == 100
+    chunks = array.chunks(2, 11)
+    assert [chunk.tolist() for chunk in chunks] == [[2, 3], [4, 5, 6, 7], [8, 9, 10]]
+
+
+@pytest.mark.parametrize("chunk_size", chunk_sizes)
+def test_views_are_read_only_snapshots(chunk_size):
+    array = GrowableArray(dtype=np.int64, capacity=2, chunk_size=chunk_size)
+    array.extend(range(10))
+    view = array.view(0, 3)
+    assert not view.flags.writeable
+    with pytest.raises(ValueError):
+        view[0] = 42
+    assert all(not chunk.flags.writeable for chunk in array.chunks())
+
+    array.extend(range(10, 100))
+    array.replace_range(0, 2, [-1])
+    assert view.tolist() == [0, 1, 2]
+    if chunk_size is None:
+        # A view of a contiguous array is zero-copy
+        assert np.shares_memory(array.view(3, 9), array._data)
+
+
+@pytest.mark.parametrize("chunk_size", chunk_sizes)
+@pytest.mark.parametrize(
+    "begin, end, rows", [(0, 2, [-1]), (3, 3, [-1, -2]), (5, 10, []), (8, 10, [-1] * 7)]
+)
+def test_replace_range(chunk_size, begin, end, rows):
+    array = GrowableArray(dtype=np.int64, capacity=4, chunk_size=chunk_size)
+    array.extend(range(10))
+    array.replace_range(begin, end, rows)
+    expected = list(range(begin)) + rows + list(range(end, 10))
+    assert array.view().tolist() == expected
+    array.append(42)
+    assert array.view().tolist() == expected + [42]
+
+
+@pytest.mark.parametrize("chunk_size", chunk_sizes)
+def test_replace_clear_and_shrink(chunk_size):
+    array = GrowableArray(dtype=np.float64, capacity=4, chunk_size=chunk_size)
+    array.extend(np.arange(100))
+    array.replace(np.arange(10))
+    assert array.view().tolist() == list(range(10))
+
+    array.extend(np.arange(100))
+    array.replace_range(10, 110, [])
+    array.shrink()
+    assert array.view().tolist() == list(range(10))
+    assert array.capacity == (12 if chunk_size else 10)
+    assert array.nbytes == array.capacity * 8
+
+    array.clear()
+    assert len(array) == 0 and array.view().dtype == np.float64
+    assert array.chunks() == []
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Tests of the parallel parsing of the recorded HPX outputs."""
+
+import asyncio
+import mmap
+
+import pytest
+
+from hpx_dashboard.agent.chunked import chunk_boundaries, collect_file
+from hpx_dashboard.agent.hpx_parser import HPXParser, _counter_infos_header, _hpx_separator
+from hpx_dashboard.common import protocol
+
+
+def hpx_output():
+    """Returns the lines of the output of an HPX program with --hpx:list-counter-infos."""
+    lines = [b"Hello world", _counter_infos_header]
+    for counter in ("count/cumulative", "idle-rate"):
+        lines += [
+            _hpx_separator,
+            f"fullname: /threads{{locality#*/total}}/{counter}".encode(),
+            b"helptext: returns: the " + counter.encode(),
+            b"type:     counter_raw",
+            b"version:  1.0.0",
+        ]
+    lines += [_hpx_separator, b"", b"some stdout"]
+
+    for step in range(40):
+        timestamp = 0.01 * (step + 1)
+        # New counters keep appearing in the later chunks
+        for worker in range(min(step // 10 + 1, 4)):
+            lines.append(
+                f"/threads{{locality#0/worker-thread#{worker}}}/count/cumulative,{step},"
+                f"{timestamp:.6f},[s],{step * 7 + worker}".encode()
+            )
+            lines.append(
+                f'"/threads{{locality#0/pool#default/worker-thread#{worker}}}/idle-rate",{step},'
+                f"{timestamp:.6f},[s],{step * 3 + worker},[0.01%]".encode()
+            )
+            task = f"task_data,0,{worker},task_{step % 3},{timestamp:.6f},{timestamp + 0.001:.6f}"
+            lines.append(task.encode())
+        # Values that are not a single number are sent as text
+        histogram = f"/threads{{locality#0/total}}/histogram,{step},{timestamp:.6f},[s]"
+        lines.append(f"{histogram},[0 {step} 1]".encode())
+        if step % 7 == 0:
+            lines.append(f"iteration {step}".encode())
+    return lines
+
+
+def decode(frames):
+    """Returns the counter infos, the counter samples (with their names), the tasks and the lines
+    of the frames of a transmission."""
+    infos, samples, tasks, lines = [], [], [], []
+    names = {}
+    for frame in frames:
+        message_type, _, _ = protocol.decode_header(frame[: protocol.header.size])
+        data = protocol.decode_message(message_type, frame[protocol.header.size :])
+        if message_type == protocol.COUNTER_INFOS:
+            infos.append(data)
+        if message_type != protocol.DATA:
+            continue
+
+        for counter_id, *name in data.get("counter_definitions", []):
+            assert counter_id not in names
+            names[counter_id] = tuple(name)
+        if "counter_id" in data:
+            columns = ("counter_id", "counter_sequence", "counter_timestamp", "counter_value")
+            texts = dict(data.get("counter_text", []))
+            rows = zip(*(data[column].tolist() for column in columns))
+            for row, (counter_id, sequence_number, timestamp, value) in enumerate(rows):
+                value = texts.get(row, value)
+                samples.append((names[counter_id], sequence_number, timestamp, value))
+        if "task_name" in data:
+            columns = ("task_locality", "task_worker", "task_name", "task_start", "task_end")
+            for locality, worker, name, *times in zip(*(data[c].tolist() for c in columns)):
+                tasks.append((locality, worker, data["task_names"][name], *times))
+        lines += data.get("lines", [])
+    return infos, samples, tasks, lines
+
+
+def parse_serially(lines):
+    async def run():
+        parser = HPXParser(send_stdout=True, buffer_timeout=1000)
+        lines_queue, frames_queue = asyncio.Queue(), asyncio.Queue()
+        lines_queue.put_nowait(lines)
+        lines_queue.put_nowait(None)
+        await parser.collect(lines_queue, frames_queue)
+        return [frames_queue.get_nowait() for _ in range(frames_queue.qsize())]
+
+    return asyncio.get_event_loop().run_until_complete(run())
+
+
+def parse_in_chunks(path, chunk_size):
+    async def run():
+        parser = HPXParser(send_stdout=True, buffer_max_records=50)
+        frames_queue = asyncio.Queue()
+        await collect_file(parser, path, frames_queue, jobs=2, chunk_size=chunk_size)
+        return [frames_queue.get_nowait() for _ in range(frames_queue.qsize())]
+
+    return asyncio.get_event_loop().run_until_complete(run())
+
+
+@pytest.fixture
+def output_file(tmp_path):
+    lines = hpx_output()
+    path = tmp_path / "output.log"
+    path.write_bytes(b"\n".join(lines) + b"\n")
+    return str(path), lines
+
+
+@pytest.mark.parametrize("chunk_size", [1, 37, 500, 1 << 20])
+def test_chunk_boundaries(output_file, chunk_size):
+    path, lines = output_file
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            boundaries = chunk_boundaries(mm, chunk_size)
+            chunks = [mm[begin:end] for begin, end in boundaries]
+
+    assert boundaries[0][0] == 0 and boundaries[-1][1] == len(b"\n".join(lines)) + 1
+    assert all(end == begin for (_, end), (begin, _) in zip(boundaries, boundaries[1:]))
+    # No line is split between two chunks
+    assert all(chunk.endswith(b"\n") for chunk in chunks)
+    # The whole --hpx:list-counter-infos block is in the same chunk as its header
+    (chunk,) = [chunk for chunk in chunks if _counter_infos_header in chunk]
+    assert chunk.split(_counter_infos_header)[1].count(_hpx_separator) == 3
+
+
+@pytest.mark.parametrize("chunk_size", [1, 37, 500, 1 << 20])
+def test_chunked_parsing_is_the_serial_parsing(output_file, chunk_size):
+    path, lines = output_file
+    infos, samples, tasks, output = decode(parse_in_chunks(path, chunk_size))
+    assert (infos, samples, tasks, output) == decode(parse_serially(lines))
+    assert len(infos) == 1 and len(infos[0]) == 2
+    assert len(samples) == 2 * len(tasks) + 40 == 2 * 100 + 40
+    assert samples[-1][-1] == "[0 39 1]"
+    assert output[0] == "Hello world" and "iteration 35" in output
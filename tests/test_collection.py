@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Tests of the task and counter data of the collection."""
+
+import numpy as np
+
+from hpx_dashboard.server.data.collection import DataCollection
+from hpx_dashboard.server.data.series import Series
+
+
+def add_tasks(collection, localities, worker_ids, names, starts, ends):
+    unique_names = sorted(set(names))
+    collection.add_tasks(
+        np.array(localities, dtype=np.uint32),
+        np.array(worker_ids, dtype=np.uint32),
+        np.array([unique_names.index(name) for name in names], dtype=np.uint32),
+        unique_names,
+        np.array(starts, dtype=float),
+        np.array(ends, dtype=float),
+    )
+
+
+def test_task_workers_share_the_counter_instances():
+    collection = DataCollection()
+    collection.add_line(
+        "/threads/count/cumulative",
+        "locality#0/pool#default/worker-thread#1",
+        None,
+        1,
+        0.5,
+        "[s]",
+        "3",
+        None,
+    )
+    add_tasks(collection, [0, 0], [1, 2], ["a", "b"], [0.0, 1.0], [1.0, 2.0])
+    collection.add_task_data(0, 2, "c", 2.0, 3.0)
+
+    assert collection.instances == {"0": {"default": {"1": 0, "2": 1}}}
+    assert list(collection._task_data) == ["0"]
+
+
+def test_task_snapshots():
+    collection = DataCollection()
+    for task in range(10):
+        collection.add_task_data(0, task % 3, "a", float(task), task + 0.5)
+    data, names = collection.task_data("0")
+    assert len(data) == len(names) == 10
+    vertices, triangles, (x_range, y_range) = collection.task_mesh_data("0")
+    assert len(vertices) == 40 and len(triangles) == 20
+    assert x_range == (0.0, 9.5)
+    assert y_range[1] > 2
+
+    add_tasks(collection, [0, 1], [4, 0], ["b", "b"], [10.0, 10.0], [11.0, 11.0])
+    assert len(data) == 10
+    assert len(collection.task_data("0")[0]) == 11
+    assert len(collection.task_data("1")[0]) == 1
+    assert collection.task_mesh_data("0")[2][1][1] > 4
+
+
+def test_line_hashes_of_lines_without_samples():
+    collection = DataCollection()
+    instance = ("0", "default", "1")
+    hashes = [
+        collection.line_to_hash("/threads/count/cumulative", instance),
+        collection.line_to_hash("/threads/idle-rate", instance),
+        collection.line_to_hash("/threads/count/cumulative", ("0", "default", "2")),
+    ]
+    assert hashes == [0.0, 1.0, 2.0]
+    assert collection.line_to_hash("/threads/idle-rate", instance) == 1.0
+    assert collection.get_counter_names() == []
+
+
+def test_values_that_are_not_numbers_are_kept_as_text():
+    collection = DataCollection()
+    name, instance = "/threads/time/histogram", ("0", None, "total")
+    collection.define_counter(0, name, instance, None, "[s]", None)
+    collection.add_lines(
+        np.zeros(3, dtype=np.uint32),
+        np.array([1, 2, 3]),
+        np.array([0.1, 0.2, 0.3]),
+        np.array([np.nan, 2.0, np.nan]),
+    )
+    collection.add_texts(np.zeros(2, dtype=np.uint32), np.array([1, 3]), ["[1 2]", "[3 4]"])
+    collection.add_line(name, instance, None, 4, 0.4, "[s]", "[5 6]", None)
+    # Missing value of an imported csv file
+    collection.add_line(name, instance, None, 5, 0.5, "[s]", "", None)
+
+    texts = ["[1 2]", None, "[3 4]", "[5 6]", None]
+    assert collection.get_texts(name, instance).tolist() == texts
+    assert collection.get_texts(name, instance, 2).tolist() == texts[2:]
+    assert np.isnan(collection.get_data(name, instance).values[0])
+    values = collection.export_counter_data()["value"].tolist()
+    assert values[:4] == ["[1 2]", 2.0, "[3 4]", "[5 6]"] and np.isnan(values[4])
+
+
+def test_texts_of_the_compacted_samples_are_dropped():
+    series = Series()
+    series.extend(np.arange(40), np.arange(40, dtype=float), np.full(40, np.nan))
+    series.add_texts(np.arange(40), [f"[{sample}]" for sample in range(40)])
+    nbytes = series.nbytes
+    series.compact(32.0, bucket_size=16)
+
+    assert series.get_texts().tolist() == [None, None] + [f"[{s}]" for s in range(32, 40)]
+    assert sorted(series.texts) == list(range(32, 40))
+    assert series.nbytes < nbytes
+
+
+def test_samples_are_added_by_counter_id():
+    collection = DataCollection()
+    name = "/threads/idle-rate"
+    collection.define_counter(0, name, "locality#0/total", None, "[s]", "[0.01%]")
+    collection.define_counter(1, name, "locality#0/pool#default/worker-thread#1", None, "[s]", None)
+    collection.add_lines(
+        np.array([0, 1, 0, 1, 1], dtype=np.uint32),
+        np.arange(5),
+        np.arange(5) * 0.1,
+        np.arange(5) * 10.0,
+    )
+    collection.add_sample(0, 5, 0.5, 50.0)
+    # An agent which reconnects defines its counters again with other ids
+    collection.define_counter(7, name, "locality#0/total", None, "[s]", "[0.01%]")
+    collection.add_sample(7, 6, 0.6, 60.0)
+
+    total = collection.get_data(name, ("0", None, "total"))
+    assert total.sequence.tolist() == [0, 2, 5, 6]
+    assert total.values.tolist() == [0.0, 20.0, 50.0, 60.0]
+    worker = collection.get_data(name, ("0", "default", "1"))
+    assert worker.sequence.tolist() == [1, 3, 4]
+    assert collection.get_units(name, ("0", None, "total")) == ("[s]", "[0.01%]")
+    assert collection.instances == {"0": {None: {"total": 0}, "default": {"1": 1}}}
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Tests of the compressed storage of the columns of the counter series."""
+
+import numpy as np
+import pytest
+
+from hpx_dashboard.server.data.compression import (
+    SEQUENCE,
+    TIMESTAMPS,
+    VALUES,
+    CompressedArray,
+    decoded_chunks,
+    pack_words,
+    unpack_words,
+)
+
+rng = np.random.default_rng(0)
+int64 = np.iinfo(np.int64)
+
+# Columns with their codec
+columns = {
+    "regular timestamps": (TIMESTAMPS, np.arange(5000) * 0.01),
+    "jittered timestamps": (TIMESTAMPS, np.cumsum(rng.random(5000))),
+    "non-monotonic timestamps": (TIMESTAMPS, rng.normal(size=5000) * 1e6),
+    "special timestamps": (TIMESTAMPS, np.array([0.0, -0.0, np.nan, np.inf, -np.inf, 1e-300])),
+    "sequence": (SEQUENCE, np.arange(5000, dtype=np.int64)),
+    "extreme sequence": (SEQUENCE, np.array([0, -1, int64.max, int64.min, 5], dtype=np.int64)),
+    "constant values": (VALUES, np.full(5000, 42.5)),
+    "random values": (VALUES, rng.random(5000)),
+    "values with NaN": (VALUES, np.where(rng.random(5000) < 0.1, np.nan, rng.random(5000))),
+    "special values": (VALUES, np.array([np.nan, -0.0, 0.0, np.inf, -np.inf, 5e-324, np.nan])),
+}
+
+
+def assert_same_bits(actual, expected):
+    """Compares the arrays bit by bit, such that NaN and -0.0 are compared too."""
+    assert actual.dtype == expected.dtype
+    assert actual.tobytes() == expected.tobytes()
+
+
+def test_pack_words():
+    words = np.array(
+        [0, 1, 0xFF00, 0x00FF_FF00_0000_0000, np.iinfo(np.uint64).max], dtype=np.uint64
+    )
+    control, payload = pack_words(words)
+    assert len(payload) == 0 + 1 + 1 + 2 + 8
+    assert_same_bits(unpack_words(control, payload), words)
+
+
+@pytest.mark.parametrize("name", columns)
+def test_codec(name):
+    codec, column = columns[name]
+    column = column.astype(codec.dtype)
+    assert_same_bits(codec.decode(*codec.encode(column)), column)
+
+
+@pytest.mark.parametrize("name", columns)
+@pytest.mark.parametrize("chunk_size", [1, 7, 1024])
+def test_compressed_array(name, chunk_size):
+    codec, column = columns[name]
+    column = column.astype(codec.dtype)
+    array = CompressedArray(codec, chunk_size=chunk_size, capacity=4)
+    half = len(column) // 2
+    for row in column[:half]:
+        array.append(row)
+    array.extend(column[half:])
+    assert len(array) == len(column)
+    assert_same_bits(array.view(), column)
+
+    array.seal()
+    assert len(array) == len(column)
+    assert_same_bits(array.view(), column)
+    for begin, end in [(0, 1), (3, 4), (1, len(column) - 1), (len(column) - 2, None)]:
+        assert_same_bits(array.view(begin, end), column[begin:end])
+    assert not array.view(0, 2).flags.writeable
+
+
+def test_views_only_decode_the_overlapping_chunks():
+    column = rng.random(1000)
+    array = CompressedArray(VALUES, chunk_size=100)
+    array.extend(column)
+    assert array._sealed_size == 900
+    for chunk in array._chunks:
+        decoded_chunks.discard(chunk)
+
+    # Head only: no chunk decoded, no copy
+    view = array.view(920, 980)
+    assert np.shares_memory(view, array._head.view())
+    assert not any(chunk in decoded_chunks._arrays for chunk in array._chunks)
+
+    assert_same_bits(array.view(250, 950), column[250:950])
+    decoded = [chunk in decoded_chunks._arrays for chunk in array._chunks]
+    assert decoded == [False, False] + [True] * 7
+
+
+def test_constant_values_are_compressed():
+    array = CompressedArray(VALUES, chunk_size=1024)
+    array.extend(np.full(10240, 42.5))
+    array.seal()
+    assert array.nbytes < 10240 * 8 / 4
+
+
+def test_searchsorted():
+    column = np.sort(rng.random(3000)).round(2)
+    array = CompressedArray(TIMESTAMPS, chunk_size=100)
+    array.extend(column)
+    for value in [-1.0, 0.0, column[0], column[150], column[-1], 0.5, 2.0]:
+        for side in ("left", "right"):
+            assert array.searchsorted(value, side) == np.searchsorted(column, value, side)
+
+
+@pytest.mark.parametrize(
+    "begin, end, num_rows",
+    [(0, 0, 3), (10, 20, 0), (95, 105, 30), (150, 3000, 2), (2990, 3000, 5), (0, 3000, 1)],
+)
+def test_replace_range(begin, end, num_rows):
+    column = rng.random(3000)
+    array = CompressedArray(VALUES, chunk_size=100)
+    array.extend(column)
+    rows = np.full(num_rows, np.nan)
+    array.replace_range(begin, end, rows)
+    expected = np.concatenate((column[:begin], rows, column[end:]))
+    assert_same_bits(array.view(), expected)
+
+    array.extend(column[:250])
+    assert_same_bits(array.view(), np.concatenate((expected, column[:250])))
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Tests of the parsing of the HPX outputs by the agent."""
+
+import asyncio
+import time
+
+from hpx_dashboard.agent.hpx_parser import HPXParser
+from hpx_dashboard.common import protocol
+
+
+class RecordingBuffer:
+    """Records the calls of the parser to its buffer."""
+
+    def __init__(self):
+        self.definitions = []
+        self.counters = []
+        self.tasks = []
+
+    def add_counter_definition(self, counter_id, name):
+        self.definitions.append((counter_id, name))
+
+    def add_counter(self, counter_id, sequence_number, timestamp, value):
+        self.counters.append((counter_id, sequence_number, timestamp, value))
+
+    def add_task(self, locality, worker_id, name, start, end):
+        self.tasks.append((locality, worker_id, name, start, end))
+
+    async def drain(self):
+        pass
+
+
+def make_parser():
+    parser = HPXParser()
+    parser.buffer = RecordingBuffer()
+    return parser
+
+
+def test_counter_line():
+    parser = make_parser()
+    line = b"/threads{locality#0/worker-thread#1}/count/cumulative,3,0.030000,[s],844"
+    assert parser.parse_line(line)
+    assert parser.parse_line(line.replace(b",3,", b",4,"))
+
+    assert parser.buffer.definitions == [
+        (
+            0,
+            (
+                "threads/count/cumulative",
+                "locality#0/worker-thread#1",
+                None,
+                "[s]",
+                None,
+            ),
+        )
+    ]
+    assert parser.buffer.counters == [(0, 3, 0.03, 844.0), (0, 4, 0.03, 844.0)]
+
+
+def test_counters_are_defined_once():
+    parser = make_parser()
+    lines = [
+        b"/threads{locality#0/total}/idle-rate,1,0.01,[s],10,[0.01%]",
+        b"/threads{locality#1/total}/idle-rate,1,0.01,[s],20,[0.01%]",
+        b"/threads{locality#0/total}/idle-rate,2,0.02,[s],30,[0.01%]",
+        # Same counter with another unit
+        b"/threads{locality#0/total}/idle-rate,3,30,[ms],40,[0.01%]",
+        b'"/threads{locality#1/total}/idle-rate",2,0.02,[s],50,[0.01%]',
+    ]
+    for line in lines:
+        assert parser.parse_line(line)
+
+    definitions = dict(parser.buffer.definitions)
+    assert list(definitions) == [0, 1, 2, 3]
+    assert definitions[2] == ("threads/idle-rate", "locality#0/total", None, "[ms]", "[0.01%]")
+    # The quoted name is defined with the same name, the server stores it in the same series
+    assert definitions[3] == definitions[1]
+    assert [counter[0] for counter in parser.buffer.counters] == [0, 1, 0, 2, 3]
+
+
+def test_preamble_defines_all_the_counters_again():
+    parser = make_parser()
+    parser.start_time = 1.0
+    parser.parse_line(b"/threads{locality#0/total}/idle-rate,1,0.01,[s],10,[0.01%]")
+    parser.parse_line(b"/threads{locality#0/total}/count/cumulative,1,0.01,[s],10")
+
+    begin, definitions = parser.preamble()
+    assert protocol.decode_message(protocol.TRANSMISSION_BEGIN, begin[protocol.header.size :]) == (
+        1.0,
+        parser.run_id.hex(),
+    )
+    data = protocol.decode_message(protocol.DATA, definitions[protocol.header.size :])
+    assert data["counter_definitions"] == [
+        [counter_id, *name] for counter_id, name in parser.buffer.definitions
+    ]
+
+
+def test_malformed_counter_lines_are_skipped():
+    parser = make_parser()
+    for line in (
+        b"/threads{locality#0/total}/idle-rate,x,0.01,[s],10,[0.01%]",
+        b"/threads{locality#0/total}/idle-rate,1,not-a-time,[s],10,[0.01%]",
+    ):
+        assert not parser.parse_line(line)
+
+    # No definition is left behind by the malformed lines
+    assert parser.buffer.definitions == []
+    assert parser.buffer.counters == []
+
+    assert parser.parse_line(b"/threads{locality#0/total}/idle-rate,1,0.01,[s],10,[0.01%]")
+    assert [counter_id for counter_id, _ in parser.buffer.definitions] == [0]
+    assert parser.buffer.counters == [(0, 1, 0.01, 10.0)]
+
+
+def test_non_numeric_value_is_kept_as_text():
+    parser = make_parser()
+    assert parser.parse_line(b"/threads{locality#0/total}/histogram,1,0.01,[s],[1 2 3]")
+    assert parser.buffer.counters[0][3] == "[1 2 3]"
+
+
+def test_malformed_task_line_is_skipped():
+    parser = make_parser()
+    assert not parser.parse_line(b"task_data,0,x,name,0.1,0.2")
+    assert parser.parse_line(b"task_data,0,1,name,0.1,0.2")
+    assert parser.buffer.tasks == [(0, 1, "name", 0.1, 0.2)]
+
+
+def test_replay_paces_counters_and_tasks_on_their_own_clock():
+    parser = HPXParser(replay_speed=10.0)
+    parser.buffer = RecordingBuffer()
+    lines = []
+    for step in range(5):
+        lines.append(
+            f"/threads{{locality#0/total}}/count/cumulative,{step},{step * 100},[ms],1".encode()
+        )
+        # The task timers have another origin than the counters
+        lines.append(f"task_data,0,0,task,{5000 + step * 0.1 - 0.05},{5000 + step * 0.1}".encode())
+
+    begin = time.perf_counter()
+    asyncio.get_event_loop().run_until_complete(parser._replay_lines(lines))
+    # 0.4 s of data replayed 10 times faster
+    assert 0.03 < time.perf_counter() - begin < 1.0
+    assert len(parser.buffer.counters) == len(parser.buffer.tasks) == 5
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Tests of the launch of the HPX program by the agent."""
+
+import asyncio
+import os
+import sys
+
+from hpx_dashboard.agent.launcher import hpx_command, launch
+from hpx_dashboard.agent.readers import SpillingPipeReader, read_lines
+
+
+def test_counter_flags_are_added():
+    command = hpx_command(["./app", "--size=10"])
+    assert command == [
+        "./app",
+        "--size=10",
+        "--hpx:print-counter=/threads/*",
+        "--hpx:print-counter=/scheduler/*",
+        "--hpx:print-counter-interval=100",
+        "--hpx:list-counter-infos",
+    ]
+    command = hpx_command(["./app"], ["/threads/idle-rate"], interval=20)
+    assert command[1:3] == [
+        "--hpx:print-counter=/threads/idle-rate",
+        "--hpx:print-counter-interval=20",
+    ]
+
+
+def test_flags_of_the_user_are_kept():
+    user_command = [
+        "./app",
+        "--hpx:print-counter=/agas/count/route",
+        "--hpx:print-counter-interval=5",
+        "--hpx:list-counter-infos",
+    ]
+    assert hpx_command(user_command, ["/threads/*"]) == user_command
+
+
+def read_all(reader):
+    """Reads the reader until the end of the stream."""
+
+    async def run():
+        blocks = []
+        while True:
+            block = await reader.read(1 << 16)
+            if not block:
+                return b"".join(blocks)
+            blocks.append(block)
+
+    return asyncio.get_event_loop().run_until_complete(run())
+
+
+def test_output_is_spilled_while_the_agent_lags():
+    read_fd, write_fd = os.pipe()
+    reader = SpillingPipeReader(read_fd, block_size=1000, max_memory=5000)
+    output = b"".join(f"line {i}\n".encode() for i in range(10000))
+
+    async def run():
+        os.write(write_fd, output[:1000])
+        # The thread starts reading the pipe at the first read
+        first = await reader.read(1000)
+        # The writer never waits although nothing is consumed meanwhile
+        for begin in range(1000, len(output), 10000):
+            os.write(write_fd, output[begin : begin + 10000])
+        os.close(write_fd)
+        while not reader._eof:
+            await asyncio.sleep(0.01)
+        return first
+
+    first = asyncio.get_event_loop().run_until_complete(run())
+    assert first == output[: len(first)]
+    assert reader._memory_bytes <= reader.max_memory
+    assert reader.num_spilled_bytes >= len(output) - len(first) - reader.max_memory
+    assert first + read_all(reader) == output
+    assert reader.num_bytes == len(output)
+    os.close(read_fd)
+
+
+def test_launched_program_is_read_to_the_end():
+    code = "import sys\nfor i in range(100000): sys.stdout.write(f'line {i}\\n')"
+    process, reader = launch([sys.executable, "-c", code], pipe_size=1 << 16, max_memory=1 << 16)
+    assert isinstance(reader, SpillingPipeReader)
+
+    async def run():
+        queue = asyncio.Queue(maxsize=1)
+        task = asyncio.ensure_future(read_lines(reader, queue))
+        # The program finishes before the agent reads most of its output
+        await asyncio.get_event_loop().run_in_executor(None, process.wait)
+        lines = []
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            lines += item
+        await task
+        return lines
+
+    lines = asyncio.get_event_loop().run_until_complete(run())
+    assert process.returncode == 0
+    assert lines == [f"line {i}".encode() for i in range(100000)]
+    assert reader.num_spilled_bytes > 0
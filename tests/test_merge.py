@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Tests of the merge of several output streams in the agent."""
+
+import asyncio
+import random
+
+from hpx_dashboard.agent.hpx_parser import HPXParser
+from hpx_dashboard.agent.merge import merge_lines
+from hpx_dashboard.agent.readers import FileReader, read_lines
+
+
+def write_stream(path, locality, num_lines, rng):
+    timestamp = 0.0
+    with open(path, "wb") as file:
+        for sequence_number in range(num_lines):
+            timestamp += rng.random()
+            file.write(
+                f"/threads{{locality#{locality}/total}}/count/cumulative,{sequence_number},"
+                f"{timestamp:.6f},[s],{sequence_number}\n".encode()
+            )
+
+
+def merge_files(paths, block_size=4096, queue_size=4):
+    async def run():
+        files = [open(path, "rb") for path in paths]
+        queues = [asyncio.Queue(maxsize=queue_size) for _ in files]
+        queue = asyncio.Queue()
+        readers = [
+            asyncio.ensure_future(read_lines(FileReader(file), stream_queue, block_size))
+            for file, stream_queue in zip(files, queues)
+        ]
+        await merge_lines(queues, queue)
+        await asyncio.gather(*readers)
+        for file in files:
+            file.close()
+
+        lines = []
+        while True:
+            merged = queue.get_nowait()
+            if merged is None:
+                return lines
+            lines += merged
+
+    return asyncio.get_event_loop().run_until_complete(run())
+
+
+def test_static_streams_are_merged_by_timestamp(tmp_path):
+    rng = random.Random(0)
+    paths = [tmp_path / f"locality{locality}.txt" for locality in range(3)]
+    for locality, path in enumerate(paths):
+        write_stream(path, locality, 3000, rng)
+
+    lines = merge_files(paths)
+    assert len(lines) == 9000
+    timestamps = [HPXParser._line_timestamp(line)[1] for line in lines]
+    assert timestamps == sorted(timestamps)
+
+
+def test_tasks_are_merged_next_to_the_counters_of_their_stream(tmp_path):
+    counter = "/threads{{locality#{}/total}}/count/cumulative,0,{},[s],0"
+    # The task timers have another origin than the counters
+    task = "task_data,0,0,task,{},{}"
+    streams = [
+        [counter.format(0, 1.0), task.format(999.5, 1000.0), counter.format(0, 2.0)]
+        + [task.format(1000.5, 1001.0), counter.format(0, 3.0), task.format(1001.5, 1002.0)],
+        [counter.format(1, 1.5), counter.format(1, 2.5)],
+        [task.format(1000.0, 1000.25), task.format(1001.0, 1001.25)],
+    ]
+    paths = [tmp_path / f"locality{locality}.txt" for locality in range(len(streams))]
+    for path, lines in zip(paths, streams):
+        path.write_text("\n".join(lines) + "\n")
+
+    first, second, third = ([line.encode() for line in lines] for lines in streams)
+    assert merge_files(paths) == [
+        third[0],
+        third[1],
+        first[0],
+        first[1],
+        second[0],
+        first[2],
+        first[3],
+        second[1],
+        first[4],
+        first[5],
+    ]
+
+
+def test_lagging_stream_does_not_stall_the_others():
+    async def run():
+        queues = [asyncio.Queue(), asyncio.Queue()]
+        queue = asyncio.Queue()
+        merge = asyncio.ensure_future(merge_lines(queues, queue, lag_timeout=0.05))
+        await queues[0].put([b"/threads{locality#0/total}/count/cumulative,0,1.0,[s],0"])
+        merged = await asyncio.wait_for(queue.get(), 1)
+
+        await queues[1].put(None)
+        await queues[0].put(None)
+        await merge
+        return merged
+
+    merged = asyncio.get_event_loop().run_until_complete(run())
+    assert merged == [b"/threads{locality#0/total}/count/cumulative,0,1.0,[s],0"]
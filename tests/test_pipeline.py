@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Tests of the asyncio pipeline of the agent: readers, parser, batcher and TCP client."""
+
+import asyncio
+import os
+import time
+
+from hpx_dashboard.agent import cli, tcp_client
+from hpx_dashboard.agent.hpx_parser import HPXParser
+from hpx_dashboard.agent.readers import PipeReader, open_reader, read_lines
+from hpx_dashboard.common import protocol
+
+
+def test_lines_are_read_by_blocks_with_backpressure():
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, b"first\nsecond line\nthird\nunterminated")
+    os.close(write_fd)
+
+    async def run():
+        reader = open_reader(os.fdopen(read_fd, "rb"))
+        queue = asyncio.Queue(maxsize=1)
+        task = asyncio.ensure_future(read_lines(reader, queue, block_size=7))
+        await asyncio.sleep(0.05)
+        # The reader waits for the parser once the queue is full
+        waiting = not task.done() and queue.full()
+        items = []
+        while not items or items[-1] is not None:
+            items.append(await queue.get())
+        await task
+        return reader, waiting, items
+
+    reader, waiting, items = asyncio.get_event_loop().run_until_complete(run())
+    assert isinstance(reader, PipeReader)
+    assert waiting
+    lines = [line for item in items[:-1] for line in item]
+    assert lines == [b"first", b"second line", b"third", b"unterminated"]
+
+
+def test_connect_does_not_block_the_loop():
+    async def run():
+        server = await asyncio.start_server(lambda reader, writer: None, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        server.close()
+        await server.wait_closed()
+
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.ensure_future(tick())
+        begin = time.time()
+        writer = await tcp_client.connect("127.0.0.1", port, timeout=0.2)
+        ticker.cancel()
+        return writer, time.time() - begin, ticks
+
+    writer, duration, ticks = asyncio.get_event_loop().run_until_complete(run())
+    assert writer is None
+    assert duration >= 0.2 and ticks >= 5
+
+
+async def receive_frames(reader, frames):
+    """Decodes the frames received by the server until the connection is closed."""
+    while True:
+        try:
+            header = await reader.readexactly(protocol.header.size)
+        except asyncio.IncompleteReadError:
+            return
+        message_type, _, length = protocol.decode_header(header)
+        payload = await reader.readexactly(length)
+        frames.append((message_type, protocol.decode_message(message_type, payload)))
+
+
+def test_pipeline_sends_the_output_to_the_server():
+    read_fd, write_fd = os.pipe()
+    lines = [b"hello"]
+    for step in range(100):
+        lines.append(f"/threads{{locality#0/total}}/count/cumulative,{step},{step},[s],1".encode())
+        lines.append(f"task_data,0,0,task,{step},{step + 0.5}".encode())
+    os.write(write_fd, b"\n".join(lines) + b"\n")
+    os.close(write_fd)
+
+    async def run():
+        frames = []
+        server = await asyncio.start_server(
+            lambda reader, writer: receive_frames(reader, frames), "127.0.0.1", 0
+        )
+        port = server.sockets[0].getsockname()[1]
+        opt = cli.args_parse(["--port", str(port), "--queue-size", "2"])
+        parser = HPXParser(strip_hpx_counters=True, send_stdout=True, buffer_max_records=10)
+        success = await cli._run_pipeline([open_reader(os.fdopen(read_fd, "rb"))], parser, opt)
+        await asyncio.sleep(0.05)
+        server.close()
+        await server.wait_closed()
+        return success, frames
+
+    success, frames = asyncio.get_event_loop().run_until_complete(run())
+    assert success
+    message_types = [message_type for message_type, _ in frames]
+    assert message_types[0] == protocol.TRANSMISSION_BEGIN
+    assert message_types[-1] == protocol.TRANSMISSION_END
+    data = [data for message_type, data in frames if message_type == protocol.DATA]
+    sequence = [n for batch in data for n in batch.get("counter_sequence", [])]
+    assert sequence == list(range(100))
+    assert sum(len(batch.get("task_start", [])) for batch in data) == 100
+    assert [line for batch in data for line in batch.get("lines", [])] == ["hello"]
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Tests of the binary protocol between the agent and the server."""
+
+from array import array
+import math
+
+import numpy as np
+import pytest
+
+from hpx_dashboard.common import protocol
+
+
+def decode_frame(frame):
+    """Returns the message type, the flags and the decoded payload of a frame."""
+    message_type, flags, length = protocol.decode_header(frame[: protocol.header.size])
+    payload = frame[protocol.header.size :]
+    assert length == len(payload)
+    return message_type, flags, protocol.decode_message(message_type, payload)
+
+
+def test_begin():
+    run_id = bytes(range(16))
+    message_type, flags, data = decode_frame(protocol.encode_begin(12.5, run_id))
+    assert message_type == protocol.TRANSMISSION_BEGIN
+    assert flags & protocol.FLAG_PRIORITY
+    assert data == (12.5, run_id.hex())
+
+
+def test_end():
+    frame = protocol.encode_end(42.25)
+    message_type, flags, data = decode_frame(frame)
+    assert message_type == protocol.TRANSMISSION_END
+    assert not protocol.is_priority(frame)
+    assert data == 42.25
+
+
+def test_counter_infos():
+    infos = {"/threads/count/cumulative": {"helptext": "returns: the count", "type": "raw"}}
+    frame = protocol.encode_counter_infos(infos)
+    assert protocol.is_priority(frame)
+    assert decode_frame(frame) == (protocol.COUNTER_INFOS, protocol.FLAG_PRIORITY, infos)
+
+
+def test_data():
+    batch = protocol.Batch()
+    name = ("/threads/count/cumulative", "locality#0/total", None, "[s]", None)
+    batch.add_counter_definition(3, name)
+    batch.add_counter(3, 1, 0.5, 2.0)
+    batch.add_counter(3, 2, 1.0, protocol.parse_value("1,2,3"))
+    batch.add_aggregate(3, 7, 1.5, 1.0, 4.0, 2.5, 3.0, 4)
+    batch.add_task(0, 2, "task_a", 0.25, 0.5)
+    batch.add_task(1, -1, "task_b", 0.5, 0.75)
+    batch.add_task(0, 3, "task_a", 0.75, 1.0)
+    batch.add_line("hello")
+    assert len(batch) == 8
+
+    frame = batch.encode(priority=True)
+    message_type, flags, data = decode_frame(frame)
+    assert message_type == protocol.DATA
+    assert protocol.is_priority(frame)
+
+    assert data["counter_definitions"] == [[3, *name]]
+    assert data["counter_id"].tolist() == [3, 3]
+    assert data["counter_sequence"].tolist() == [1, 2]
+    assert data["counter_timestamp"].tolist() == [0.5, 1.0]
+    assert data["counter_value"][0] == 2.0 and math.isnan(data["counter_value"][1])
+    assert data["counter_text"] == [[1, "1,2,3"]]
+    aggregate = ("id", "sequence", "timestamp", "min", "max", "mean", "last", "count")
+    expected = [3, 7, 1.5, 1.0, 4.0, 2.5, 3.0, 4]
+    assert [data[f"aggregate_{column}"].tolist() for column in aggregate] == [[x] for x in expected]
+    assert data["task_names"] == ["task_a", "task_b"]
+    assert data["task_locality"].tolist() == [0, 1, 0]
+    assert data["task_worker"].tolist() == [2, -1, 3]
+    assert data["task_name"].tolist() == [0, 1, 0]
+    assert data["task_start"].tolist() == [0.25, 0.5, 0.75]
+    assert data["task_end"].tolist() == [0.5, 0.75, 1.0]
+    assert data["lines"] == ["hello"]
+    for column in data.values():
+        if isinstance(column, np.ndarray):
+            assert column.dtype.byteorder != ">"
+
+
+def test_parse_value():
+    assert protocol.parse_value(b"844") == 844.0
+    assert protocol.parse_value(b"[1 2 3]") == "[1 2 3]"
+    assert protocol.parse_value("1,2,3") == "1,2,3"
+    assert math.isnan(protocol.parse_value(b""))
+
+
+def test_empty_data():
+    frame = protocol.Batch().encode()
+    assert not protocol.is_priority(frame)
+    assert decode_frame(frame) == (protocol.DATA, 0, {})
+
+
+def test_byteswapped_columns(monkeypatch):
+    """The columns of a big-endian agent are byteswapped to little-endian."""
+    values = [1.5, -2.25, math.inf]
+    column = array("d", values)
+    # Memory layout of the column on a big-endian machine
+    column.byteswap()
+    monkeypatch.setattr(protocol.sys, "byteorder", "big")
+    block = protocol._encode_block(protocol.COUNTER_VALUE, column)
+    monkeypatch.undo()
+
+    assert protocol.decode_blocks(block)["counter_value"].tolist() == values
+    # The column itself is left as it is
+    column.byteswap()
+    assert column.tolist() == values
+
+
+def test_unknown_blocks_are_skipped():
+    block = protocol.block_header.pack(200, b"d", 8) + bytes(8)
+    payload = block + protocol._encode_block(protocol.LINES, ["line"])
+    assert protocol.decode_blocks(payload) == {"lines": ["line"]}
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        protocol.header.pack(b"HPXX", protocol.PROTOCOL_VERSION, protocol.DATA, 0, 0),
+        protocol.header.pack(protocol.MAGIC, protocol.PROTOCOL_VERSION + 1, protocol.DATA, 0, 0),
+    ],
+)
+def test_invalid_header(header):
+    with pytest.raises(protocol.ProtocolError):
+        protocol.decode_header(header)
+
+
+def test_truncated_payload():
+    block = protocol._encode_block(protocol.COUNTER_TIMESTAMP, array("d", [1.0, 2.0]))
+    with pytest.raises(protocol.ProtocolError):
+        protocol.decode_blocks(block[:-1])
+    with pytest.raises(protocol.ProtocolError):
+        protocol.decode_blocks(block[:3])
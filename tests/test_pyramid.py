@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Tests of the level-of-detail pyramid of the counter series."""
+
+import numpy as np
+import pytest
+
+from hpx_dashboard.server.data.pyramid import Pyramid
+from hpx_dashboard.server.data.series import Series
+
+rng = np.random.default_rng(0)
+
+
+def make_series(num_samples):
+    series = Series()
+    values = np.where(rng.random(num_samples) < 0.05, np.nan, rng.random(num_samples))
+    series.extend(np.arange(num_samples), np.arange(num_samples) * 0.01, values)
+    return series, values
+
+
+@pytest.mark.parametrize("begin, end", [(0, 10000), (0, 5000), (1234, 9876), (10, 50)])
+@pytest.mark.parametrize("width", [100, 800])
+def test_summary(begin, end, width):
+    series, values = make_series(10000)
+    summary = series.summary(width, begin * 0.01, (end - 1) * 0.01)
+    assert len(summary.begin) <= width + 2
+    # The whole buckets covering the range are returned
+    first, last = np.round(np.array([summary.begin[0], summary.end[-1]]) / 0.01).astype(int)
+    assert first <= begin and last >= end - 1
+    covered = values[first : last + 1]
+    assert summary.counts.sum() == np.count_nonzero(~np.isnan(covered))
+    assert np.nanmin(summary.minimums) == np.nanmin(covered)
+    assert np.nanmax(summary.maximums) == np.nanmax(covered)
+    assert np.nansum(summary.means * summary.counts) == pytest.approx(np.nansum(covered))
+
+
+def test_summary_of_few_samples_returns_the_samples():
+    series, values = make_series(10000)
+    summary = series.summary(800, 0.5, 1.0)
+    assert summary.begin.tolist() == summary.end.tolist() == (np.arange(50, 101) * 0.01).tolist()
+    np.testing.assert_array_equal(summary.means, values[50:101])
+
+
+def test_pyramid_is_updated_after_a_compaction():
+    series, _ = make_series(10000)
+    # The second compaction keeps the buckets of the samples compacted by the first one
+    for end_time in (40.0, 80.0):
+        assert series.compact(end_time, bucket_size=16)
+        expected = Pyramid(series.pyramid.base)
+        expected.update(series.timestamps, series.values)
+        assert len(series.pyramid.levels) >= len(expected.levels)
+        for level, expected_level in zip(series.pyramid.levels, expected.levels):
+            np.testing.assert_array_equal(level.view(), expected_level.view())
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Tests of the readers of the output of the HPX program."""
+
+import asyncio
+import json
+import os
+
+from hpx_dashboard.agent.readers import Checkpoint, FollowReader, read_lines
+
+
+def follow(reader, changes=()):
+    """Reads the followed file until its idle timeout and returns the items put in the queue,
+    each change of the file is applied once the previous data has been read."""
+
+    async def run():
+        queue = asyncio.Queue()
+        task = asyncio.ensure_future(read_lines(reader, queue))
+        items = []
+        for change in list(changes) + [None]:
+            while True:
+                item = await queue.get()
+                items.append(item)
+                if item is None or isinstance(item, Checkpoint):
+                    break
+            if change is None:
+                break
+            change()
+        while items[-1] is not None:
+            items.append(await queue.get())
+        await task
+        return items
+
+    return asyncio.get_event_loop().run_until_complete(run())
+
+
+def lines_of(items):
+    return [line for item in items if isinstance(item, list) for line in item]
+
+
+def make_reader(path, offset_file=None):
+    return FollowReader(
+        str(path), offset_file, min_poll=0.01, max_poll=0.01, idle_timeout=0.2, save_interval=0
+    )
+
+
+def test_unfinished_line_is_ended_on_rotation(tmp_path):
+    path = tmp_path / "out.txt"
+    path.write_bytes(b"first\nsecond")
+
+    def rotate():
+        os.rename(path, tmp_path / "out.txt.1")
+        path.write_bytes(b"third\n")
+
+    reader = make_reader(path, str(tmp_path / "offset.json"))
+    assert lines_of(follow(reader, [rotate])) == [b"first", b"second", b"third"]
+    assert reader.num_rotations == 1
+
+
+def test_unfinished_line_is_ended_on_truncation(tmp_path):
+    path = tmp_path / "out.txt"
+    path.write_bytes(b"first\nsecond")
+
+    def truncate():
+        path.write_bytes(b"x\n")
+
+    reader = make_reader(path, str(tmp_path / "offset.json"))
+    assert lines_of(follow(reader, [truncate])) == [b"first", b"second", b"x"]
+    assert reader.num_truncations == 1
+
+
+def test_offset_is_saved_once_the_lines_are_sent(tmp_path):
+    path = tmp_path / "out.txt"
+    path.write_bytes(b"first\nsecond\n")
+    offset_file = tmp_path / "offset.json"
+
+    items = follow(make_reader(path, str(offset_file)))
+    assert lines_of(items) == [b"first", b"second"]
+    assert not offset_file.exists()
+
+    checkpoint = items[-2]
+    assert isinstance(checkpoint, Checkpoint)
+    checkpoint.pending = 2
+    checkpoint.reached()
+    assert not offset_file.exists()
+    checkpoint.reached()
+    assert json.loads(offset_file.read_text())["offset"] == len(b"first\nsecond\n")
+
+    # The reading resumes from the committed offset
+    with open(path, "ab") as f:
+        f.write(b"third\n")
+    assert lines_of(follow(make_reader(path, str(offset_file)))) == [b"third"]
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Tests of the compaction of the old counter samples."""
+
+import itertools
+import types
+
+import numpy as np
+import pytest
+
+from hpx_dashboard.server.data import retention
+from hpx_dashboard.server.data.collection import DataCollection
+from hpx_dashboard.server.data.retention import Compactor, RetentionPolicy
+from hpx_dashboard.server.data.series import Series
+
+rng = np.random.default_rng(0)
+
+
+def make_series(num_samples):
+    """Returns a series with one sample per second and its values."""
+    series = Series()
+    values = rng.random(num_samples)
+    series.extend(np.arange(num_samples), np.arange(num_samples, dtype=float), values)
+    return series, values
+
+
+@pytest.mark.parametrize(
+    "end_time, num_buckets",
+    # The sample at `end_time` is kept raw, as the incomplete buckets
+    [(15.0, 0), (16.0, 1), (31.0, 1), (32.0, 2), (35.5, 2)],
+)
+def test_compaction_boundaries(end_time, num_buckets):
+    series, values = make_series(100)
+    assert series.compact(end_time, bucket_size=16) == num_buckets * 15
+    assert series.num_compacted == num_buckets
+    assert len(series) == 100 - num_buckets * 15
+
+    data = series.get()
+    compacted = np.arange(num_buckets * 16)
+    np.testing.assert_array_equal(data.timestamps[:num_buckets], compacted[15::16])
+    np.testing.assert_array_equal(data.sequence[:num_buckets], compacted[15::16])
+    buckets = values[: num_buckets * 16].reshape(-1, 16)
+    np.testing.assert_allclose(data.values[:num_buckets], buckets.mean(axis=1))
+    rows = series.get_envelope()
+    assert len(rows) == num_buckets
+    if num_buckets:
+        np.testing.assert_array_equal(rows[:, 1], buckets.min(axis=1))
+        np.testing.assert_array_equal(rows[:, 2], buckets.max(axis=1))
+        np.testing.assert_array_equal(rows[:, 3], buckets[:, -1])
+        np.testing.assert_array_equal(rows[:, 4], 16)
+    np.testing.assert_array_equal(data.values[num_buckets:], values[num_buckets * 16 :])
+
+
+def test_compaction_waits_for_min_samples():
+    series, _ = make_series(100)
+    assert series.compact(50.0, bucket_size=16, min_samples=64) == 0
+    assert len(series) == 100 and series.generation == 0
+
+    # The next compaction starts after the compacted samples
+    assert series.compact(32.0, bucket_size=16)
+    assert series.compact(64.0, bucket_size=16, min_samples=32)
+    assert series.num_compacted == 4
+    np.testing.assert_array_equal(series.get().timestamps[:5], [15, 31, 47, 63, 64])
+
+
+def test_coarsening_merges_the_buckets():
+    series, values = make_series(100)
+    series.compact(64.0, bucket_size=16)
+    assert series.coarsen() == 2
+    assert series.num_compacted == 2
+    rows = series.get_envelope()
+    np.testing.assert_array_equal(rows[:, 4], 32)
+    np.testing.assert_array_equal(rows[:, 2], values[:64].reshape(-1, 32).max(axis=1))
+    np.testing.assert_allclose(series.get().values[:2], values[:64].reshape(-1, 32).mean(axis=1))
+
+
+def make_collection(num_series=2, num_samples=100):
+    collection = DataCollection()
+    collection.retention = RetentionPolicy(raw_duration=30, bucket_size=10, min_samples=1)
+    for counter_id in range(num_series):
+        collection.define_counter(
+            counter_id,
+            "/threads/count/cumulative",
+            f"locality#{counter_id}/total",
+            None,
+            "[s]",
+            None,
+        )
+        for sample in range(num_samples):
+            collection.add_sample(counter_id, sample, float(sample), rng.random())
+    return collection
+
+
+def test_policy_keeps_the_recent_samples_raw():
+    collection = make_collection()
+    for _ in collection.retention.apply(collection):
+        pass
+    for series in collection.iter_series():
+        # The samples older than 99 - 30 s are compacted by whole buckets
+        assert series.num_compacted == 6
+        np.testing.assert_array_equal(series.get(6).timestamps, np.arange(60, 100))
+
+
+def test_policy_fits_the_collection_in_its_budget():
+    collection = make_collection(num_samples=4096)
+    collection.retention = RetentionPolicy(max_bytes=collection.nbytes // 2, bucket_size=16)
+    for _ in collection.retention.apply(collection):
+        pass
+    assert collection.nbytes <= collection.retention.max_bytes
+
+
+@pytest.fixture
+def compactor(monkeypatch):
+    """Returns a compactor running 3 steps per iteration and the collections it compacts."""
+    collections = [make_collection() for _ in range(3)]
+    aggregator = types.SimpleNamespace(get_all_runs=lambda: collections)
+    monkeypatch.setattr(retention, "DataAggregator", lambda: aggregator)
+    # Each call of the clock advances it by one second
+    clock = itertools.count()
+    monkeypatch.setattr(retention, "time", types.SimpleNamespace(perf_counter=lambda: next(clock)))
+    return Compactor(time_budget=3.5), collections
+
+
+def num_compacted(collections):
+    return [[bool(series.num_compacted) for series in c.iter_series()] for c in collections]
+
+
+def test_compactor_resumes_where_its_time_budget_ran_out(compactor):
+    compactor, collections = compactor
+    compactor._process()
+    assert num_compacted(collections) == [[True, True], [True, False], [False, False]]
+    compactor._process()
+    assert num_compacted(collections) == [[True, True], [True, True], [True, True]]
+    compactor._process()
+    assert compactor._current is None
+
+
+def test_compactor_leaves_the_collections_being_saved(compactor):
+    compactor, collections = compactor
+    collections[0].saving = True
+    compactor._process()
+    assert num_compacted(collections) == [[False, False], [True, True], [True, False]]
+    collections[2].saving = True
+    compactor._process()
+    assert num_compacted(collections) == [[False, False], [True, True], [True, False]]
+    assert compactor._current is None
+
+
+def test_compaction_of_a_sealed_series():
+    series, values = make_series(10000)
+    sealed, _ = make_series(0)
+    sealed.extend(np.arange(10000), np.arange(10000, dtype=float), values)
+    sealed.seal()
+
+    for end_time in (2000.0, 6000.0):
+        assert sealed.compact(end_time) == series.compact(end_time)
+        # The compacted series is sealed again, with the pyramid of the new samples
+        assert sealed.sealed
+        assert sealed.timestamps._sealed_size == len(sealed)
+        for actual, expected in zip(sealed.get(), series.get()):
+            np.testing.assert_array_equal(actual, expected)
+        for width in (100, 800):
+            for actual, expected in zip(sealed.summary(width), series.summary(width)):
+                np.testing.assert_allclose(actual, expected)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Tests of the sampling of the tasks in the agent."""
+
+import asyncio
+import collections
+
+import pytest
+
+from hpx_dashboard.agent.batcher import Batcher
+from hpx_dashboard.agent.readers import Checkpoint
+from hpx_dashboard.agent.sampling import TaskSampler
+from hpx_dashboard.common import protocol
+from hpx_dashboard.server.data.collection import DataCollection
+
+
+def tasks(num_tasks, locality=0):
+    """Returns tasks of 2 names on 4 workers, the task `i` lasts `i` ms."""
+    return [(locality, i % 4, f"task_{i % 2}", 1.0, 1.0 + 0.001 * i) for i in range(num_tasks)]
+
+
+def test_all_the_tasks_are_sent_within_the_budget():
+    sampler = TaskSampler(budget=1000, interval=0.1)
+    assert sampler.capacity == 100
+    for task in tasks(100):
+        sampler.add(*task)
+    sampled, summaries = sampler.flush()
+    assert sampled == tasks(100)
+    assert summaries[0]["seen"] == summaries[0]["sent"] == 100
+
+
+def test_summaries_are_exact_above_the_budget():
+    sampler = TaskSampler(budget=100, interval=0.1, seed=0)
+    for task in tasks(1000):
+        sampler.add(*task)
+    sampled, summaries = sampler.flush()
+    assert len(sampled) == sampler.capacity == 10
+    assert set(sampled) <= set(tasks(1000))
+
+    summary = summaries[0]
+    assert (summary["seen"], summary["sent"]) == (1000, 10)
+    count, total, shortest, longest = summary["names"]["task_1"]
+    assert count == 500
+    assert total == pytest.approx(0.001 * sum(range(1, 1000, 2)))
+    assert shortest == pytest.approx(0.001) and longest == pytest.approx(0.999)
+    assert [summary["workers"][worker][0] for worker in range(4)] == [250] * 4
+
+
+def test_tasks_are_sampled_uniformly():
+    sampler = TaskSampler(budget=100, interval=0.1, seed=0)
+    kept = collections.Counter()
+    for _ in range(2000):
+        for task in tasks(100):
+            sampler.add(*task)
+        sampled, _ = sampler.flush()
+        kept.update(end for *_, end in sampled)
+    # Each task has a probability of 10% to be kept in each interval
+    assert len(kept) == 100
+    assert all(120 < count < 280 for count in kept.values())
+
+
+def test_only_the_changed_summaries_are_sent():
+    sampler = TaskSampler(budget=100, interval=0.1)
+    for task in tasks(8) + tasks(2, locality=1):
+        sampler.add(*task)
+    sampler.flush()
+
+    sampler.add(0, 5, "task_2", 2.0, 2.5)
+    _, summaries = sampler.flush()
+    assert list(summaries) == [0]
+    assert summaries[0]["names"] == {"task_2": [1, 0.5, 0.5, 0.5]}
+    assert summaries[0]["workers"] == {5: [1, 0.5, 0.5, 0.5]}
+    assert (summaries[0]["seen"], summaries[0]["sent"]) == (9, 9)
+
+
+def test_batcher_sends_the_sampled_tasks_and_the_summaries():
+    class RecordingReader:
+        def __init__(self):
+            self.commits = []
+
+        def commit(self, checkpoint):
+            self.commits.append(checkpoint.offset)
+
+    async def run():
+        queue = asyncio.Queue()
+        sampler = TaskSampler(budget=0.01, interval=1000, seed=0)
+        batcher = Batcher(queue, timeout=1000, task_sampler=sampler)
+        reader = RecordingReader()
+        for task in tasks(1000):
+            batcher.add_task(*task)
+        batcher.add_checkpoint(Checkpoint(reader, None, 10))
+        # Nothing is sent before the end of the sampling interval
+        batcher._flush("timeout")
+        await batcher.drain()
+        num_frames = queue.qsize()
+
+        await batcher.close()
+        frames = []
+        while not queue.empty():
+            frames.append(queue.get_nowait())
+        for frame in frames:
+            if hasattr(frame, "checkpoint"):
+                frame.checkpoint.reached()
+        return num_frames, frames, reader
+
+    num_frames, frames, reader = asyncio.get_event_loop().run_until_complete(run())
+    assert num_frames == 0
+    assert reader.commits == [10]
+
+    collection = DataCollection()
+    num_tasks = 0
+    for frame in frames:
+        if not isinstance(frame, bytes):
+            continue
+        message_type, _, _ = protocol.decode_header(frame[: protocol.header.size])
+        data = protocol.decode_message(message_type, frame[protocol.header.size :])
+        num_tasks += len(data.get("task_start", []))
+        collection.update_task_summaries(data.get("task_summaries", {}))
+    assert num_tasks == 10
+    assert collection.get_task_sampling_ratio("0") == pytest.approx(0.01)
+    assert collection.get_task_summaries("0")["count"].to_dict() == {"task_0": 500, "task_1": 500}
+    assert collection.get_task_summaries("0", by="workers")["count"].sum() == 1000
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Tests of the columnar storage of the counter samples."""
+
+import numpy as np
+import pytest
+
+from hpx_dashboard.server.data.collection import DataCollection
+from hpx_dashboard.server.data.series import Series, SeriesData, empty_series_data
+
+name = "/threads/count/cumulative"
+instance = ("0", "default", "1")
+
+
+def make_collection(num_samples):
+    """Returns a collection with one sample every 0.1 s of a counter instance."""
+    collection = DataCollection()
+    for sample in range(num_samples):
+        collection.add_line(
+            name,
+            "locality#0/pool#default/worker-thread#1",
+            None,
+            sample,
+            0.1 * sample,
+            "[s]",
+            str(sample * 3),
+            None,
+        )
+    return collection
+
+
+def test_samples_are_stored_by_column():
+    series = Series("[s]", "[0.01%]")
+    series.append(0, 0.0, 1.5)
+    series.extend([1, 2], [0.1, 0.2], [2.5, 3.5])
+
+    data = series.get()
+    assert isinstance(data, SeriesData)
+    assert data.sequence.dtype == np.int64
+    assert data.timestamps.dtype == data.values.dtype == np.float64
+    assert data.sequence.tolist() == [0, 1, 2]
+    assert data.timestamps.tolist() == [0.0, 0.1, 0.2]
+    assert data.values.tolist() == [1.5, 2.5, 3.5]
+    assert (series.timestamp_unit, series.value_unit) == ("[s]", "[0.01%]")
+
+
+def test_units_are_stored_once_per_series():
+    collection = make_collection(10)
+    assert collection.get_units(name, instance) == ("[s]", None)
+    (series,) = collection.iter_series()
+    assert len(series) == 10
+    assert collection.get_units(name, ("0", "default", "2")) == (None, None)
+
+
+def test_data_from_an_index():
+    collection = make_collection(10)
+    data = collection.get_data(name, instance, 7)
+    assert data.sequence.tolist() == [7, 8, 9]
+    np.testing.assert_allclose(data.timestamps, [0.7, 0.8, 0.9])
+    assert data.values.tolist() == [21.0, 24.0, 27.0]
+    assert all(len(column) == 0 for column in collection.get_data(name, instance, 10))
+
+
+def test_data_are_read_only_views():
+    collection = make_collection(10)
+    data = collection.get_data(name, instance)
+    for column in data:
+        assert not column.flags.writeable
+        with pytest.raises(ValueError):
+            column[0] = 0
+
+    # The views taken before are not modified by the new samples
+    collection.add_line(name, instance, None, 10, 1.0, "[s]", "30", None)
+    assert len(data.values) == 10 and len(collection.get_data(name, instance).values) == 11
+
+
+def test_unknown_counters_have_empty_data():
+    collection = make_collection(1)
+    assert collection.get_data("/threads/idle-rate", instance) is empty_series_data
+    assert collection.get_data(name, ("1", None, "total")) is empty_series_data
+    assert [column.dtype for column in empty_series_data] == [np.int64, np.float64, np.float64]
+    assert all(len(column) == 0 for column in empty_series_data)
+
+
+def test_memory_per_sample():
+    collection = make_collection(100000)
+    # A raw sample takes 24 bytes, the older samples are compressed
+    assert collection.nbytes / 100000 < 24
+
+
+@pytest.fixture(params=[False, True], ids=["raw", "sealed"])
+def series(request):
+    """Returns a series with one sample per second, sealed or not."""
+    series = Series()
+    series.extend(np.arange(5000), np.arange(5000, dtype=float), np.arange(5000) * 2.0)
+    if request.param:
+        series.seal()
+    return series
+
+
+@pytest.mark.parametrize(
+    "begin_time, end_time",
+    [
+        (None, None),
+        (100.0, 200.0),
+        (99.5, 200.5),
+        (1023.0, 1025.0),
+        (None, 10.0),
+        (4990.0, None),
+        (-10.0, 0.0),
+        (4999.0, 6000.0),
+        (5000.5, 6000.0),
+        (20.5, 20.7),
+    ],
+)
+def test_range_is_clipped_to_the_timestamps(series, begin_time, end_time):
+    timestamps = np.arange(5000, dtype=float)
+    selected = np.ones(5000, dtype=bool)
+    if begin_time is not None:
+        selected &= timestamps >= begin_time
+    if end_time is not None:
+        selected &= timestamps <= end_time
+
+    data = series.get_range(begin_time, end_time)
+    np.testing.assert_array_equal(data.timestamps, timestamps[selected])
+    np.testing.assert_array_equal(data.sequence, np.flatnonzero(selected))
+    np.testing.assert_array_equal(data.values, timestamps[selected] * 2)
+    assert all(not column.flags.writeable for column in data)
+
+
+@pytest.mark.parametrize("max_points", [1, 7, 100, 1000, 1001, 5000])
+def test_range_is_decimated(series, max_points):
+    data = series.get_range(0.0, 999.0, max_points)
+    assert 0 < len(data.timestamps) <= max_points
+    step = data.sequence[1] - data.sequence[0] if len(data.sequence) > 1 else 1000
+    assert data.sequence[0] == 0
+    np.testing.assert_array_equal(data.sequence, np.arange(0, 1000, step))
+    np.testing.assert_array_equal(data.values, data.sequence * 2.0)
+
+
+def test_range_is_a_view_of_the_samples():
+    series = Series()
+    series.extend(np.arange(100), np.arange(100, dtype=float), np.arange(100, dtype=float))
+    values = series.get().values
+    for max_points in (None, 10):
+        data = series.get_range(10.0, 60.0, max_points)
+        assert np.shares_memory(data.values, values)
+        assert np.shares_memory(data.timestamps, series.get().timestamps)
+
+
+def test_range_of_the_collection():
+    collection = make_collection(100)
+    data = collection.get_range(name, instance, 1.0, 2.0)
+    assert data.sequence.tolist() == list(range(10, 21))
+    assert collection.get_num_samples(name, instance, 1.0, 2.0) == 11
+    assert collection.get_num_samples(name, instance) == 100
+    assert len(collection.get_range(name, instance, max_points=30).values) == 25
+    assert collection.get_range(name, ("1", None, "total"), 1.0, 2.0) is empty_series_data
+    assert collection.get_num_samples(name, ("1", None, "total")) == 0
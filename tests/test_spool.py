@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Tests of the spooling of the frames while the connection with the server is lost."""
+
+import asyncio
+import os
+
+from hpx_dashboard.agent import tcp_client
+from hpx_dashboard.agent.lanes import LaneCheckpoint
+from hpx_dashboard.agent.readers import Checkpoint
+from hpx_dashboard.agent.spool import Spool
+from hpx_dashboard.common import protocol
+
+frames = [protocol.encode_end(float(i)) for i in range(20)]
+frame_size = len(frames[0])
+
+
+def test_frames_are_read_in_order(tmp_path):
+    spool = Spool(str(tmp_path / "spool"))
+    for frame in frames[:3]:
+        assert spool.append(frame)
+    assert spool.peek() == frames[0]
+    assert spool.pop() == frames[0]
+    spool.append(frames[3])
+    assert [spool.pop() for _ in range(4)] == frames[1:4] + [None]
+    assert os.path.getsize(spool.path) == 0
+
+    spool.close()
+    assert not os.path.exists(spool.path)
+
+
+def test_sent_prefix_is_reclaimed(tmp_path, monkeypatch):
+    monkeypatch.setattr(Spool, "min_reclaim", 2 * frame_size)
+    spool = Spool(str(tmp_path / "spool"))
+    for frame in frames[:10]:
+        spool.append(frame)
+    # The spool is never empty: the frames are sent while new ones arrive
+    popped = []
+    for frame in frames[10:]:
+        popped.append(spool.pop())
+        spool.append(frame)
+        popped.append(spool.pop())
+        assert os.path.getsize(spool.path) <= 2 * spool.nbytes + frame_size
+    popped += [spool.pop() for _ in range(len(spool))]
+    assert popped == frames
+    spool.close()
+
+
+def test_size_cap(tmp_path):
+    spool = Spool(str(tmp_path / "spool"), max_bytes=4 * frame_size)
+    assert all(spool.append(frame) for frame in frames[:4])
+    assert not spool.append(frames[4])
+    assert spool.num_dropped == 1
+
+    # The space of the sent frames is available again even if the spool is not empty
+    spool.pop()
+    assert spool.append(frames[5])
+    assert os.path.getsize(spool.path) <= spool.max_bytes
+    assert [spool.pop() for _ in range(4)] == frames[1:4] + [frames[5]]
+    spool.close()
+
+
+class FakeWriter:
+    """Stream writer whose frames are received by the server once drained."""
+
+    def __init__(self, received):
+        self.received = received
+        self.pending = []
+        self.broken = False
+
+    def write(self, frame):
+        self.pending.append(frame)
+
+    async def drain(self):
+        pending, self.pending = self.pending, []
+        if self.broken:
+            raise ConnectionResetError("connection reset by peer")
+        self.received.extend(pending)
+
+    def close(self):
+        self.broken = True
+
+
+class RecordingReader:
+    def __init__(self):
+        self.commits = []
+
+    def commit(self, checkpoint):
+        self.commits.append(checkpoint.offset)
+
+
+def test_spooled_frames_are_replayed_in_order(monkeypatch):
+    received = []
+    writers = [None, FakeWriter(received)]
+
+    async def connect(host, port, timeout):
+        # The server is down at the first attempt
+        return writers.pop(0)
+
+    monkeypatch.setattr(tcp_client, "connect", connect)
+    preamble = protocol.encode_counter_infos({})
+    reader = RecordingReader()
+
+    async def run():
+        queue = asyncio.Queue()
+        sender = tcp_client.ReconnectingSender(
+            "localhost", 0, Spool(), lambda: [preamble], min_backoff=0.001
+        )
+        sender.writer = FakeWriter(received)
+        sending = asyncio.ensure_future(sender.send(queue))
+
+        for frame in frames[:2]:
+            queue.put_nowait(frame)
+        await asyncio.sleep(0.001)
+        sender.writer.broken = True
+        for frame in frames[2:6]:
+            queue.put_nowait(frame)
+        queue.put_nowait(LaneCheckpoint(Checkpoint(reader, None, 10), False))
+        await asyncio.sleep(0.001)
+        assert reader.commits == []
+
+        while sender.writer is None:
+            await asyncio.sleep(0.001)
+        queue.put_nowait(frames[6])
+        queue.put_nowait(None)
+        success = await asyncio.wait_for(sending, 1)
+        return sender, success
+
+    sender, success = asyncio.get_event_loop().run_until_complete(run())
+    assert success
+    assert received == frames[:2] + [preamble] + frames[2:7]
+    assert sender.num_reconnections == 1
+    assert reader.commits == [10]
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+#
+# HPX - dashboard
+#
+# Copyright (c) 2020 - ETH Zurich
+# All rights reserved
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Tests of the ingestion of the frames received by the server."""
+
+import asyncio
+import itertools
+import threading
+import time
+import types
+
+from hpx_dashboard.common import protocol
+from hpx_dashboard.server import tcp_listener
+from hpx_dashboard.server.data.collection import DataCollection
+from hpx_dashboard.server.tcp_listener import BULK_LANE, PRIORITY_LANE, Ingestor
+
+
+def make_ingestor(monkeypatch, frames, duration=0.0):
+    """Returns an ingestor with the `frames` (lane, arrival) and the list of the processed ones,
+    each frame takes `duration` seconds to be processed."""
+    processed = []
+
+    def handle_frame(run_id, message_type, payload):
+        time.sleep(duration)
+        processed.append(payload)
+        yield
+
+    monkeypatch.setattr(tcp_listener, "_handle_frame", handle_frame)
+    ingestor = Ingestor(time_budget=0.05, bulk_share=0.5)
+    for lane, arrival in frames:
+        ingestor.put(((lane, arrival), None, None, (lane, arrival)))
+    return ingestor, processed
+
+
+def test_priority_frames_first(monkeypatch):
+    frames = [(BULK_LANE, 0), (PRIORITY_LANE, 1), (BULK_LANE, 2), (PRIORITY_LANE, 3)]
+    ingestor, processed = make_ingestor(monkeypatch, frames)
+    ingestor._process(time.perf_counter() + 10)
+    assert processed[:2] == [(PRIORITY_LANE, 1), (PRIORITY_LANE, 3)]
+    assert processed[2:] == [(BULK_LANE, 0), (BULK_LANE, 2)]
+    assert not ingestor.qsize()
+
+
+def test_bulk_lane_is_not_starved(monkeypatch):
+    frames = [(PRIORITY_LANE, arrival) for arrival in range(1000)] + [(BULK_LANE, 5)]
+    ingestor, processed = make_ingestor(monkeypatch, frames, duration=0.002)
+    ingestor._process(time.perf_counter() + ingestor.time_budget)
+    assert (BULK_LANE, 5) in processed
+    # The bulk frame is not processed before the priority frames which arrived before it
+    bulk_index = processed.index((BULK_LANE, 5))
+    assert processed[:5] == [(PRIORITY_LANE, arrival) for arrival in range(5)]
+    assert bulk_index >= 5
+
+
+def test_concurrent_runs_are_interleaved(monkeypatch):
+    processed = []
+
+    def handle_frame(run_id, message_type, payload):
+        # Each frame is inserted in two slices
+        for _ in range(2):
+            time.sleep(0.001)
+            yield
+        processed.append((run_id, payload))
+
+    monkeypatch.setattr(tcp_listener, "_handle_frame", handle_frame)
+    ingestor = Ingestor(time_budget=0.05, bulk_share=0.5)
+    # The run "a" sends a flow of priority frames, the run "b" bulk frames
+    arrival = itertools.count()
+    for index in range(100):
+        for run_id, lane in (("a", PRIORITY_LANE), ("b", BULK_LANE)):
+            ingestor.put(((lane, next(arrival)), run_id, None, bytes([index])))
+
+    progress = []
+    while ingestor.qsize() or ingestor._current is not None:
+        ingestor._process(time.perf_counter() + ingestor.time_budget)
+        progress.append([sum(run_id == run for run_id, _ in processed) for run in "ab"])
+
+    # Both runs progress in each iteration of the loop, each one in its own order
+    assert len(progress) > 2
+    previous = [0, 0]
+    for counts in progress[:-1]:
+        assert counts[0] > previous[0] and counts[1] > previous[1]
+        previous = counts
+    for run in "ab":
+        frames = [payload[0] for run_id, payload in processed if run_id == run]
+        assert frames == list(range(100))
+
+
+def test_connections_wait_while_the_backlog_is_full(monkeypatch):
+    async def run():
+        ingestor, processed = make_ingestor(monkeypatch, [(BULK_LANE, 0), (BULK_LANE, 1)])
+        ingestor.max_bytes = ingestor.nbytes
+        waiting = asyncio.ensure_future(ingestor.wait_for_room())
+        await asyncio.sleep(0.01)
+        blocked = not waiting.done()
+        ingestor._process(time.perf_counter() + 10)
+        await asyncio.wait_for(waiting, 1)
+        return blocked, ingestor.nbytes
+
+    assert asyncio.get_event_loop().run_until_complete(run()) == (True, 0)
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.saving = False
+        self.events = []
+
+    def iter_seal(self):
+        for _ in range(3):
+            self.events.append("seal")
+            yield
+
+
+def test_finished_runs_are_saved_in_a_thread(monkeypatch):
+    class Aggregator:
+        def save_collection(self, collection):
+            collection.events.append((collection.saving, threading.current_thread()))
+
+    monkeypatch.setattr(tcp_listener, "DataAggregator", Aggregator)
+    collection = RecordingCollection()
+    asyncio.get_event_loop().run_until_complete(tcp_listener._finalize(collection))
+    (saving, thread), *sealed = collection.events
+    assert saving and thread is not threading.main_thread()
+    assert sealed == ["seal"] * 3 and not collection.saving
+
+
+def test_texts_are_added_with_the_samples(monkeypatch):
+    aggregator = types.SimpleNamespace(dummy_counter=0)
+    monkeypatch.setattr(tcp_listener, "DataAggregator", lambda: aggregator)
+    batch = protocol.Batch()
+    batch.add_counter_definition(
+        0, ("/threads/time/histogram", "locality#0/total", None, "[s]", None)
+    )
+    for sequence_number, value in enumerate([1.0, "[1 2 3]", 2.0, "[4 5 6]"]):
+        batch.add_counter(0, sequence_number, 0.1 * sequence_number, value)
+    payload = batch.encode()[protocol.header.size :]
+
+    collection = DataCollection()
+    for _ in tcp_listener._add_data(collection, protocol.decode_message(protocol.DATA, payload)):
+        pass
+    texts = collection.get_texts("/threads/time/histogram", ("0", None, "total"))
+    assert texts.tolist() == [None, "[1 2 3]", None, "[4 5 6]"]